@@ -7,7 +7,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import json
 from typing import List, Optional
-from .data_store import ROOMS, topics, votes
+from .storage import get_storage
 from utility.smart_ai_client import (
     get_smart_client, 
     get_available_models, 
@@ -263,12 +263,12 @@ async def summary_ai(req: SummaryRequest):
     """對指定討論室的特定主題進行 AI 總結"""
     try:
         # 檢查討論室是否存在
-        if req.room not in ROOMS:
+        store = get_storage()
+        if not store.room_exists(req.room):
             return {"summary": "錯誤：找不到指定的討論室。"}
 
         # 檢查主題是否存在
-        topic_id = f"{req.room}_{req.topic}"
-        if topic_id not in topics:
+        if not store.topic_exists(req.room, req.topic):
             return {"summary": "錯誤：在該討論室中找不到指定的主題。"}
 
         # 建立總結 prompt
@@ -375,11 +375,11 @@ async def generate_single_topic(req: GenerateSingleTopicRequest):
     try:
         room_code = req.room.strip()
         logger.info(f"收到單一主題生成請求，房間代碼: {room_code}")
-        logger.debug(f"當前 ROOMS 內容: {list(ROOMS.keys())}")
+        store = get_storage()
         
         # 檢查討論室是否存在
-        if room_code not in ROOMS:
-            logger.error(f"找不到房間 {room_code}，現有房間: {list(ROOMS.keys())}")
+        if not store.room_exists(room_code):
+            logger.error(f"找不到房間 {room_code}，現有房間: {[r.code for r in store.list_rooms()]}")
             return {"topic": f"錯誤：找不到指定的討論室 '{room_code}'。"}
         
         # 建立 prompt
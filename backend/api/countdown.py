@@ -0,0 +1,192 @@
+"""
+伺服器端倒數計時
+倒數的開始時間一律由伺服器決定（POST /api/room_state 不再採用客戶端送來的 time_start），
+每間房間的倒數結束時間放在時間輪上，由背景維護工作（api/maintenance.py）定期推進：
+- 倒數結束時將討論中的房間切換為休息中（Stop），並通知推播訂閱者（api/realtime.py 的 countdown 事件）
+- 房間資料改變時（儲存後端的變更通知，多 worker 時也包含其他 worker 的寫入）重新讀取該房間的倒數並更新時間輪，
+  每次推進只處理到期的槽與有變動的房間，不必每秒掃描所有房間
+
+客戶端以 GET /api/time 估算與伺服器的時鐘差，再依房間狀態中的 deadline 在本地顯示剩餘時間，
+不需要為了更新倒數而每隔幾秒重新讀取房間狀態。
+"""
+
+import threading
+import time
+
+from fastapi import APIRouter
+
+from .storage import get_storage
+
+router = APIRouter(tags=["Countdown"])
+
+TICK = 0.5    # 時間輪每格的秒數，也是倒數結束到切換狀態的最長延遲
+SLOTS = 512   # 時間輪的格數，超過一圈（約 4 分鐘）的倒數在經過對應的格時才會被檢查
+
+
+def countdown_deadline(room):
+    """討論中且已開始倒數的房間的結束時間（Unix 時間戳），其餘情況為 None"""
+    if room.status != "Discussion" or not room.time_start:
+        return None
+    return room.time_start + room.countdown
+
+
+class TimerWheel:
+    """
+    雜湊時間輪：依結束時間所在的格放入對應的槽，推進時只檢查經過的槽
+    同一格中尚未到期的項目（下一圈以後的倒數）會留在槽中，等下一次經過時再檢查
+    """
+
+    def __init__(self, tick=TICK, slots=SLOTS, now=None):
+        self.tick = tick
+        self.slots = slots
+        self._wheel = [{} for _ in range(slots)]
+        self._slot_of = {}   # key → 所在的槽
+        self._current = int((time.time() if now is None else now) / tick)   # 尚未處理完的格
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, key):
+        return key in self._slot_of
+
+    def get(self, key):
+        """key 的結束時間，未排程時為 None"""
+        slot = self._slot_of.get(key)
+        return slot[key] if slot is not None else None
+
+    def schedule(self, key, deadline):
+        """排程或改期；已經過的時間會放在目前的格，下一次推進時到期"""
+        self.cancel(key)
+        slot = self._wheel[max(int(deadline / self.tick), self._current) % self.slots]
+        slot[key] = deadline
+        self._slot_of[key] = slot
+
+    def cancel(self, key):
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            del slot[key]
+
+    def advance(self, now):
+        """推進到 now，回傳到期的 [(key, 結束時間)]"""
+        target = int(now / self.tick)
+        expired = []
+        # 間隔超過一圈時（例如系統休眠後）每個槽只需檢查一次
+        for index in range(max(self._current, target - self.slots + 1), target + 1):
+            slot = self._wheel[index % self.slots]
+            if not slot:
+                continue
+            for key, deadline in list(slot.items()):
+                if deadline <= now:
+                    del slot[key]
+                    del self._slot_of[key]
+                    expired.append((key, deadline))
+        # 目前這一格可能還有稍後才到期的項目，下一次推進時再檢查一次
+        self._current = target
+        return expired
+
+
+class CountdownTimers:
+    """所有房間的倒數計時，倒數結束時切換房間狀態並通知監聽者"""
+
+    def __init__(self, tick=TICK, slots=SLOTS):
+        self.wheel = TimerWheel(tick, slots)
+        self._lock = threading.Lock()
+        self._dirty = set()            # 資料有變動、需要重新讀取倒數的房間
+        self._store = None
+        self._expiry_listeners = []    # fn(code, payload)，在推進時間輪的執行緒中呼叫
+
+    def add_expiry_listener(self, fn):
+        if fn not in self._expiry_listeners:
+            self._expiry_listeners.append(fn)
+
+    def remove_expiry_listener(self, fn):
+        if fn in self._expiry_listeners:
+            self._expiry_listeners.remove(fn)
+
+    def attach(self, store, now=None):
+        """向儲存後端註冊變更通知並載入進行中的倒數；切換儲存後端時重建時間輪（只在推進時間輪的執行緒中呼叫）"""
+        if store is self._store:
+            return
+        now = time.time() if now is None else now
+        if self._store is not None:
+            self._store.remove_change_listener(self._on_change)
+        # 先註冊再讀取，讀取期間的寫入會在下一次推進時重新讀取；
+        # 讀取儲存後端時不持有 self._lock，寫入的執行緒會在持有後端鎖時呼叫 _on_change
+        store.add_change_listener(self._on_change)
+        wheel = TimerWheel(self.wheel.tick, self.wheel.slots, now)
+        # 包含停機期間已結束的倒數，下一次推進時切換為休息中
+        for code, (time_start, countdown) in store.running_countdowns().items():
+            wheel.schedule(code, time_start + countdown)
+        with self._lock:
+            self._store = store
+            self.wheel = wheel
+
+    def _on_change(self, code, version):
+        # 在寫入的執行緒中呼叫，只記錄房間，下一次推進時再讀取
+        with self._lock:
+            self._dirty.add(code)
+
+    def refresh(self, code, now=None):
+        """依房間目前的資料排程、改期或取消倒數"""
+        now = time.time() if now is None else now
+        room = self._store.get_room(code)
+        deadline = countdown_deadline(room) if room is not None else None
+        with self._lock:
+            if deadline is not None and deadline > now:
+                if self.wheel.get(code) != deadline:
+                    self.wheel.schedule(code, deadline)
+            else:
+                # 已過期的倒數不在這裡切換：主持人恢復暫停的討論時會先設為討論中、再重新開始計時，
+                # 這段期間舊的倒數看起來早已結束，不能因此把剛恢復的討論切回休息中
+                self.wheel.cancel(code)
+
+    def tick(self, now=None):
+        """推進時間輪：切換到期的房間，再更新資料有變動的房間，回傳本次的統計"""
+        self.attach(get_storage())
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = self.wheel.advance(now)
+        stopped = 0
+        for code, deadline in expired:
+            if self._expire(code, deadline, now):
+                stopped += 1
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for code in dirty:
+            self.refresh(code, now)
+        return {"timers": len(self.wheel), "expired": stopped, "refreshed": len(dirty)}
+
+    def _expire(self, code, deadline, now):
+        store = self._store
+        with store.room_lock(code):
+            room = store.get_room(code)
+            # 取得房間鎖之後再確認一次，期間主持人可能已切換狀態或重新計時
+            if room is None or countdown_deadline(room) != deadline:
+                return False
+            store.update_room(code, status="Stop")
+        payload = {"status": "Stop", "deadline": deadline, "expired_at": now}
+        for listener in list(self._expiry_listeners):
+            try:
+                listener(code, payload)
+            except Exception as e:
+                print(f"倒數結束通知失敗: {e}")
+        return True
+
+
+countdown_timers = CountdownTimers()
+
+
+@router.get("/api/time")
+def get_server_time():
+    """
+    [GET] /api/time
+
+    描述：
+    取得伺服器目前的時間，供客戶端估算時鐘差：
+    offset ≈ server_time - (送出請求時間 + 收到回應時間) / 2，
+    之後以房間狀態中的 deadline 減去 (本地時間 + offset) 即為剩餘秒數。
+
+    回傳：
+    - server_time (float): 伺服器目前的 Unix 時間戳（秒）
+    """
+    return {"server_time": time.time()}
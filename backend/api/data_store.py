@@ -3,45 +3,678 @@
 存放跨模組共享的資料結構，避免循環引用
 """
 
+import bisect
+import dataclasses
+import time
+from collections import OrderedDict
+
+from .records import Topic, Participant
+
+ONLINE_WINDOW = 10      # 秒內有心跳視為在線
+RETENTION_WINDOW = 30   # 超過此秒數未活動即從參與者名單移除
+
+
+class VoteTally:
+    """
+    單一留言的投票紀錄
+    以集合判斷重複投票，並在每次寫入時同步更新票數，讀取時直接取用計數
+    """
+
+    __slots__ = ("good", "bad", "good_count", "bad_count")
+
+    def __init__(self):
+        self.good = set()
+        self.bad = set()
+        self.good_count = 0
+        self.bad_count = 0
+
+    def has_voted(self, device_id, vote_type):
+        """檢查裝置是否已投過指定類型的票"""
+        return device_id in getattr(self, vote_type)
+
+    def add(self, device_id, vote_type):
+        """
+        登記投票，若裝置先前投過相反的票則自動改票
+        已投過相同類型時回傳 False
+        """
+        if self.has_voted(device_id, vote_type):
+            return False
+        opposite_type = "bad" if vote_type == "good" else "good"
+        self.remove(device_id, opposite_type)
+        getattr(self, vote_type).add(device_id)
+        if vote_type == "good":
+            self.good_count += 1
+        else:
+            self.bad_count += 1
+        return True
+
+    def remove(self, device_id, vote_type):
+        """取消投票，裝置未投過該類型時回傳 False"""
+        voters = getattr(self, vote_type)
+        if device_id not in voters:
+            return False
+        voters.remove(device_id)
+        if vote_type == "good":
+            self.good_count -= 1
+        else:
+            self.bad_count -= 1
+        return True
+
+    def counts(self):
+        """回傳 (好評數, 差評數)"""
+        return self.good_count, self.bad_count
+
+    def to_dict(self):
+        """序列化為 {"good": [...], "bad": [...]}"""
+        return {"good": list(self.good), "bad": list(self.bad)}
+
+
+class ParticipantRegistry:
+    """
+    單一房間的參與者名單
+    以 device_id 為鍵，並用依最後活動時間排序的佇列追蹤在線狀態：
+    每次心跳都把裝置移到佇列尾端，過期的裝置必定在佇列前端，
+    因此在線人數可逐步維護，不需每次重新計算
+    """
+
+    __slots__ = ("members", "by_nickname", "_seen", "_online", "_online_view", "online_version")
+
+    def __init__(self):
+        self.members = {}             # device_id -> Participant，依加入順序
+        self.by_nickname = {}         # nickname -> {device_id: None}，同名時依登記順序排列
+        self._seen = OrderedDict()    # 所有保留中的裝置，依 last_seen 由舊到新
+        self._online = OrderedDict()  # ONLINE_WINDOW 內有活動的裝置，依 last_seen 由舊到新
+        self._online_view = None      # get_participants 回傳的在線名單快取
+        # 在線名單每次改變都會遞增；以微秒時間戳作為起點，房間還原後重建的名單不會沿用舊的版本
+        self.online_version = time.time_ns() // 1000
+
+    def get(self, device_id):
+        return self.members.get(device_id)
+
+    def join(self, device_id, nickname, now):
+        """加入或重新加入房間，已存在時更新暱稱與活動時間"""
+        participant = self.members.get(device_id)
+        if participant is None:
+            participant = Participant(device_id, nickname, now)
+            self.members[device_id] = participant
+            self.by_nickname.setdefault(nickname, {})[device_id] = None
+        elif participant.nickname != nickname:
+            self._rename(participant, nickname)
+        self._mark_seen(participant, now)
+        return participant
+
+    def touch(self, device_id, now):
+        """記錄心跳，裝置不在名單中時回傳 False"""
+        participant = self.members.get(device_id)
+        if participant is None:
+            return False
+        self._mark_seen(participant, now)
+        return True
+
+    def set_nickname(self, device_id, nickname):
+        """更新暱稱，裝置不在名單中時回傳 False"""
+        participant = self.members.get(device_id)
+        if participant is None:
+            return False
+        if participant.nickname != nickname:
+            self._rename(participant, nickname)
+        return True
+
+    def find_device(self, nickname):
+        """以暱稱查詢裝置 ID，同名時回傳最早登記者；找不到時回傳 None"""
+        devices = self.by_nickname.get(nickname)
+        if not devices:
+            return None
+        return next(iter(devices))
+
+    def expire(self, now):
+        """從佇列前端移除離線與逾時的裝置，回傳從名單移除的裝置數"""
+        online_cutoff = now - ONLINE_WINDOW
+        while self._online:
+            device_id = next(iter(self._online))
+            if self.members[device_id].last_seen >= online_cutoff:
+                break
+            del self._online[device_id]
+            self._online_changed()
+
+        retention_cutoff = now - RETENTION_WINDOW
+        removed = 0
+        while self._seen:
+            device_id = next(iter(self._seen))
+            if self.members[device_id].last_seen >= retention_cutoff:
+                break
+            del self._seen[device_id]
+            self._forget_nickname(self.members.pop(device_id))
+            removed += 1
+        return removed
+
+    def online_count(self, now):
+        self.expire(now)
+        return len(self._online)
+
+    def online_list(self, now):
+        """回傳在線參與者 [{"device_id", "nickname"}]，名單未變動時直接回傳快取"""
+        self.expire(now)
+        if self._online_view is None:
+            self._online_view = [
+                {"device_id": p.device_id, "nickname": p.nickname}
+                for device_id, p in self.members.items()
+                if device_id in self._online
+            ]
+        return self._online_view
+
+    def nicknames(self):
+        return [p.nickname for p in self.members.values()]
+
+    def last_seen(self):
+        """最近一次活動時間，沒有參與者時為 0"""
+        if not self._seen:
+            return 0
+        return self.members[next(reversed(self._seen))].last_seen
+
+    def to_list(self):
+        """序列化為舊版 participants_list 格式"""
+        return [p.to_dict() for p in self.members.values()]
+
+    def _rename(self, participant, nickname):
+        self._forget_nickname(participant)
+        participant.nickname = nickname
+        self.by_nickname.setdefault(nickname, {})[participant.device_id] = None
+        self._online_changed()
+
+    def _online_changed(self):
+        self._online_view = None
+        self.online_version += 1
+
+    def _forget_nickname(self, participant):
+        nickname = participant.nickname
+        devices = self.by_nickname.get(nickname)
+        if devices is not None:
+            devices.pop(participant.device_id, None)
+            if not devices:
+                del self.by_nickname[nickname]
+
+    def _mark_seen(self, participant, now):
+        device_id = participant.device_id
+        participant.last_seen = now
+        self._seen[device_id] = None
+        self._seen.move_to_end(device_id)
+        if device_id not in self._online:
+            self._online_changed()
+        self._online[device_id] = None
+        self._online.move_to_end(device_id)
+
+
+class CommentRanking:
+    """
+    單一主題的留言排行：好評數減差評數由高到低，同分時較新的留言在前；AI 總結不列入
+    依分數分桶，每個桶是依時間戳排列的留言，另以遞增的分數列表記錄有哪些桶。
+    投票只會把留言移到相鄰的桶，取前 n 名只需從最高分的桶往下讀 n 則，不必排序整個主題
+    """
+
+    __slots__ = ("buckets", "scores", "score_of")
+
+    def __init__(self):
+        self.buckets = {}    # score -> [Comment]，依時間戳由舊到新
+        self.scores = []     # 有留言的分數，遞增
+        self.score_of = {}   # comment_id -> score
+
+    def add(self, comment, score=0):
+        if comment.isAISummary:
+            return
+        self.score_of[comment.id] = score
+        bucket = self.buckets.get(score)
+        if bucket is None:
+            bucket = self.buckets[score] = []
+            bisect.insort(self.scores, score)
+        if bucket and comment.ts < bucket[-1].ts:
+            bisect.insort_right(bucket, comment, key=_comment_ts)
+        else:
+            bucket.append(comment)
+
+    def remove(self, comment):
+        score = self.score_of.pop(comment.id, None)
+        if score is None:
+            return
+        bucket = self.buckets[score]
+        bucket.pop(_position(bucket, comment))
+        if not bucket:
+            del self.buckets[score]
+            del self.scores[bisect.bisect_left(self.scores, score)]
+
+    def update(self, comment, score):
+        """票數改變後把留言移到新分數的桶"""
+        if self.score_of.get(comment.id, score) != score:
+            self.remove(comment)
+            self.add(comment, score)
+
+    def top(self, n):
+        """回傳排名前 n 的留言"""
+        result = []
+        for score in reversed(self.scores):
+            for comment in reversed(self.buckets[score]):
+                if len(result) >= n:
+                    return result
+                result.append(comment)
+        return result
+
+
 # AMD 版本的資料結構 (使用 Lemonade Server 進行 AI 推理)
 ROOMS = {}
 """
 {
-    room_id: {
-        "code": str,
-        "title": str,
-        "created_at": float,  # timestamp
-        "settings": {"allowQuestions": bool, "allowVoting": bool},
-        "status": str,  # NotFound, Stop, Discussion, End
-        "participants": [{"device_id": str, "nickname": str, "last_seen": float}],  # timestamp
-        "current_topic": str,
-        "countdown": int,
-        "time_start": float,  # timestamp
-        "topic_summary": str,  # 題目摘要
-        "desired_outcome": str,  # 預期成果
-        "topic_count": int,  # 主題數量
-        "room_context": str  # 房間上下文,用於 AMD Lemonade Server 的 AI 推理
-    }
+    room_id: Room  # 欄位見 api/records.py
 }
 """
 
 topics = {}
 """
 {
-    topic_id: {
-        "room_id": str,
-        "topic_name": str,
-        "comments": [{"id": str, "nickname": str, "content": str, "ts": float}]
-    }
+    topic_id: Topic  # room_id, topic_name, comments: [Comment]
 }
 """
 
 votes = {}
 """
 {
-    comment_id: {
-        "good": [device_id1, device_id2, ...],
-        "bad": [device_id1, device_id2, ...]
+    comment_id: VoteTally  # good/bad 投票裝置集合與同步維護的票數
+}
+"""
+
+room_topics = {}
+"""
+房間 → 主題索引，避免每次房間操作都掃描整個 topics 字典
+{
+    room_id: {
+        topic_name: topic,  # 與 topics[topic_id] 為同一個物件，依建立順序排列
     }
 }
 """
+
+comment_index = {}
+"""
+留言 ID → 所屬房間、主題與留言本身，投票、刪除時不必再掃描房間內所有留言
+{
+    comment_id: (room_id, topic, comment)  # topic 為主題物件本身，重新命名後仍然有效
+}
+"""
+
+author_comments = {}
+"""
+(房間, 裝置) → 該裝置發表的留言 ID，供暱稱更新時直接定位留言
+{
+    (room_id, device_id): {comment_id, ...}
+}
+"""
+
+room_participants = {}
+"""
+{
+    room_id: ParticipantRegistry
+}
+"""
+
+author_nicknames = {}
+"""
+(房間, 裝置) → 留言作者目前的暱稱。留言只保存發表時的暱稱，序列化時改以此為準，作者改名只需更新一筆；
+參與者名單會移除離線過久的裝置，因此另外保存，與 author_comments 同時建立與移除
+{
+    (room_id, device_id): nickname
+}
+"""
+
+topic_rankings = {}
+"""
+主題 → 留言排行，在新增、刪除留言與投票時同步維護
+{
+    topic_id: CommentRanking
+}
+"""
+
+device_votes = {}
+"""
+(房間, 裝置) → 該裝置的投票，供查詢個人投票紀錄時不必掃描整個房間
+{
+    (room_id, device_id): {comment_id: "good" | "bad"}
+}
+"""
+
+
+def make_topic_id(room_id, topic_name):
+    """組合主題 ID"""
+    return f"{room_id}_{topic_name}"
+
+
+def register_room(room_id):
+    """為新房間建立空的主題索引與參與者名單"""
+    room_topics.setdefault(room_id, {})
+    room_participants.setdefault(room_id, ParticipantRegistry())
+
+
+def get_participant_registry(room_id):
+    """取得房間的參與者名單，不存在時建立"""
+    registry = room_participants.get(room_id)
+    if registry is None:
+        registry = room_participants[room_id] = ParticipantRegistry()
+    return registry
+
+
+def get_room_topic_list(room_id):
+    """依建立順序回傳房間內的所有主題"""
+    return list(room_topics.get(room_id, {}).values())
+
+
+def ensure_topic(room_id, topic_name):
+    """取得房間內的主題，不存在時建立並登記到索引"""
+    topic_id = make_topic_id(room_id, topic_name)
+    topic = topics.get(topic_id)
+    if topic is None:
+        topic = Topic(room_id, topic_name)
+        topics[topic_id] = topic
+        topic_rankings[topic_id] = CommentRanking()
+        room_topics.setdefault(room_id, {})[topic_name] = topic
+    return topic
+
+
+def remove_topic(room_id, topic_name):
+    """
+    從 topics 與索引中移除主題，連同其留言與投票紀錄
+    回傳被移除的主題（不存在時回傳 None）
+    """
+    topic = topics.pop(make_topic_id(room_id, topic_name), None)
+    topic_rankings.pop(make_topic_id(room_id, topic_name), None)
+    if topic is not None:
+        room_topics.get(room_id, {}).pop(topic_name, None)
+        for comment in topic.comments:
+            _unindex_comment(room_id, comment)
+    return topic
+
+
+def rename_topic(room_id, old_name, new_name):
+    """重新命名主題，保留其在房間內的排列位置"""
+    topic = topics.pop(make_topic_id(room_id, old_name))
+    topic.topic_name = new_name
+    topics[make_topic_id(room_id, new_name)] = topic
+    topic_rankings[make_topic_id(room_id, new_name)] = topic_rankings.pop(make_topic_id(room_id, old_name))
+
+    index = room_topics.get(room_id, {})
+    room_topics[room_id] = {
+        (new_name if name == old_name else name): t for name, t in index.items()
+    }
+    return topic
+
+
+def _comment_ts(comment):
+    return comment.ts
+
+
+def append_comment(room_id, topic, comment):
+    """
+    將留言加入主題並登記到留言索引
+    主題的留言一律依時間戳遞增排列（時間戳相同時依加入順序），讀取時不需要再排序
+    回傳作者之前的留言顯示的暱稱是否因此改變
+    """
+    comments = topic.comments
+    if comments and comment.ts < comments[-1].ts:
+        # 只有系統時鐘回撥或匯入的留言較舊時才需要二分插入，一般情況直接附加在最後
+        bisect.insort_right(comments, comment, key=_comment_ts)
+    else:
+        comments.append(comment)
+    get_topic_ranking(room_id, topic).add(comment, _vote_score(comment.id))
+    comment_index[comment.id] = (room_id, topic, comment)
+    renamed = False
+    if comment.device_id:
+        key = (room_id, comment.device_id)
+        ids = author_comments.setdefault(key, set())
+        # 以新暱稱發表時，作者之前的留言也改顯示新暱稱
+        renamed = bool(ids) and author_nicknames.get(key) != comment.nickname
+        ids.add(comment.id)
+        author_nicknames[key] = comment.nickname
+    return renamed
+
+
+def find_comment(room_id, comment_id):
+    """以留言 ID 查詢留言，回傳 (topic, comment)；不存在或不屬於該房間時回傳 None"""
+    entry = comment_index.get(comment_id)
+    if entry is None or entry[0] != room_id:
+        return None
+    return entry[1], entry[2]
+
+
+def delete_comment(room_id, comment_id):
+    """刪除留言與其投票紀錄，回傳被刪除的留言（不存在時回傳 None）"""
+    found = find_comment(room_id, comment_id)
+    if found is None:
+        return None
+    topic, comment = found
+    topic.comments.pop(_comment_position(topic, comment))
+    _unindex_comment(room_id, comment)
+    return comment
+
+
+def _comment_position(topic, comment):
+    """以時間戳二分搜尋留言在主題中的位置（留言必須屬於該主題）"""
+    return _position(topic.comments, comment)
+
+
+def _position(comments, comment):
+    """在依時間戳排列的留言列表中以二分搜尋找到 comment 的位置"""
+    i = bisect.bisect_left(comments, comment.ts, key=_comment_ts)
+    while comments[i] is not comment:
+        i += 1
+    return i
+
+
+def get_topic_ranking(room_id, topic):
+    """取得主題的留言排行，不存在時建立"""
+    topic_id = make_topic_id(room_id, topic.topic_name)
+    ranking = topic_rankings.get(topic_id)
+    if ranking is None:
+        ranking = topic_rankings[topic_id] = CommentRanking()
+    return ranking
+
+
+def page_comments(room_id, topic, after_id=None, since_ts=None, limit=None):
+    """
+    回傳 (留言列表, 是否還有更多留言)：主題中 after_id 之後（沒有 after_id 時為時間戳大於 since_ts）的最多 limit 則留言
+    after_id 不屬於該主題（例如已被刪除）時改用 since_ts，也沒有 since_ts 時回傳 None
+    """
+    comments = topic.comments
+    start = 0
+    found = find_comment(room_id, after_id) if after_id is not None else None
+    if found is not None and found[0] is topic:
+        start = _comment_position(topic, found[1]) + 1
+    elif since_ts is not None:
+        start = bisect.bisect_right(comments, since_ts, key=_comment_ts)
+    elif after_id is not None:
+        return None
+    end = len(comments) if limit is None else min(len(comments), start + limit)
+    return comments[start:end], end < len(comments)
+
+
+def get_author_comments(room_id, device_id):
+    """回傳指定裝置在房間內發表的所有留言"""
+    ids = author_comments.get((room_id, device_id), ())
+    return [comment_index[comment_id][2] for comment_id in ids]
+
+
+def set_author_nickname(room_id, device_id, nickname):
+    """更新留言作者的暱稱，回傳是否有留言因此改變顯示的暱稱"""
+    key = (room_id, device_id)
+    if key not in author_nicknames or author_nicknames[key] == nickname:
+        return False
+    author_nicknames[key] = nickname
+    return True
+
+
+def author_nickname(room_id, comment):
+    """留言作者目前的暱稱；沒有 device_id 的留言維持發表時的暱稱"""
+    if comment.device_id:
+        return author_nicknames.get((room_id, comment.device_id), comment.nickname)
+    return comment.nickname
+
+
+def resolved_topic(topic):
+    """複製主題，留言的暱稱改為作者目前的暱稱（匯出、PDF 使用）"""
+    comments = []
+    for comment in topic.comments:
+        nickname = author_nickname(topic.room_id, comment)
+        comments.append(comment if nickname == comment.nickname else dataclasses.replace(comment, nickname=nickname))
+    return dataclasses.replace(topic, comments=comments)
+
+
+def _unindex_comment(room_id, comment):
+    """將留言從索引中移除並清除其投票紀錄"""
+    comment_id = comment.id
+    entry = comment_index.pop(comment_id, None)
+    if entry is not None:
+        ranking = topic_rankings.get(make_topic_id(room_id, entry[1].topic_name))
+        if ranking is not None:
+            ranking.remove(comment)
+    tally = votes.pop(comment_id, None)
+    if tally is not None:
+        for voter in tally.good | tally.bad:
+            _forget_device_vote(room_id, voter, comment_id)
+    device_id = comment.device_id
+    if device_id:
+        ids = author_comments.get((room_id, device_id))
+        if ids is not None:
+            ids.discard(comment_id)
+            if not ids:
+                del author_comments[(room_id, device_id)]
+                author_nicknames.pop((room_id, device_id), None)
+
+
+def comment_payload(room_id, comment):
+    """序列化留言並附上票數，暱稱為作者目前的暱稱"""
+    vote_good, vote_bad = get_vote_counts(comment.id)
+    return comment.to_payload(vote_good, vote_bad, author_nickname(room_id, comment))
+
+
+def _vote_score(comment_id):
+    """排行使用的分數：好評數減差評數"""
+    vote_good, vote_bad = get_vote_counts(comment_id)
+    return vote_good - vote_bad
+
+
+def _rerank(comment_id):
+    entry = comment_index.get(comment_id)
+    if entry is not None:
+        room_id, topic, comment = entry
+        get_topic_ranking(room_id, topic).update(comment, _vote_score(comment_id))
+
+
+def get_vote_counts(comment_id):
+    """回傳留言的 (好評數, 差評數)，沒有任何投票時為 (0, 0)"""
+    tally = votes.get(comment_id)
+    if tally is None:
+        return 0, 0
+    return tally.good_count, tally.bad_count
+
+
+def cast_vote(room_id, comment_id, device_id, vote_type):
+    """
+    登記投票並更新裝置投票索引，投過相反類型時自動改票
+    已投過相同類型時回傳 False
+    """
+    tally = votes.get(comment_id)
+    if tally is None:
+        tally = votes[comment_id] = VoteTally()
+    if not tally.add(device_id, vote_type):
+        return False
+    device_votes.setdefault((room_id, device_id), {})[comment_id] = vote_type
+    _rerank(comment_id)
+    return True
+
+
+def retract_vote(room_id, comment_id, device_id, vote_type):
+    """取消投票並更新裝置投票索引，找不到該投票時回傳 False"""
+    tally = votes.get(comment_id)
+    if tally is None or not tally.remove(device_id, vote_type):
+        return False
+    _forget_device_vote(room_id, device_id, comment_id)
+    _rerank(comment_id)
+    return True
+
+
+def get_device_votes(room_id, device_id):
+    """回傳裝置在房間內的投票 {comment_id: vote_type}"""
+    return device_votes.get((room_id, device_id), {})
+
+
+def _forget_device_vote(room_id, device_id, comment_id):
+    key = (room_id, device_id)
+    entries = device_votes.get(key)
+    if entries is not None:
+        entries.pop(comment_id, None)
+        if not entries:
+            del device_votes[key]
+
+
+def room_last_active(room_id):
+    """房間最近一次活動時間：建立、開始計時、最新留言與最近一次參與者活動中最晚者"""
+    room = ROOMS[room_id]
+    latest = max(room.created_at, room.time_start or 0)
+    for topic in room_topics.get(room_id, {}).values():
+        if topic.comments:
+            latest = max(latest, topic.comments[-1].ts)
+    registry = room_participants.get(room_id)
+    if registry is not None:
+        latest = max(latest, registry.last_seen())
+    return latest
+
+
+def drop_room(room_id):
+    """從記憶體移除房間與其主題、留言、投票及參與者索引"""
+    for topic_name in list(room_topics.get(room_id, {})):
+        remove_topic(room_id, topic_name)
+    room_topics.pop(room_id, None)
+    room_participants.pop(room_id, None)
+    return ROOMS.pop(room_id, None)
+
+
+def collect_room_orphans(room_id, device_ids):
+    """
+    清除房間內已失去對應留言的索引項目（呼叫端需持有房間鎖）：
+    指向不存在留言的裝置投票與其票數、作者索引中已不存在的留言；房間已不在記憶體中時一併移除參與者名單
+    device_ids 為此房間在 device_votes 與 author_comments 中出現的裝置
+    回傳 {"votes": 移除的投票數, "authors": 移除的作者留言索引數, "registries": 移除的參與者名單數}
+    """
+    removed = {"votes": 0, "authors": 0, "registries": 0}
+    for device_id in device_ids:
+        key = (room_id, device_id)
+        entries = device_votes.get(key)
+        if entries:
+            for comment_id in [c for c in entries if _comment_room(c) != room_id]:
+                tally = votes.get(comment_id)
+                # 留言仍存在於其他房間時只移除這筆錯置的索引，不動該留言的票數
+                if tally is not None and comment_id not in comment_index:
+                    tally.remove(device_id, entries[comment_id])
+                    if not tally.good and not tally.bad:
+                        del votes[comment_id]
+                _forget_device_vote(room_id, device_id, comment_id)
+                removed["votes"] += 1
+        ids = author_comments.get(key)
+        if ids:
+            stale = {c for c in ids if _comment_room(c) != room_id}
+            if stale:
+                ids -= stale
+                removed["authors"] += len(stale)
+                if not ids:
+                    del author_comments[key]
+                    author_nicknames.pop(key, None)
+    if room_id not in ROOMS and room_participants.pop(room_id, None) is not None:
+        removed["registries"] += 1
+    return removed
+
+
+def _comment_room(comment_id):
+    entry = comment_index.get(comment_id)
+    return entry[0] if entry is not None else None
+
+
+def clear_all():
+    """清空所有房間資料與索引"""
+    for container in (ROOMS, topics, votes, room_topics, comment_index,
+                      author_comments, author_nicknames, topic_rankings, room_participants, device_votes):
+        container.clear()
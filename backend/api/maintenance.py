@@ -0,0 +1,185 @@
+"""
+背景維護排程
+由 main.py 的 lifespan 啟動與停止，定期執行不應依附在請求上的清理工作：
+- presence：移除所有房間中逾時的參與者並更新在線人數（原本只在該房間下一次讀取時才清除）
+- countdown：推進倒數時間輪，倒數結束的討論切換為休息中（Stop）並推送事件，主持人離線時也會切換（見 api/countdown.py）
+- orphans：清除指向已刪除留言的投票、已沒有留言的作者暱稱等失去對應資料的紀錄
+- response_cache：清除沒有人再讀取的房間回應快取
+
+每個工作各自一個 asyncio 任務；同步的工作交由執行緒池執行，不阻塞事件迴圈。
+每個工作記錄自己的執行次數、失敗次數、耗時與最近一次結果，可由 GET /api/maintenance 查詢；
+關閉時取消所有任務，並等待執行緒中尚未完成的工作結束，之後才關閉儲存後端。
+其他模組可以 scheduler.add_job 註冊自己的週期工作。
+
+MBBUDDY_MAINTENANCE=0 關閉背景維護。
+"""
+
+import asyncio
+import os
+import time
+
+from fastapi import APIRouter
+
+from .countdown import TICK, countdown_timers
+from .data_store import ONLINE_WINDOW
+from .response_cache import response_cache
+from .storage import get_storage
+
+router = APIRouter(tags=["Maintenance"])
+
+PRESENCE_INTERVAL = ONLINE_WINDOW / 2   # 逾時參與者最多多留半個在線時間窗
+COUNTDOWN_INTERVAL = TICK               # 每次推進時間輪一格
+ORPHAN_INTERVAL = 10 * 60
+CACHE_EVICT_INTERVAL = 5 * 60           # 超過這段時間沒有被讀取的房間快取會被清除
+
+
+class MaintenanceJob:
+    """週期執行的維護工作與其執行統計"""
+
+    def __init__(self, name, interval, fn):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.task = None
+        self.runs = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = None
+        self.last_run_at = None
+        self.last_result = None
+        self.last_error = None
+        self.totals = {}   # 工作回傳的各項數字的累計
+
+    async def _call(self):
+        if asyncio.iscoroutinefunction(self.fn):
+            return await self.fn()
+        # 取消時仍等待執行緒中的工作結束，停止排程後不會再有維護工作存取儲存後端
+        future = asyncio.get_running_loop().run_in_executor(None, self.fn)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait({future})
+            raise
+
+    async def run_once(self):
+        """執行一次並更新統計，回傳工作的結果；失敗時記錄錯誤並回傳 None"""
+        self.last_run_at = time.time()
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await self._call()
+            self.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"維護工作 {self.name} 失敗: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            self.runs += 1
+            self.last_seconds = elapsed
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+        self.last_result = result
+        if isinstance(result, dict):
+            for key, value in result.items():
+                if isinstance(value, (int, float)):
+                    self.totals[key] = self.totals.get(key, 0) + value
+        return result
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    def metrics(self):
+        return {
+            "interval": self.interval,
+            "running": self.task is not None and not self.task.done(),
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_ms": round(self.last_seconds * 1000, 3) if self.last_seconds is not None else None,
+            "avg_ms": round(self.total_seconds / self.runs * 1000, 3) if self.runs else None,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "totals": dict(self.totals),
+        }
+
+
+class MaintenanceScheduler:
+    """以 asyncio 任務定期執行已註冊的維護工作"""
+
+    def __init__(self):
+        self.jobs = {}
+        self._started = False
+
+    def add_job(self, name, interval, fn):
+        """
+        註冊週期工作，fn 可以是同步函式（在執行緒池執行）或 async 函式
+        回傳 dict 時記錄為最近一次結果，其中的數字另外累計；排程已啟動時立即開始執行
+        """
+        if name in self.jobs:
+            raise ValueError(f"維護工作已存在: {name}")
+        job = self.jobs[name] = MaintenanceJob(name, interval, fn)
+        if self._started:
+            job.task = asyncio.create_task(job._loop(), name=f"maintenance-{name}")
+        return job
+
+    async def start(self):
+        if self._started:
+            return
+        self._started = True
+        for job in self.jobs.values():
+            job.task = asyncio.create_task(job._loop(), name=f"maintenance-{job.name}")
+
+    async def stop(self):
+        """取消所有工作並等待正在執行的工作結束"""
+        self._started = False
+        tasks = [job.task for job in self.jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            job.task = None
+
+    def metrics(self):
+        return {name: job.metrics() for name, job in self.jobs.items()}
+
+
+def sweep_presence():
+    return get_storage().sweep_participants(time.time())
+
+
+def collect_orphans():
+    return get_storage().collect_garbage()
+
+
+def evict_response_cache():
+    return {"rooms": response_cache.evict_idle()}
+
+
+scheduler = MaintenanceScheduler()
+if os.getenv("MBBUDDY_MAINTENANCE", "1") != "0":
+    scheduler.add_job("presence", PRESENCE_INTERVAL, sweep_presence)
+    scheduler.add_job("countdown", COUNTDOWN_INTERVAL, countdown_timers.tick)
+    scheduler.add_job("orphans", ORPHAN_INTERVAL, collect_orphans)
+    scheduler.add_job("response_cache", CACHE_EVICT_INTERVAL, evict_response_cache)
+
+
+@router.get("/api/maintenance")
+def get_maintenance_jobs():
+    """
+    [GET] /api/maintenance
+
+    描述：
+    查詢背景維護工作的執行統計。
+
+    回傳：
+    - jobs (dict): 工作名稱 → interval（秒）、running、runs、failures、last_run_at、
+      last_ms / avg_ms / max_ms（耗時毫秒）、last_result、last_error、totals（結果中各項數字的累計）
+    """
+    return {"jobs": scheduler.metrics()}
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
 import random, string, time, uuid
@@ -7,7 +8,13 @@ import os
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from utility.pdf_export import export_room_pdf
-from .data_store import ROOMS, topics, votes
+from utility.sharding import owns_room
+from .records import Room, Comment
+from .storage import get_storage
+from .response_cache import response_cache, dumps
+from .countdown import countdown_deadline
+
+MAX_COMMENT_PAGE = 500  # 分頁讀取留言時 limit 的上限
 
 # --- Pydantic Models for RESTful API ---
 class CommentRequest(BaseModel):
@@ -34,6 +41,10 @@ class RoomSettingsRequest(BaseModel):
     allowQuestions: bool
     allowVoting: bool
 
+class SyncRequest(BaseModel):
+    device_id: str
+    since: Optional[int] = None
+
 # --- Pydantic Models for older/specific APIs ---
 class RoomCreate(BaseModel):
     title: str
@@ -157,46 +168,93 @@ def format_timestamp_for_display(timestamp):
     except:
         return str(timestamp)
 
+
+async def run_room_read(room, fn, *args):
+    """
+    執行房間的讀取或心跳操作 fn(room, *args)
+
+    輪詢端點每 3–5 秒就會被每個參與者呼叫一次，若宣告為 def 每次都要經過執行緒池（預設 40 條執行緒），
+    PDF 匯出等耗時請求佔滿執行緒池時還會排隊。房間資料只在記憶體中時直接在事件迴圈中執行；
+    房間鎖正被其他執行緒持有（寫入進行中）或需要磁碟 I/O（SQLite、已封存的房間）時才交由執行緒池，避免阻塞事件迴圈。
+    """
+    store = get_storage()
+    if store.serves_from_memory(room):
+        lock = store.room_lock(room)
+        if lock.acquire(blocking=False):
+            try:
+                # 持有房間鎖時房間不會被封存，再確認一次即可保證 fn 執行期間不需要磁碟 I/O
+                if store.serves_from_memory(room):
+                    return fn(room, *args)
+            finally:
+                lock.release()
+    return await run_in_threadpool(fn, room, *args)
+
+
+def _etag_matches(if_none_match, tag):
+    """If-None-Match 是否包含 tag（If-None-Match 以弱比較判斷，忽略 W/ 前綴）"""
+    if not if_none_match or tag is None:
+        return False
+    return any(candidate.strip().removeprefix("W/") in (tag, "*") for candidate in if_none_match.split(","))
+
+
+def _conditional_read(room, if_none_match, tag_fn, fn, *args):
+    tag = tag_fn(room, *args)
+    if _etag_matches(if_none_match, tag):
+        return tag, None
+    if tag is None:
+        return tag, dumps(fn(room, *args))
+    # 同一 ETag 的回應只產生與序列化一次；先產生 ETag 再讀取資料：其間有寫入時本文只會比 ETag 新，
+    # 快取中的本文也一樣，下一次輪詢的 ETag 必定不同而取得新資料
+    response_cache.attach(get_storage())
+    key = (fn.__name__, args)
+    body = response_cache.get(room, key, tag)
+    if body is None:
+        body = dumps(fn(room, *args))
+        response_cache.put(room, key, tag, body)
+    return tag, body
+
+
+async def run_conditional_room_read(request, room, tag_fn, fn, *args):
+    """
+    帶 ETag 的 run_room_read：以 tag_fn(room, *args) 由房間版本產生 ETag，
+    與請求的 If-None-Match 相同時直接回傳 304，不建立也不序列化回應本文；
+    否則回傳快取的 JSON 位元組（api/response_cache.py），同一 ETag 只序列化一次
+    """
+    tag, body = await run_room_read(room, _conditional_read, request.headers.get("if-none-match"), tag_fn, fn, *args)
+    # no-cache：瀏覽器可保留回應，但每次都要以 If-None-Match 向伺服器確認
+    headers = {"Cache-Control": "no-cache"}
+    if tag is not None:
+        headers["ETag"] = tag
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _version_tag(room, *args):
+    """只取決於房間資料的回應，以房間版本作為 ETag；沒有版本（房間不存在）時不產生 ETag"""
+    version = get_storage().room_version(room)
+    return f'"{version}"' if version else None
+
 """
-ROOMS、topics、votes 的資料結構說明：
+房間資料一律透過 api.storage 的儲存後端存取（預設為記憶體，可設定 MBBUDDY_STORAGE=sqlite）。
+記憶體後端中 ROOMS、topics、votes 的資料結構說明：
 
 ROOMS = {
-    room_id: {
-        "code": str,
-        "title": str,
-        "created_at": float,
-        "settings": {"allowQuestions": bool, "allowVoting": bool},
-        "status": str,
-        "participants": int,
-        "participants_list": [{"device_id": str, "nickname": str, "last_seen": float}],
-        "current_topic": str,
-        "countdown": int,
-        "time_start": float,
-        "topic_summary": str,
-        "desired_outcome": str,
-        "topic_count": int,
-        "room_context": str
-    }
+    room_id: Room(code, title, created_at, settings, status, participants, current_topic,
+                  countdown, time_start, topic_summary, desired_outcome, topic_count, room_context)
 }
 
 topics = {
-    topic_id: {
-        "room_id": str,
-        "topic_name": str,
-        "comments": [{"id": str, "nickname": str, "content": str, "ts": float, "device_id": str}]
-    }
+    topic_id: Topic(room_id, topic_name, comments=[Comment(id, nickname, content, ts, isAISummary, device_id)])
 }
 
 votes = {
-    comment_id: {
-        "good": [device_id1, device_id2, ...],
-        "bad": [device_id1, device_id2, ...]
-    }
+    comment_id: VoteTally  # good/bad 為裝置ID集合，good_count/bad_count 為同步維護的票數
 }
 """
 
 @router.post("/api/create_room")
-async def create_room(room: RoomCreate):
+def create_room(room: RoomCreate):
     """
     建立討論室
 
@@ -216,8 +274,10 @@ async def create_room(room: RoomCreate):
     回傳：
     - code (str): 房間代碼
     """
+    store = get_storage()
     code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    while code in ROOMS:
+    # 分片部署時只產生雜湊到本分片的代碼，分片路由器才會把這間房間的請求轉送回來
+    while store.room_exists(code) or not owns_room(code):
         code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
         
     title = room.title.strip()
@@ -226,43 +286,34 @@ async def create_room(room: RoomCreate):
     room_topics = room.topics if room.topics else ["預設主題"]
     first_topic = room_topics[0]
 
-    ROOMS[code] = {
-        "code": code,
-        "title": title,
-        "created_at": get_current_timestamp(),
-        "participants": 0,
-        "settings": {"allowQuestions": True, "allowVoting": True},
-        "status": "Stop",
-        "participants_list": [],
-        "current_topic": first_topic,
-        "countdown": countdown,
-        "time_start": 0,
-        "topic_summary": (room.topic_summary or "").strip(),
-        "desired_outcome": (room.desired_outcome or "").strip(),
-        "topic_count": room.topic_count, # 使用前端傳來的值
-        "room_context": f"討論主題: {title}",  # 用於 AMD Lemonade Server 的上下文資訊
-    }
+    new_room = Room(
+        code=code,
+        title=title,
+        created_at=get_current_timestamp(),
+        participants=0,
+        settings={"allowQuestions": True, "allowVoting": True},
+        status="Stop",
+        current_topic=first_topic,
+        countdown=countdown,
+        time_start=0,
+        topic_summary=(room.topic_summary or "").strip(),
+        desired_outcome=(room.desired_outcome or "").strip(),
+        topic_count=room.topic_count, # 使用前端傳來的值
+        room_context=f"討論主題: {title}",  # 用於 AMD Lemonade Server 的上下文資訊
+    )
     
     # AMD Ryzen AI 版本: 不需要預先創建 workspace
     # 使用 Lemonade Server 時,會話上下文通過每次請求的 prompt 傳遞
     print(f"✅ 討論 '{title}' (代碼: {code}) 已創建,將使用 AMD Lemonade Server 進行 AI 推理")
     
-    for topic_name in room_topics:
-        topic_name_stripped = topic_name.strip()
-        if not topic_name_stripped:
-            continue
-        topics[f"{code}_{topic_name_stripped}"] = {
-            "room_id": code,
-            "topic_name": topic_name_stripped,
-            "comments": [],
-        }
+    store.create_room(new_room, [t.strip() for t in room_topics if t.strip()])
     
     return {
-        "code": ROOMS[code]["code"],
-        "title": ROOMS[code]["title"],
-        "created_at": ROOMS[code]["created_at"],
-        "participants": ROOMS[code]["participants"],
-        "settings": ROOMS[code]["settings"]
+        "code": new_room.code,
+        "title": new_room.title,
+        "created_at": new_room.created_at,
+        "participants": new_room.participants,
+        "settings": new_room.settings
     }
 
 @router.get("/api/export_pdf")
@@ -270,24 +321,27 @@ def export_pdf(room: str):
     """
     匯出指定討論室的完整記錄為 PDF 檔案，帶有美化排版和圖表。
     """
-    if room not in ROOMS:
+    store = get_storage()
+    room_record = store.get_room(room)
+    if room_record is None:
         raise HTTPException(status_code=404, detail="找不到討論室")
-    room_data = ROOMS[room]
-    room_topics = [t for t_id, t in topics.items() if t["room_id"] == room]
+    room_data = room_record.to_dict()
+    room_data["participants_list"] = store.list_participants(room)
     # 過濾掉「AI 主題生成中...」等臨時主題
-    room_topics = [t for t in room_topics if not ("AI" in t.get("topic_name", "") and "生成中" in t.get("topic_name", ""))]
-    return export_room_pdf(room, room_data, room_topics, votes, FONT_NAME)
+    room_topics = [
+        t.to_dict() for t in store.list_topics(room)
+        if not ("AI" in t.topic_name and "生成中" in t.topic_name)
+    ]
+    return export_room_pdf(room, room_data, room_topics, store.get_room_vote_counts(room), FONT_NAME)
 
 @router.get("/api/room_topics")
 def get_room_topics(room: str):
     """取得指定房間的所有主題列表"""
-    if room not in ROOMS:
+    store = get_storage()
+    if not store.room_exists(room):
         raise HTTPException(status_code=404, detail="Room not found")
     
-    room_topics = [
-        t["topic_name"] for t_id, t in topics.items() if t["room_id"] == room
-    ]
-    return {"topics": room_topics}
+    return {"topics": store.list_topic_names(room)}
 
 class AddTopicsRequest(BaseModel):
     room: str
@@ -296,33 +350,26 @@ class AddTopicsRequest(BaseModel):
 @router.post("/api/room/add_topics")
 def add_topics_to_room(req: AddTopicsRequest):
     """為指定房間添加多個主題，並清除舊的「預設主題」"""
-    if req.room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
+    store = get_storage()
+    with store.room_lock(req.room):
+        if not store.room_exists(req.room):
+            raise HTTPException(status_code=404, detail="Room not found")
 
-    # 1. 刪除舊的預設主題（如果存在）
-    default_topic_id = f"{req.room}_預設主題"
-    if default_topic_id in topics:
-        del topics[default_topic_id]
+        # 1. 刪除舊的預設主題（如果存在）
+        store.remove_topic(req.room, "預設主題")
 
-    # 2. 添加新主題
-    for topic_name in req.topics:
-        topic_name_stripped = topic_name.strip()
-        if not topic_name_stripped:
-            continue
-        
-        topic_id = f"{req.room}_{topic_name_stripped}"
-        if topic_id not in topics:
-            topics[topic_id] = {
-                "room_id": req.room,
-                "topic_name": topic_name_stripped,
-                "comments": [],
-            }
-    
-    # 3. 更新房間的 current_topic 為新的第一個主題
-    if req.topics:
-        ROOMS[req.room]["current_topic"] = req.topics[0].strip()
+        # 2. 添加新主題
+        for topic_name in req.topics:
+            topic_name_stripped = topic_name.strip()
+            if not topic_name_stripped:
+                continue
+            store.ensure_topic(req.room, topic_name_stripped)
 
-    return {"success": True, "message": f"已成功為房間 {req.room} 添加 {len(req.topics)} 個主題。"}
+        # 3. 更新房間的 current_topic 為新的第一個主題
+        if req.topics:
+            store.update_room(req.room, current_topic=req.topics[0].strip())
+
+        return {"success": True, "message": f"已成功為房間 {req.room} 添加 {len(req.topics)} 個主題。"}
 
 
 @router.get("/api/rooms")
@@ -340,19 +387,19 @@ def get_rooms():
     """
     # 將房間狀態加入到每個房間資訊中
     rooms = []
-    for room in ROOMS.values():
+    for room in get_storage().list_rooms():
         room_info = {
-            "code": room["code"],
-            "title": room["title"],
-            "created_at": room["created_at"],
-            "participants": room["participants"],
-            "status": room["status"],
-            "current_topic": room.get("current_topic", ""),
-            "topic_count": room.get("topic_count", 1),
-            "topic_summary": room.get("topic_summary", ""),
-            "desired_outcome": room.get("desired_outcome", ""),
-            "countdown": room.get("countdown", 0),
-            "room_context": room.get("room_context", ""),  # AMD 版本使用 room_context
+            "code": room.code,
+            "title": room.title,
+            "created_at": room.created_at,
+            "participants": room.participants,
+            "status": room.status,
+            "current_topic": room.current_topic,
+            "topic_count": room.topic_count,
+            "topic_summary": room.topic_summary,
+            "desired_outcome": room.desired_outcome,
+            "countdown": room.countdown,
+            "room_context": room.room_context,  # AMD 版本使用 room_context
         }
         rooms.append(room_info)
     return {"rooms": rooms}
@@ -385,38 +432,28 @@ def join_participant(data: JoinRequest):
     nickname = data.nickname
     now = get_current_timestamp()
     
-    if room not in ROOMS:
-        return {"success": False, "error": "房間不存在"}
-    
-    # 初始化參與者列表
-    if "participants_list" not in ROOMS[room]:
-        ROOMS[room]["participants_list"] = []
-    
-    # 先檢查 device_id 是否已存在
-    found = None
-    for p in ROOMS[room]["participants_list"]:
-        if p['device_id'] == device_id:
-            found = p
-            break
-    
-    if found:
-        found['last_seen'] = now
-        found['nickname'] = nickname  # 更新暱稱
-    else:
-        ROOMS[room]["participants_list"].append({"device_id": device_id, "nickname": nickname, "last_seen": now})
+    store = get_storage()
+    # 持有房間鎖時房間不會在檢查與寫入之間被封存
+    with store.room_lock(room):
+        if not store.room_exists(room):
+            return {"success": False, "error": "房間不存在"}
 
-    # 更新房間參與者人數（以在線人數為準，10秒內視為在線）
-    try:
-        online_count = sum(1 for p in ROOMS[room]["participants_list"] if (now - p["last_seen"]) <= 10)
-        ROOMS[room]["participants"] = online_count
-    except Exception:
-        # 後備：若出錯則使用列表長度
-        ROOMS[room]["participants"] = len(ROOMS[room].get("participants_list", []))
+        # 以 device_id 加入或更新暱稱與活動時間，並同步房間參與者人數（以在線人數為準，10秒內視為在線）
+        store.join_participant(room, device_id, nickname, now)
 
     return {"success": True}
 
+def _touch_participant(room, device_id):
+    store = get_storage()
+    if not store.room_exists(room):
+        return {"success": False, "error": "房間不存在"}
+
+    # 更新活動時間與在線人數
+    store.touch_participant(room, device_id, get_current_timestamp())
+    return {"success": True}
+
 @router.post("/api/participants/heartbeat")
-def participant_heartbeat(data: HeartbeatRequest):
+async def participant_heartbeat(data: HeartbeatRequest):
     """
     參與者在線檢測
     
@@ -432,30 +469,22 @@ def participant_heartbeat(data: HeartbeatRequest):
     回傳：
     - success (bool): 是否成功更新心跳時間
     """
-    now = get_current_timestamp()
-    room = data.room
-    device_id = data.device_id
-    
-    if room not in ROOMS:
-        return {"success": False, "error": "房間不存在"}
-    
-    if "participants_list" not in ROOMS[room]:
-        ROOMS[room]["participants_list"] = []
-    
-    for p in ROOMS[room]["participants_list"]:
-        if p['device_id'] == device_id:
-            p['last_seen'] = now
-            break
-    # 更新在線人數
-    try:
-        online_count = sum(1 for p in ROOMS[room]["participants_list"] if (now - p["last_seen"]) <= 10)
-        ROOMS[room]["participants"] = online_count
-    except Exception:
-        ROOMS[room]["participants"] = len(ROOMS[room].get("participants_list", []))
-    return {"success": True}
+    return await run_room_read(data.room, _touch_participant, data.device_id)
+
+def _online_participants(room):
+    online = []
+    store = get_storage()
+    if store.room_exists(room):
+        # 名單會順帶移除逾 30 秒未活動的參與者，並同步房間在線人數
+        online = store.online_participants(room, get_current_timestamp())
+    return {"participants": online}
+
+def _online_participants_tag(room):
+    tag = get_storage().online_participants_tag(room, get_current_timestamp())
+    return f'"{tag}"' if tag is not None else None
 
 @router.get("/api/participants")
-def get_participants(room: str):
+async def get_participants(room: str, request: Request):
     """
     獲取房間內的在線參與者列表
     
@@ -463,6 +492,7 @@ def get_participants(room: str):
     
     描述：
     獲取指定房間內的在線參與者列表，僅返回在線的參與者資訊。
+    在線名單沒有變動時，帶上次回應 ETag 的 If-None-Match 請求會得到 304。
     
     參數：
     - room (str): 房間代碼
@@ -470,20 +500,7 @@ def get_participants(room: str):
     回傳：
     - participants (list): 在線的參與者資訊
     """
-    now = get_current_timestamp()
-    online = []
-    
-    if room in ROOMS and "participants_list" in ROOMS[room]:
-        online = [
-            {"device_id": p["device_id"], "nickname": p["nickname"]}
-            for p in ROOMS[room]["participants_list"]
-            if (now - p["last_seen"]) <= 10
-        ]
-        ROOMS[room]["participants_list"] = [
-            p for p in ROOMS[room]["participants_list"]
-            if (now - p["last_seen"]) <= 30
-        ]
-    return {"participants": online}
+    return await run_conditional_room_read(request, room, _online_participants_tag, _online_participants)
 
 @router.post("/api/room_status")
 def set_room_status(room: str = Body(...), status: str = Body(...)):
@@ -507,14 +524,23 @@ def set_room_status(room: str = Body(...), status: str = Body(...)):
     if status not in ["Stop", "Discussion", "End"]:
         return {"success": True, "status": "NotFound"}
     
-    if room not in ROOMS:
-        return {"success": True, "status": "NotFound"}
-    
-    ROOMS[room]["status"] = status
+    store = get_storage()
+    with store.room_lock(room):
+        if not store.room_exists(room):
+            return {"success": True, "status": "NotFound"}
+
+        store.update_room(room, status=status)
     return {"success": True, "status": status}
 
+def _room_status(room):
+    # 如果找不到房間狀態，預設為 NotFound
+    room_info = get_storage().get_room(room)
+    if room_info is None:
+        return {"status": "NotFound"}
+    return {"status": room_info.status}
+
 @router.get("/api/room_status")
-def get_room_status(room: str):
+async def get_room_status(room: str, request: Request):
     """
     獲取房間狀態
     
@@ -522,6 +548,7 @@ def get_room_status(room: str):
     
     描述：
     獲取指定房間的當前狀態。
+    ETag 由房間版本產生，狀態沒有變動時帶 If-None-Match 的請求會得到 304。
     
     參數：
     - room (str): 房間代碼
@@ -529,17 +556,14 @@ def get_room_status(room: str):
     返回值：
     - status (str): 當前房間狀態，可能的值有 NotFound、Stop、Discussion 或 End
     """
-    # 如果找不到房間狀態，預設為 NotFound
-    if room not in ROOMS:
-        return {"status": "NotFound"}
-    return {"status": ROOMS[room]["status"]}
+    return await run_conditional_room_read(request, room, _version_tag, _room_status)
 
 # 主持人設定主題與倒數
 @router.post("/api/room_state")
 def set_room_state(room: str = Body(...),
                    topic: str = Body(...),
                    countdown: int = Body(...),
-                   time_start: float = Body(...)):
+                   time_start: Optional[float] = Body(None)):
     """
     設定房間主題與倒數計時
     
@@ -547,93 +571,144 @@ def set_room_state(room: str = Body(...),
     
     描述：
     設定指定房間的討論主題和倒數計時，並自動將房間狀態設為 Discussion（計時討論中）。
+    倒數從伺服器收到請求的時間開始，結束時伺服器自動將房間切換為 Stop（見 api/countdown.py）。
     
     參數：
     - room (str): 房間代碼
     - topic (str): 討論主題
     - countdown (int): 倒數計時秒數
-    - time_start (float): 計時開始時間的 Unix 時間戳（秒）
+    - time_start (float, optional): 已不採用，開始時間一律以伺服器時間為準，避免客戶端時鐘誤差（保留以相容舊版客戶端）
     
     回傳：
     - success (bool): 是否成功設定主題與倒數
     - status (str): 當前房間狀態，應為 Discussion
+    - deadline (float): 倒數結束的 Unix 時間戳（伺服器時間）
     """
-    if room not in ROOMS:
-        return {"success": False, "error": "房間不存在"}
+    store = get_storage()
+    countdown = max(0, countdown)
+    with store.room_lock(room):
+        if not store.room_exists(room):
+            return {"success": False, "error": "房間不存在"}
+
+        # 更新房間資料，狀態與開始時間在同一次寫入中設定
+        time_start = get_current_timestamp()
+        store.update_room(room, current_topic=topic, countdown=countdown, time_start=time_start, status="Discussion")
+
+        # 確保主題存在
+        store.ensure_topic(room, topic)
+        return {"success": True, "status": "Discussion", "deadline": time_start + countdown}
+
+def _countdown_left(room_info):
+    if room_info.status in ["End", "Stop", "NotFound"]:
+        return 0
+    now = get_current_timestamp()
+    return max(0, int(room_info.countdown - (now - room_info.time_start))) if room_info.time_start else 0
+
+def _room_state_tag(room, since=None, *page):
+    # 倒數進行中時剩餘秒數每秒都會改變，也要納入 ETag；增量回應的內容另取決於 since
+    # 分頁參數只會出現在同一 URL 的請求中，ETag 依 HTTP 規範只與同一 URL 比對，不需要納入
+    store = get_storage()
+    version = store.room_version(room)
+    room_info = store.get_room(room)
+    if room_info is None or not version:
+        return None
+    return f'"{version}.{_countdown_left(room_info)}.{since if since is not None else ""}"'
+
+def _comment_page(room, topic, after_id=None, since_ts=None, limit=None):
+    """
+    讀取主題留言（依時間戳遞增）：沒有分頁參數時回傳完整留言 {"comments"}；
+    有 after_id / since_ts / limit 時只回傳游標之後的一頁，另附 has_more 與下一頁的游標 next_cursor（該頁最後一則留言的 ID）
+    """
+    store = get_storage()
+    if after_id is None and since_ts is None and limit is None:
+        return {"comments": (store.get_comment_payloads(room, topic) if topic else None) or []}
+    page = store.get_comment_page(room, topic, after_id, since_ts, limit) if topic else None
+    if page is None:
+        # after_id 已被刪除且沒有 since_ts 可退回時，客戶端應改以 since_ts 或不帶游標重新讀取
+        if after_id is not None and topic and store.topic_exists(room, topic):
+            raise HTTPException(status_code=404, detail="Comment not found")
+        page = [], False
+    comments, has_more = page
+    return {
+        "comments": comments,
+        "has_more": has_more,
+        "next_cursor": comments[-1]["id"] if comments else after_id,
+    }
+
+def _room_state(room, since=None, after_id=None, since_ts=None, limit=None):
+    store = get_storage()
+    # 先取得版本再讀取資料，讀取期間有其他寫入時回應的內容只會比版本新
+    version = store.room_version(room)
+    room_info = store.get_room(room)
+    if room_info is None:
+        raise HTTPException(status_code=404, detail="Room not found")
     
-    # 更新房間資料
-    ROOMS[room]["current_topic"] = topic
-    ROOMS[room]["countdown"] = countdown
-    ROOMS[room]["time_start"] = time_start
+    current_status = room_info.status
+    left = _countdown_left(room_info)
+    deadline = countdown_deadline(room_info)
     
-    # 創建主題ID並確保主題存在於 topics 字典中
-    topic_id = f"{room}_{topic}"
-    if topic_id not in topics:
-        topics[topic_id] = {
-            "room_id": room,
-            "topic_name": topic,
-            "comments": []
-        }
-    return {"success": True, "status": "Discussion"}
+    current_topic = room_info.current_topic
+
+    # 有 since 時只回傳該版本之後的留言變更，無法增量同步時改回傳完整留言
+    changes = None
+    if since is not None and current_topic:
+        changes = store.get_comment_changes(room, current_topic, since)
+    delta = changes is not None
+    if not delta:
+        changes = _comment_page(room, current_topic, after_id, since_ts, limit)
+    
+    return {
+        "topic": current_topic,
+        "countdown": left,
+        "deadline": deadline if left else None,
+        **changes,
+        "status": current_status,
+        "settings": room_info.settings,
+        "version": version,
+        "delta": delta
+    }
 
 # 取得主題、倒數、留言 (RESTful 風格)
 @router.get("/api/rooms/{room}/state")
-def get_room_state(room: str):
+async def get_room_state(room: str, request: Request, since: Optional[int] = None,
+                         after_id: Optional[str] = None, since_ts: Optional[float] = None,
+                         limit: Optional[int] = Query(None, ge=1, le=MAX_COMMENT_PAGE)):
     """
     取得房間狀態
     
-    [GET] /api/rooms/{room}/state
+    [GET] /api/rooms/{room}/state?since={version}&after_id={comment_id}&since_ts={ts}&limit={n}
     
     描述：
     取得指定房間的當前狀態，包括主題、倒數計時和當前主題的留言。
+    帶上前一次回應的 version 作為 since 時，只回傳之後新增、修改與刪除的留言及票數變動（delta 為 true）；
+    切換主題或 since 過舊時仍回傳完整留言（delta 為 false），客戶端應整份取代。
+    無法增量同步時可再帶 after_id / since_ts / limit 分頁讀取留言（同 /comments），只取得客戶端還沒有的部分。
+    ETag 由房間版本、剩餘秒數與 since 組成，內容沒有變動時帶 If-None-Match 的請求會得到 304。
     
     參數：
     - room (str): 房間代碼 (路徑參數)
+    - since (int, optional): 客戶端已套用的房間版本 (查詢參數)
+    - after_id (str, optional): 只回傳此留言之後的留言 (查詢參數)
+    - since_ts (float, optional): 只回傳時間戳大於此值的留言，after_id 已被刪除時也以此為準 (查詢參數)
+    - limit (int, optional): 最多回傳的留言數，1 至 500 (查詢參數)
     
     返回值：
     - topic (str): 當前討論主題
     - countdown (int): 剩餘倒數時間（秒）
-    - comments (list): 當前主題的留言列表
+    - deadline (float | None): 倒數結束的 Unix 時間戳（伺服器時間），沒有進行中的倒數時為 None；
+      客戶端以 GET /api/time 估算時鐘差後可自行顯示剩餘時間，不必為了倒數重新讀取房間狀態
+    - comments (list): 當前主題的留言列表；delta 為 true 時只有新增或內容改變的留言，以 id 取代或加入
     - status (str): 房間狀態
+    - settings (dict): 房間設定
+    - version (int): 房間資料版本，數值越大資料越新（多 worker 時可用來忽略較舊的回應）
+    - delta (bool): 是否為增量回應
+    - vote_counts (dict): 只有票數改變的留言 {comment_id: {vote_good, vote_bad, votes}}（僅 delta 為 true 時）
+    - deleted (list): 已刪除的留言ID（僅 delta 為 true 時）
+    - has_more (bool): 游標之後是否還有更多留言（僅分頁讀取時）
+    - next_cursor (str): 下一頁的 after_id（僅分頁讀取時）
     """
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    room_info = ROOMS[room]
-    
-    current_status = room_info["status"]
-    if current_status in ["End", "Stop", "NotFound"]:
-        left = 0
-    else:
-        now = get_current_timestamp()
-        left = max(0, int(room_info["countdown"] - (now - room_info["time_start"]))) if room_info["time_start"] else 0
-    
-    current_topic = room_info["current_topic"]
-    current_comments = []
-    if current_topic:
-        topic_id = f"{room}_{current_topic}"
-        if topic_id in topics:
-            comments_with_votes = []
-            for comment in topics[topic_id]["comments"]:
-                comment_id = comment["id"]
-                vote_good = len(votes.get(comment_id, {}).get("good", []))
-                vote_bad = len(votes.get(comment_id, {}).get("bad", []))
-                
-                comment_with_votes = comment.copy()
-                comment_with_votes["vote_good"] = vote_good
-                comment_with_votes["vote_bad"] = vote_bad
-                comment_with_votes["votes"] = vote_good
-                comments_with_votes.append(comment_with_votes)
-            
-            current_comments = comments_with_votes
-    
-    return {
-        "topic": current_topic,
-        "countdown": left,
-        "comments": current_comments,
-        "status": current_status,
-        "settings": room_info.get("settings", {"allowQuestions": True, "allowVoting": True})
-    }
+    return await run_conditional_room_read(request, room, _room_state_tag, _room_state,
+                                           since, after_id, since_ts, limit)
 
 # 新增留言 (RESTful 風格)
 @router.post("/api/rooms/{room}/comments")
@@ -641,87 +716,108 @@ def add_comment(room: str, data: CommentRequest):
     """
     新增留言到當前主題
     """
-    if room not in ROOMS:
+    store = get_storage()
+    with store.room_lock(room):
+        room_info = store.get_room(room)
+        if room_info is None:
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        if not room_info.settings.get("allowQuestions", True):
+            raise HTTPException(status_code=403, detail="主持人已關閉新意見提交功能")
+
+        current_topic = room_info.current_topic
+        if not current_topic:
+            raise HTTPException(status_code=400, detail="No active topic in the room")
+
+        # 取得提交者的 device_id
+        # 這是一個簡化的假設，正式產品中應有更安全的驗證
+        device_id = store.find_device_by_nickname(room, data.nickname)
+
+        comment_id = str(uuid.uuid4())
+        new_comment = Comment(
+            id=comment_id,
+            nickname=data.nickname,
+            content=data.content,
+            ts=get_current_timestamp(),
+            isAISummary=data.isAISummary,
+            device_id=device_id  # *** 重要：儲存 device_id ***
+        )
+
+        store.add_comment(room, current_topic, new_comment)
+        return {"success": True, "comment_id": comment_id}
+
+def _room_comments(room, after_id=None, since_ts=None, limit=None):
+    store = get_storage()
+    room_info = store.get_room(room)
+    if room_info is None:
         raise HTTPException(status_code=404, detail="Room not found")
-    
-    if not ROOMS[room].get("settings", {}).get("allowQuestions", True):
-        raise HTTPException(status_code=403, detail="主持人已關閉新意見提交功能")
 
-    current_topic = ROOMS[room]["current_topic"]
-    if not current_topic:
-        raise HTTPException(status_code=400, detail="No active topic in the room")
-    
-    topic_id = f"{room}_{current_topic}"
-    if topic_id not in topics:
-        topics[topic_id] = {
-            "room_id": room,
-            "topic_name": current_topic,
-            "comments": []
-        }
-    
-    # 取得提交者的 device_id
-    # 這是一個簡化的假設，正式產品中應有更安全的驗證
-    device_id = None
-    if "participants_list" in ROOMS[room]:
-        for p in ROOMS[room]["participants_list"]:
-            if p['nickname'] == data.nickname:
-                device_id = p['device_id']
-                break
-
-    comment_id = str(uuid.uuid4())
-    new_comment = {
-        "id": comment_id,
-        "nickname": data.nickname,
-        "content": data.content,
-        "ts": get_current_timestamp(),
-        "isAISummary": data.isAISummary,
-        "device_id": device_id  # *** 重要：儲存 device_id ***
-    }
-    
-    topics[topic_id]["comments"].append(new_comment)
-    return {"success": True, "comment_id": comment_id}
+    # 留言在新增時即依時間戳排列，不需要再排序
+    return _comment_page(room, room_info.current_topic, after_id, since_ts, limit)
 
 # 取得所有留言 (RESTful 風格)
 @router.get("/api/rooms/{room}/comments")
-def get_room_comments(room: str):
+async def get_room_comments(room: str, request: Request, after_id: Optional[str] = None,
+                            since_ts: Optional[float] = None,
+                            limit: Optional[int] = Query(None, ge=1, le=MAX_COMMENT_PAGE)):
     """
     取得房間當前主題的留言 
     
-    [GET] /api/rooms/{room}/comments
+    [GET] /api/rooms/{room}/comments?after_id={comment_id}&since_ts={ts}&limit={n}
     
     描述：
-    取得指定房間當前主題的所有留言，並按照時間戳升冪排序。
+    取得指定房間當前主題的留言，按照時間戳升冪排序。
+    不帶參數時回傳所有留言；留言串很長時可帶上已有的最後一則留言 ID（after_id）或時間戳（since_ts）
+    與每頁數量（limit），只取得之後的留言，再以回應的 next_cursor 作為下一次的 after_id，直到 has_more 為 false。
+    after_id 已被刪除時改以 since_ts 為準，也沒有 since_ts 時回傳 404。
+    ETag 由房間版本產生，留言與票數沒有變動時帶 If-None-Match 的請求會得到 304。
     
     參數：
     - room (str): 房間代碼 (路徑參數)
+    - after_id (str, optional): 只回傳此留言之後的留言 (查詢參數)
+    - since_ts (float, optional): 只回傳時間戳大於此值的留言 (查詢參數)
+    - limit (int, optional): 最多回傳的留言數，1 至 500 (查詢參數)
     
     返回值：
     - comments (list): 當前主題的留言列表
+    - has_more (bool): 游標之後是否還有更多留言（僅分頁讀取時）
+    - next_cursor (str): 下一頁的 after_id（僅分頁讀取時）
     """
-    if room not in ROOMS:
+    return await run_conditional_room_read(request, room, _version_tag, _room_comments, after_id, since_ts, limit)
+
+def _top_comments(room, topic, n):
+    store = get_storage()
+    if not store.room_exists(room):
         raise HTTPException(status_code=404, detail="Room not found")
-        
-    current_topic = ROOMS[room]["current_topic"]
-    if not current_topic:
-        return {"comments": []}
-        
-    topic_id = f"{room}_{current_topic}"
-    if topic_id not in topics:
-        return {"comments": []}
-
-    comments_with_votes = []
-    for comment in topics[topic_id]["comments"]:
-        comment_id = comment["id"]
-        vote_good = len(votes.get(comment_id, {}).get("good", []))
-        vote_bad = len(votes.get(comment_id, {}).get("bad", []))
-        
-        comment_with_votes = comment.copy()
-        comment_with_votes["vote_good"] = vote_good
-        comment_with_votes["vote_bad"] = vote_bad
-        comment_with_votes["votes"] = vote_good
-        comments_with_votes.append(comment_with_votes)
-    
-    return {"comments": sorted(comments_with_votes, key=lambda x: x["ts"])}
+    comments = store.get_top_comments(room, topic, n)
+    if comments is None:
+        raise HTTPException(status_code=404, detail=f"Topic '{topic}' not found in this room")
+    return {"topic": topic, "comments": comments}
+
+# 取得主題的高票留言 (RESTful 風格)
+@router.get("/api/rooms/{room}/topics/{topic}/top")
+async def get_top_comments(room: str, topic: str, request: Request,
+                           n: int = Query(10, ge=1, le=MAX_COMMENT_PAGE)):
+    """
+    取得主題的高票留言
+
+    [GET] /api/rooms/{room}/topics/{topic}/top?n={n}
+
+    描述：
+    依好評數減差評數由高到低回傳主題的前 n 則留言，同分時較新的留言在前，不含 AI 總結。
+    排行在新增、刪除留言與投票時同步維護，讀取只需取出前 n 則，不必排序整個主題。
+    ETag 由房間版本產生，票數沒有變動時帶 If-None-Match 的請求會得到 304。
+
+    參數：
+    - room (str): 房間代碼 (路徑參數)
+    - topic (str): 主題名稱 (路徑參數)
+    - n (int, optional): 回傳的留言數，1 至 500，預設 10 (查詢參數)
+
+    返回值：
+    - topic (str): 主題名稱
+    - comments (list): 依排名排列的留言（格式同 /comments）
+    """
+    return await run_conditional_room_read(request, room, _version_tag, _top_comments, topic, n)
 
 # 刪除單一留言 (RESTful 風格)
 @router.delete("/api/rooms/{room}/comments/{comment_id}")
@@ -741,27 +837,14 @@ def delete_comment_single(room: str, comment_id: str):
     回傳：
     - success (bool): 是否刪除成功
     """
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
+    store = get_storage()
+    with store.room_lock(room):
+        if not store.room_exists(room):
+            raise HTTPException(status_code=404, detail="Room not found")
 
-    found = False
-    affected_topic_name = None
-    for topic_key, topic_obj in list(topics.items()):
-        if topic_obj.get("room_id") != room:
-            continue
-        comments_list = topic_obj.get("comments", [])
-        idx = next((i for i, c in enumerate(comments_list) if c.get("id") == comment_id), None)
-        if idx is not None:
-            affected_topic_name = topic_obj.get("topic_name", "")
-            comments_list.pop(idx)
-            found = True
-            break
-
-    if not found:
-        raise HTTPException(status_code=404, detail="Comment not found")
-
-    if comment_id in votes:
-        del votes[comment_id]
+        # 同時刪除留言與其投票紀錄
+        if not store.delete_comment(room, comment_id):
+            raise HTTPException(status_code=404, detail="Comment not found")
 
     return {"success": True}
 
@@ -791,33 +874,23 @@ def vote_comment(room: str, comment_id: str, data: VoteRequest):
     if vote_type not in ["good", "bad"]:
         raise HTTPException(status_code=400, detail="Invalid vote type")
     
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    if not ROOMS[room].get("settings", {}).get("allowVoting", True):
-        raise HTTPException(status_code=403, detail="主持人已關閉投票功能")
+    store = get_storage()
+    with store.room_lock(room):
+        room_info = store.get_room(room)
+        if room_info is None:
+            raise HTTPException(status_code=404, detail="Room not found")
 
-    comment_found = any(
-        c["id"] == comment_id 
-        for t in topics.values() if t["room_id"] == room 
-        for c in t["comments"]
-    )
-    if not comment_found:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    
-    if comment_id not in votes:
-        votes[comment_id] = {"good": [], "bad": []}
-    
-    if device_id in votes[comment_id][vote_type]:
-        raise HTTPException(status_code=409, detail="Already voted")
-    
-    opposite_type = "bad" if vote_type == "good" else "good"
-    if device_id in votes[comment_id][opposite_type]:
-        votes[comment_id][opposite_type].remove(device_id)
-    
-    votes[comment_id][vote_type].append(device_id)
-    
-    return {"success": True}
+        if not room_info.settings.get("allowVoting", True):
+            raise HTTPException(status_code=403, detail="主持人已關閉投票功能")
+
+        if not store.comment_exists(room, comment_id):
+            raise HTTPException(status_code=404, detail="Comment not found")
+
+        # 已投過相同類型時拒絕；投過相反類型則自動改票
+        if not store.cast_vote(room, comment_id, device_id, vote_type):
+            raise HTTPException(status_code=409, detail="Already voted")
+
+        return {"success": True}
 
 # 取消投票 (RESTful 風格)
 @router.delete("/api/rooms/{room}/comments/{comment_id}/vote")
@@ -845,22 +918,40 @@ def remove_vote_comment(room: str, comment_id: str, data: VoteRequest):
     if vote_type not in ["good", "bad"]:
         raise HTTPException(status_code=400, detail="Invalid vote type")
     
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
-        
-    if not ROOMS[room].get("settings", {}).get("allowVoting", True):
-        raise HTTPException(status_code=403, detail="主持人已關閉投票功能")
+    store = get_storage()
+    with store.room_lock(room):
+        room_info = store.get_room(room)
+        if room_info is None:
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        if not room_info.settings.get("allowVoting", True):
+            raise HTTPException(status_code=403, detail="主持人已關閉投票功能")
+
+        if not store.comment_exists(room, comment_id):
+            raise HTTPException(status_code=404, detail="Vote not found")
 
-    if comment_id not in votes or device_id not in votes[comment_id][vote_type]:
-        raise HTTPException(status_code=404, detail="Vote not found")
+        if not store.retract_vote(room, comment_id, device_id, vote_type):
+            raise HTTPException(status_code=404, detail="Vote not found")
+
+        return {"success": True}
+
+def _device_votes(room, device_id):
+    voted_good = []
+    voted_bad = []
     
-    votes[comment_id][vote_type].remove(device_id)
+    store = get_storage()
+    if store.room_exists(room):
+        for comment_id, vote_type in store.get_device_votes(room, device_id).items():
+            if vote_type == "good":
+                voted_good.append(comment_id)
+            else:
+                voted_bad.append(comment_id)
     
-    return {"success": True}
+    return {"voted_good": voted_good, "voted_bad": voted_bad}
 
 # 獲取用戶投票記錄 (RESTful 風格)
 @router.get("/api/rooms/{room}/votes")
-def get_user_votes(room: str, device_id: str):
+async def get_user_votes(room: str, device_id: str):
     """
     獲取用戶的投票記錄
     
@@ -877,21 +968,40 @@ def get_user_votes(room: str, device_id: str):
     - voted_good (list): 已投好評的留言ID列表
     - voted_bad (list): 已投差評的留言ID列表
     """
-    voted_good = []
-    voted_bad = []
-    
-    if room in ROOMS:
-        for topic_id, topic_data in topics.items():
-            if topic_data["room_id"] == room:
-                for comment in topic_data["comments"]:
-                    comment_id = comment["id"]
-                    if comment_id in votes:
-                        if device_id in votes[comment_id].get("good", []):
-                            voted_good.append(comment_id)
-                        if device_id in votes[comment_id].get("bad", []):
-                            voted_bad.append(comment_id)
-    
-    return {"voted_good": voted_good, "voted_bad": voted_bad}
+    return await run_room_read(room, _device_votes, device_id)
+
+def _sync_participant(room, device_id, since=None):
+    # 先讀取房間狀態：房間不存在時直接回傳 404，不替不存在的房間記錄心跳
+    state = _room_state(room, since)
+    online_count = get_storage().touch_participant(room, device_id, get_current_timestamp())
+    return {"state": state, "votes": _device_votes(room, device_id), "online_count": online_count}
+
+# 參與者同步 (心跳 + 房間狀態 + 自己的投票 + 在線人數)
+@router.post("/api/rooms/{room}/sync")
+async def sync_participant(room: str, data: SyncRequest):
+    """
+    參與者同步
+
+    [POST] /api/rooms/{room}/sync
+
+    描述：
+    以一次請求取代參與者定時呼叫的心跳、房間狀態、投票記錄與在線名單：
+    記錄心跳後回傳房間狀態、該裝置的投票記錄與在線人數。
+
+    參數：
+    - room (str): 房間代碼 (路徑參數)
+    - device_id (str): 參與者裝置ID
+    - since (int, optional): 客戶端已套用的房間版本，與 GET /api/rooms/{room}/state?since= 相同
+
+    返回值：
+    - state (dict): 與 GET /api/rooms/{room}/state 相同的房間狀態（帶 since 時為增量）
+    - votes (dict): 與 GET /api/rooms/{room}/votes 相同的投票記錄 {voted_good, voted_bad}
+    - online_count (int): 在線人數
+
+    錯誤：
+    - 404: 房間不存在
+    """
+    return await run_room_read(room, _sync_participant, data.device_id, data.since)
 
 # 更新房間設定 (新增的端點)
 @router.put("/api/rooms/{room}/settings")
@@ -899,13 +1009,18 @@ def update_room_settings(room: str, new_settings: RoomSettingsRequest):
     """
     更新房間的問答與投票設定
     """
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    ROOMS[room]["settings"]["allowQuestions"] = new_settings.allowQuestions
-    ROOMS[room]["settings"]["allowVoting"] = new_settings.allowVoting
-    
-    return {"success": True, "settings": ROOMS[room]["settings"]}
+    store = get_storage()
+    with store.room_lock(room):
+        room_info = store.get_room(room)
+        if room_info is None:
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        settings = dict(room_info.settings)
+        settings["allowQuestions"] = new_settings.allowQuestions
+        settings["allowVoting"] = new_settings.allowVoting
+        store.update_room(room, settings=settings)
+
+        return {"success": True, "settings": settings}
 
 # 更新參與者暱稱 (RESTful 風格)
 
@@ -919,29 +1034,19 @@ def update_participant_nickname(room: str, device_id: str, data: UpdateNicknameR
     if not new_nickname or len(new_nickname) > 10:
         raise HTTPException(status_code=400, detail="暱稱格式不符或過長")
 
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="討論室不存在")
-    
-    # 1. 更新參與者列表中的暱稱
-    participant_found = False
-    if "participants_list" in ROOMS[room]:
-        for p in ROOMS[room]["participants_list"]:
-            if p['device_id'] == device_id:
-                p['nickname'] = new_nickname
-                participant_found = True
-                break
-    
-    if not participant_found:
-        raise HTTPException(status_code=404, detail="參與者不存在")
-    
-    # 2. *** 重要：使用 device_id 更新該用戶所有留言的暱稱 ***
-    for topic in topics.values():
-        if topic["room_id"] == room:
-            for comment in topic["comments"]:
-                if comment.get("device_id") == device_id:
-                    comment["nickname"] = new_nickname
-    
-    return {"success": True, "message": "暱稱已更新"}
+    store = get_storage()
+    with store.room_lock(room):
+        if not store.room_exists(room):
+            raise HTTPException(status_code=404, detail="討論室不存在")
+
+        # 1. 更新參與者列表中的暱稱
+        if not store.set_participant_nickname(room, device_id, new_nickname):
+            raise HTTPException(status_code=404, detail="參與者不存在")
+
+        # 2. 更新留言作者的暱稱：留言以 device_id 對應作者，讀取時才顯示作者目前的暱稱，不逐則改寫留言
+        store.update_author_nickname(room, device_id, new_nickname)
+
+        return {"success": True, "message": "暱稱已更新"}
 
 # 更新當前主題 (RESTful 風格)
 @router.put("/api/rooms/{room}/topic")
@@ -962,26 +1067,22 @@ def update_current_topic(room: str, data: TopicUpdateRequest):
     - success (bool): 是否成功更新
     - status (str): 更新後房間的狀態
     """
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    new_topic = data.topic.strip()
-    
-    # 檢查新主題是否存在於該房間的主題列表中
-    topic_id = f"{room}_{new_topic}"
-    if topic_id not in topics:
+    store = get_storage()
+    with store.room_lock(room):
+        if not store.room_exists(room):
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        new_topic = data.topic.strip()
+
+        # 檢查新主題是否存在於該房間的主題列表中
         # 如果主題不存在，可以選擇創建它或返回錯誤
         # 這裡我們選擇創建它，以符合新增主題後直接切換的流程
-        topics[topic_id] = {
-            "room_id": room,
-            "topic_name": new_topic,
-            "comments": []
-        }
+        store.ensure_topic(room, new_topic)
 
-    ROOMS[room]["current_topic"] = new_topic
-    ROOMS[room]["status"] = "Discussion" # 切換主題時自動進入討論狀態
-    
-    return {"success": True, "status": ROOMS[room]["status"]}
+        # 切換主題時自動進入討論狀態
+        store.update_room(room, current_topic=new_topic, status="Discussion")
+
+        return {"success": True, "status": "Discussion"}
 
 # 重新命名主題 (RESTful 風格)
 @router.post("/api/rooms/{room}/topics/rename")
@@ -989,72 +1090,59 @@ def rename_topic(room: str, data: RenameTopicRequest):
     """
     重新命名一個主題
     """
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
+    store = get_storage()
+    with store.room_lock(room):
+        room_info = store.get_room(room)
+        if room_info is None:
+            raise HTTPException(status_code=404, detail="Room not found")
 
-    old_topic_name = data.old_topic.strip()
-    new_topic_name = data.new_topic.strip()
+        old_topic_name = data.old_topic.strip()
+        new_topic_name = data.new_topic.strip()
 
-    if not old_topic_name or not new_topic_name:
-        raise HTTPException(status_code=400, detail="Topic names cannot be empty")
-    
-    if old_topic_name == new_topic_name:
-        return {"success": True, "is_current_topic": False, "detail": "No change in topic name."}
+        if not old_topic_name or not new_topic_name:
+            raise HTTPException(status_code=400, detail="Topic names cannot be empty")
 
-    old_topic_id = f"{room}_{old_topic_name}"
-    new_topic_id = f"{room}_{new_topic_name}"
+        if old_topic_name == new_topic_name:
+            return {"success": True, "is_current_topic": False, "detail": "No change in topic name."}
 
-    if old_topic_id not in topics:
-        raise HTTPException(status_code=404, detail=f"Old topic '{old_topic_name}' not found")
-    
-    if new_topic_id in topics:
-        raise HTTPException(status_code=409, detail=f"New topic name '{new_topic_name}' already exists")
+        if not store.topic_exists(room, old_topic_name):
+            raise HTTPException(status_code=404, detail=f"Old topic '{old_topic_name}' not found")
+
+        if store.topic_exists(room, new_topic_name):
+            raise HTTPException(status_code=409, detail=f"New topic name '{new_topic_name}' already exists")
 
-    # 更新 topics 字典
-    topic_data = topics.pop(old_topic_id)
-    topic_data['topic_name'] = new_topic_name
-    topics[new_topic_id] = topic_data
+        # 更新主題名稱（保留原本順序）
+        store.rename_topic(room, old_topic_name, new_topic_name)
 
-    # 檢查是否為當前主題
-    is_current = (ROOMS[room].get("current_topic") == old_topic_name)
-    if is_current:
-        ROOMS[room]["current_topic"] = new_topic_name
+        # 檢查是否為當前主題
+        is_current = (room_info.current_topic == old_topic_name)
+        if is_current:
+            store.update_room(room, current_topic=new_topic_name)
 
-    return {"success": True, "is_current_topic": is_current}
+        return {"success": True, "is_current_topic": is_current}
 
 @router.delete("/api/rooms/{room_code}/topics/{topic_title}")
-async def delete_room_topic(room_code: str, topic_title: str):
+def delete_room_topic(room_code: str, topic_title: str):
     """
     刪除一個主題及其所有相關資料。
     """
-    if room_code not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
-
-    room = ROOMS[room_code]
-    topic_id_to_delete = f"{room_code}_{topic_title}"
-
-    if topic_id_to_delete not in topics:
-        raise HTTPException(status_code=404, detail=f"Topic '{topic_title}' not found in this room")
+    store = get_storage()
+    with store.room_lock(room_code):
+        room = store.get_room(room_code)
+        if room is None:
+            raise HTTPException(status_code=404, detail="Room not found")
 
-    # 1. 收集要刪除的留言ID
-    comments_in_topic = topics[topic_id_to_delete].get("comments", [])
-    comment_ids_to_delete = [c.get("id") for c in comments_in_topic if c.get("id")]
+        # 1. 刪除主題本身，連同其留言與相關的投票
+        if not store.remove_topic(room_code, topic_title):
+            raise HTTPException(status_code=404, detail=f"Topic '{topic_title}' not found in this room")
 
-    # 2. 刪除相關的投票
-    for comment_id in comment_ids_to_delete:
-        if comment_id in votes:
-            del votes[comment_id]
+        # 2. 如果被刪除的是當前主題，則更新房間的當前主題
+        if room.current_topic == topic_title:
+            # 尋找一個新的主題來設定為當前主題
+            remaining_topics = store.list_topic_names(room_code)
+            store.update_room(room_code, current_topic=remaining_topics[0] if remaining_topics else None)
 
-    # 3. 刪除主題本身
-    del topics[topic_id_to_delete]
-
-    # 4. 如果被刪除的是當前主題，則更新房間的當前主題
-    if room.get("current_topic") == topic_title:
-        # 尋找一個新的主題來設定為當前主題
-        remaining_topics = [t['topic_name'] for t_id, t in topics.items() if t.get("room_id") == room_code]
-        room["current_topic"] = remaining_topics[0] if remaining_topics else None
-    
-    return {"success": True, "detail": f"Topic '{topic_title}' and its comments have been deleted."}
+        return {"success": True, "detail": f"Topic '{topic_title}' and its comments have been deleted."}
 
 
 # --- 舊的 API 端點 (標記為棄用，稍後移除) ---
@@ -1083,11 +1171,7 @@ def get_all_rooms():
     - topics (list): 所有主題的資訊列表
     - votes (dict): 所有投票的資訊
     """
-    return {
-        "ROOMS": ROOMS, 
-        "topics": topics, 
-        "votes": votes
-    }
+    return get_storage().dump()
 
 @router.post("/api/room_update_info")
 def update_room_info(data: UpdateRoomInfoRequest):
@@ -1119,13 +1203,16 @@ def update_room_info(data: UpdateRoomInfoRequest):
     if new_summary is not None and len(new_summary) > 2000:
         raise HTTPException(status_code=400, detail="Summary is too long")
 
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    ROOMS[room]["title"] = new_title
-    if new_summary is not None:
-        ROOMS[room]["topic_summary"] = new_summary
-        
+    store = get_storage()
+    with store.room_lock(room):
+        if not store.room_exists(room):
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        if new_summary is not None:
+            store.update_room(room, title=new_title, topic_summary=new_summary)
+        else:
+            store.update_room(room, title=new_title)
+
     return {
         "success": True,
         "room_code": room,
@@ -1151,10 +1238,13 @@ def set_room_allow_join(data: AllowJoinRequest):
     - success (bool): 是否成功設定
     """
     room = data.room.strip()
-    if room not in ROOMS:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    # 這裡我們假設有一個設定來控制，如果沒有，可以添加到 ROOMS 結構中
-    ROOMS[room].setdefault("settings", {})["allowJoin"] = data.allow_join
-    
-    return {"success": True}
+    store = get_storage()
+    with store.room_lock(room):
+        room_info = store.get_room(room)
+        if room_info is None:
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        # 這裡我們假設有一個設定來控制，如果沒有，可以添加到房間的 settings 中
+        store.update_room(room, settings=dict(room_info.settings, allowJoin=data.allow_join))
+
+        return {"success": True}
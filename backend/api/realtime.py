@@ -0,0 +1,437 @@
+"""
+房間即時推播（WebSocket / Server-Sent Events）
+參與者與主持人訂閱房間，取代每 3–5 秒的房間狀態、留言、在線名單輪詢與心跳：
+- WebSocket：/ws/rooms/{room}?device_id=...
+- SSE：GET /api/rooms/{room}/events?device_id=...，只用一般的 HTTP 回應，適用於 WebSocket 不穩定的網路與反向代理
+
+兩種方式推送相同的事件：
+- 訂閱後先收到完整的房間狀態、主題列表與在線名單
+- 房間資料改變時（儲存後端的變更通知，多 worker 時也包含其他 worker 的寫入）推送 state 事件，
+  內容與 GET /api/rooms/{room}/state?since= 的增量回應相同：新增、修改、刪除的留言、票數、主題、狀態與倒數
+- 主題新增、重新命名或刪除時推送 topics 事件 {"topics": [主題名稱...]}（依建立順序的完整列表）
+- 在線名單改變時推送 participants 事件
+- 倒數結束、伺服器將房間切換為休息中時推送 countdown 事件 {"status": "Stop", "deadline", "expired_at"}，
+  隨後的 state 事件同樣會反映新的狀態（見 api/countdown.py）
+- 帶 device_id 的訂閱本身代表在線：訂閱期間伺服器定期更新該裝置的活動時間，客戶端不需要送心跳
+
+訊息格式：
+- WebSocket：JSON 文字訊息 {"type": "state", ...} / {"type": "topics", "topics": [...]} /
+  {"type": "participants", "participants": [...]} / {"type": "countdown", ...}
+- SSE：event 為 state / topics / participants / countdown，data 為相同的 JSON；state 事件的 id 為房間版本，
+  重新連線時瀏覽器以 Last-Event-ID 帶回，伺服器只補送該版本之後的變更
+
+每間房間一個 RoomChannel：變更通知只把房間標記為需要推送，同一段時間內的多次變更合併為一次推送；
+每則訊息只產生與序列化一次（每種格式一份字串），再放入各訂閱者的傳送佇列，所有訂閱者共用同一份字串。
+慢的訂閱者不會拖慢同房間的其他訂閱者，佇列滿了就結束該訂閱（客戶端重新連線後會補上遺漏的變更）。
+"""
+
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse
+
+from .countdown import countdown_timers
+from .data_store import ONLINE_WINDOW
+from .participants import (
+    run_room_read, get_current_timestamp, _room_state, _online_participants, _online_participants_tag,
+)
+from .storage import get_storage
+
+router = APIRouter()
+
+SEND_QUEUE_LIMIT = 64                  # 每個訂閱者最多累積的未送出訊息
+PRESENCE_INTERVAL = ONLINE_WINDOW / 3  # 更新訂閱中裝置活動時間、檢查在線名單的間隔（秒）
+KEEPALIVE_INTERVAL = 15                # SSE 沒有事件時送出註解行的間隔（秒），避免代理伺服器判定連線閒置
+RETRY_MS = 3000                        # SSE 斷線後瀏覽器重新連線的等待時間
+CLOSE_ROOM_NOT_FOUND = 4404
+CLOSE_TOO_SLOW = 1013                  # Try Again Later
+
+
+def _require_room(room):
+    if not get_storage().room_exists(room):
+        raise HTTPException(status_code=404, detail="Room not found")
+
+
+def _topic_names(room):
+    return {"topics": get_storage().list_topic_names(room)}
+
+
+def _touch_devices(room, device_ids):
+    store = get_storage()
+    if not store.room_exists(room):
+        return
+    now = get_current_timestamp()
+    for device_id in device_ids:
+        store.touch_participant(room, device_id, now)
+
+
+class _Subscriber(ABC):
+    """一個訂閱者與其傳送佇列"""
+
+    __slots__ = ("device_id", "version", "presence_tag", "topics", "queue")
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.version = None   # 已送出的房間版本，None 表示尚未送出初始狀態
+        self.presence_tag = None
+        self.topics = None    # 已送出的主題列表
+        self.queue = asyncio.Queue(SEND_QUEUE_LIMIT)
+
+    @staticmethod
+    @abstractmethod
+    def encode(event, data, version):
+        """將已序列化的 JSON 轉為此類訂閱者傳送的格式"""
+
+    def send(self, text):
+        """放入傳送佇列，佇列已滿（客戶端跟不上）時回傳 False"""
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    @abstractmethod
+    def close(self, code):
+        """結束訂閱，code 為 WebSocket 的關閉代碼"""
+
+
+class _SocketSubscriber(_Subscriber):
+    """WebSocket 連線，由自己的傳送工作送出佇列中的訊息"""
+
+    __slots__ = ("websocket", "sender")
+
+    def __init__(self, websocket, device_id):
+        super().__init__(device_id)
+        self.websocket = websocket
+        self.sender = None
+
+    @staticmethod
+    def encode(event, data, version):
+        return data
+
+    async def run_sender(self):
+        try:
+            while True:
+                await self.websocket.send_text(await self.queue.get())
+        except Exception:
+            # 連線已中斷，由接收端結束連線
+            pass
+
+    def close(self, code):
+        if self.sender is not None:
+            self.sender.cancel()
+        asyncio.create_task(_close_quietly(self.websocket, code))
+
+
+class _StreamSubscriber(_Subscriber):
+    """SSE 串流，回應本文直接讀取佇列；佇列中的 None 表示結束串流"""
+
+    __slots__ = ()
+
+    @staticmethod
+    def encode(event, data, version):
+        event_id = f"id: {version}\n" if version is not None else ""
+        return f"{event_id}event: {event}\ndata: {data}\n\n"
+
+    def close(self, code):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+async def _close_quietly(websocket, code):
+    try:
+        await websocket.close(code=code)
+    except Exception:
+        pass
+
+
+class RoomChannel:
+    """單一房間的所有訂閱者"""
+
+    def __init__(self, code):
+        self.code = code
+        self.clients = set()
+        self._dirty = False
+        self._flushing = None
+
+    def mark_dirty(self):
+        """房間資料已改變，排程推送（推送進行中時會在結束後再推送一次）"""
+        self._dirty = True
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        while self._dirty and self.clients:
+            self._dirty = False
+            try:
+                await self.push_state()
+                await self.push_topics()
+                await self.push_presence()
+            except HTTPException:
+                # 房間已不存在
+                for client in list(self.clients):
+                    self.drop(client, CLOSE_ROOM_NOT_FOUND)
+            except Exception as e:
+                print(f"房間 {self.code} 推送失敗: {e}")
+
+    async def push_state(self):
+        # 絕大多數訂閱者的版本相同，每個版本只產生一次增量
+        groups = {}
+        for client in self.clients:
+            if client.version is not None:
+                groups.setdefault(client.version, []).append(client)
+        for since, clients in groups.items():
+            state = await run_room_read(self.code, _room_state, since)
+            if state["version"] != since:
+                self.broadcast(clients, "state", state, state["version"])
+
+    async def push_topics(self):
+        # 房間的每次變更都會觸發，只推送給主題列表與上次送出時不同的訂閱者
+        topics = await run_room_read(self.code, _topic_names)
+        clients = [c for c in self.clients if c.version is not None and c.topics != topics["topics"]]
+        if clients:
+            self.broadcast(clients, "topics", topics)
+            for client in clients:
+                client.topics = topics["topics"]
+
+    async def push_presence(self):
+        tag = await run_room_read(self.code, _online_participants_tag)
+        clients = [c for c in self.clients if c.version is not None and (tag is None or c.presence_tag != tag)]
+        if clients:
+            online = await run_room_read(self.code, _online_participants)
+            self.broadcast(clients, "participants", online)
+            for client in clients:
+                client.presence_tag = tag
+
+    async def keep_alive(self):
+        """更新訂閱中裝置的活動時間，並推送因逾時而改變的在線名單"""
+        devices = [client.device_id for client in self.clients if client.device_id]
+        if devices:
+            await run_room_read(self.code, _touch_devices, devices)
+        await self.push_presence()
+
+    def broadcast(self, clients, event, payload, version=None):
+        data = json.dumps({"type": event, **payload}, ensure_ascii=False)
+        encoded = {}
+        for client in clients:
+            kind = type(client)
+            text = encoded.get(kind)
+            if text is None:
+                text = encoded[kind] = kind.encode(event, data, version)
+            if client.send(text):
+                if version is not None:
+                    client.version = version
+            else:
+                self.drop(client, CLOSE_TOO_SLOW)
+
+    def drop(self, client, code):
+        self.clients.discard(client)
+        client.close(code)
+
+
+class RoomHub:
+    """所有房間的 RoomChannel，並把儲存後端的變更通知轉交事件迴圈"""
+
+    def __init__(self):
+        self.channels = {}
+        self._store = None
+        self._loop = None
+        self._presence_task = None
+
+    def _attach(self):
+        self._loop = asyncio.get_running_loop()
+        store = get_storage()
+        if store is not self._store:
+            if self._store is not None:
+                self._store.remove_change_listener(self._on_change)
+            store.add_change_listener(self._on_change)
+            self._store = store
+        countdown_timers.add_expiry_listener(self._on_countdown_expired)
+        if self._presence_task is None or self._presence_task.done():
+            self._presence_task = asyncio.create_task(self._presence_loop())
+
+    def _on_change(self, code, version):
+        # 在寫入的執行緒中呼叫
+        if code in self.channels:
+            try:
+                self._loop.call_soon_threadsafe(self._changed, code)
+            except RuntimeError:
+                # 事件迴圈已關閉
+                pass
+
+    def _changed(self, code):
+        channel = self.channels.get(code)
+        if channel is not None:
+            channel.mark_dirty()
+
+    def _on_countdown_expired(self, code, payload):
+        # 在推進倒數時間輪的執行緒中呼叫
+        if code in self.channels:
+            try:
+                self._loop.call_soon_threadsafe(self._countdown_expired, code, payload)
+            except RuntimeError:
+                pass
+
+    def _countdown_expired(self, code, payload):
+        channel = self.channels.get(code)
+        if channel is not None:
+            channel.broadcast([c for c in channel.clients if c.version is not None], "countdown", payload)
+
+    async def _presence_loop(self):
+        while self.channels:
+            await asyncio.sleep(PRESENCE_INTERVAL)
+            for channel in list(self.channels.values()):
+                try:
+                    await channel.keep_alive()
+                except Exception as e:
+                    print(f"房間 {channel.code} 在線狀態更新失敗: {e}")
+
+    async def subscribe(self, room, client, since=None):
+        """
+        加入房間並放入初始訊息：since 為 None 時為完整狀態，否則只補送該版本之後的變更（沒有變更則不送）
+        房間不存在時拋出 HTTPException(404)
+        """
+        self._attach()
+        channel = self.channels.get(room)
+        if channel is None:
+            channel = self.channels[room] = RoomChannel(room)
+        # 先加入房間再讀取初始狀態，讀取期間的變更會在下一次推送時補上
+        channel.clients.add(client)
+        try:
+            if client.device_id:
+                await run_room_read(room, _touch_devices, [client.device_id])
+            state = await run_room_read(room, _room_state, since)
+            topics = await run_room_read(room, _topic_names)
+            client.presence_tag = await run_room_read(room, _online_participants_tag)
+            online = await run_room_read(room, _online_participants)
+        except BaseException:
+            self.unsubscribe(room, client)
+            raise
+        if state["version"] != since:
+            channel.broadcast([client], "state", state, state["version"])
+        channel.broadcast([client], "topics", topics)
+        client.topics = topics["topics"]
+        channel.broadcast([client], "participants", online)
+        client.version = state["version"]
+        channel.mark_dirty()
+
+    def unsubscribe(self, room, client):
+        channel = self.channels.get(room)
+        if channel is None:
+            return
+        channel.clients.discard(client)
+        if not channel.clients:
+            del self.channels[room]
+
+    async def serve_socket(self, websocket, room, device_id=None):
+        """處理一條已接受的 WebSocket 連線，直到客戶端斷線"""
+        client = _SocketSubscriber(websocket, device_id)
+        try:
+            await self.subscribe(room, client)
+        except HTTPException:
+            await websocket.close(code=CLOSE_ROOM_NOT_FOUND)
+            return
+        client.sender = asyncio.create_task(client.run_sender())
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                # 客戶端送來的訊息（例如保持連線的 ping）不需要處理
+        finally:
+            self.unsubscribe(room, client)
+            client.sender.cancel()
+
+    async def stream(self, room, client, since=None):
+        """SSE 回應本文，開始送出時才加入房間；客戶端斷線或訂閱被結束時停止並離開房間"""
+        # 在產生器中訂閱：回應開始前客戶端就斷線時產生器不會執行，不會留下沒有人讀取的訂閱者
+        try:
+            try:
+                await self.subscribe(room, client, since)
+            except HTTPException:
+                # 確認房間存在之後房間已被刪除
+                return
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                try:
+                    text = await asyncio.wait_for(client.queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    text = ": keep-alive\n\n"
+                if text is None:
+                    return
+                yield text
+        finally:
+            self.unsubscribe(room, client)
+
+
+hub = RoomHub()
+
+
+def _parse_event_id(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+@router.websocket("/ws/rooms/{room}")
+async def room_socket(websocket: WebSocket, room: str, device_id: Optional[str] = None):
+    """
+    房間即時推播（WebSocket）
+
+    [WebSocket] /ws/rooms/{room}?device_id={device_id}
+
+    描述：
+    連線後推送完整房間狀態與在線名單，之後在房間資料或在線名單改變時推送增量。
+    帶 device_id（需先呼叫 /api/participants/join）時，連線期間該裝置視為在線。
+
+    參數：
+    - room (str): 房間代碼 (路徑參數)
+    - device_id (str, optional): 參與者裝置ID (查詢參數)，主持人可省略
+
+    訊息：
+    - {"type": "state", ...}: 與 GET /api/rooms/{room}/state 相同；首次為完整狀態，之後為增量（delta 為 true）
+    - {"type": "topics", "topics": [...]}: 房間的主題名稱列表，連線時與主題改變時推送
+    - {"type": "participants", "participants": [...]}: 在線參與者名單
+    - {"type": "countdown", "status", "deadline", "expired_at"}: 倒數結束，房間已切換為休息中
+    房間不存在時以 4404 關閉連線；客戶端跟不上推送時以 1013 關閉，重新連線即可。
+    """
+    await websocket.accept()
+    await hub.serve_socket(websocket, room, device_id)
+
+
+@router.get("/api/rooms/{room}/events")
+async def room_events(room: str, request: Request, device_id: Optional[str] = None):
+    """
+    房間即時推播（Server-Sent Events）
+
+    [GET] /api/rooms/{room}/events?device_id={device_id}
+
+    描述：
+    推送與 WebSocket 相同的事件，適用於無法使用 WebSocket 的網路環境（瀏覽器以 EventSource 訂閱）。
+    state 事件的 id 為房間版本；重新連線時帶上 Last-Event-ID 標頭，只補送該版本之後的變更。
+    沒有事件時每 15 秒送出一行註解保持連線。
+
+    參數：
+    - room (str): 房間代碼 (路徑參數)
+    - device_id (str, optional): 參與者裝置ID (查詢參數)，訂閱期間該裝置視為在線
+    - Last-Event-ID (標頭, optional): 上次收到的 state 事件 id
+
+    回應：
+    - text/event-stream，事件 state / topics / participants / countdown，data 為與 WebSocket 訊息相同的 JSON
+
+    錯誤：
+    - 404: 房間不存在
+    """
+    since = _parse_event_id(request.headers.get("last-event-id"))
+    # 開始串流前確認房間存在，才能回傳 404
+    await run_room_read(room, _require_room)
+    return StreamingResponse(
+        hub.stream(room, _StreamSubscriber(device_id), since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
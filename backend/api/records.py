@@ -0,0 +1,145 @@
+"""
+討論資料的記錄型別
+以 slots dataclass 取代原本以字串為鍵的巢狀 dict，降低每筆留言的記憶體開銷，
+並提供序列化成 API 回應格式的輔助方法
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+def default_settings():
+    return {"allowQuestions": True, "allowVoting": True}
+
+
+@dataclass(slots=True)
+class Comment:
+    """單則留言"""
+    id: str
+    nickname: str
+    content: str
+    ts: float
+    isAISummary: bool = False
+    device_id: Optional[str] = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "nickname": self.nickname,
+            "content": self.content,
+            "ts": self.ts,
+            "isAISummary": self.isAISummary,
+            "device_id": self.device_id,
+        }
+
+    def to_payload(self, vote_good, vote_bad, nickname=None):
+        """序列化並附上票數，對應 /state 與 /comments 的回應格式；nickname 為作者目前的暱稱（預設為發表時的暱稱）"""
+        payload = self.to_dict()
+        if nickname is not None:
+            payload["nickname"] = nickname
+        payload["vote_good"] = vote_good
+        payload["vote_bad"] = vote_bad
+        payload["votes"] = vote_good
+        return payload
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            id=data["id"],
+            nickname=data.get("nickname", ""),
+            content=data.get("content", ""),
+            ts=data.get("ts", 0.0),
+            isAISummary=bool(data.get("isAISummary", False)),
+            device_id=data.get("device_id"),
+        )
+
+
+@dataclass(slots=True)
+class Topic:
+    """房間內的單一主題與其留言"""
+    room_id: str
+    topic_name: str
+    comments: List[Comment] = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            "room_id": self.room_id,
+            "topic_name": self.topic_name,
+            "comments": [c.to_dict() for c in self.comments],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            room_id=data["room_id"],
+            topic_name=data["topic_name"],
+            comments=[Comment.from_dict(c) for c in data.get("comments", [])],
+        )
+
+
+@dataclass(slots=True)
+class Participant:
+    """房間參與者"""
+    device_id: str
+    nickname: str
+    last_seen: float
+
+    def to_dict(self):
+        return {"device_id": self.device_id, "nickname": self.nickname, "last_seen": self.last_seen}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(device_id=data["device_id"], nickname=data["nickname"], last_seen=data.get("last_seen", 0.0))
+
+
+@dataclass(slots=True)
+class Room:
+    """討論室"""
+    code: str
+    title: str
+    created_at: float
+    settings: dict = field(default_factory=default_settings)
+    status: str = "Stop"  # NotFound, Stop, Discussion, End
+    participants: int = 0  # 在線人數
+    current_topic: Optional[str] = None
+    countdown: int = 0
+    time_start: float = 0
+    topic_summary: str = ""  # 題目摘要
+    desired_outcome: str = ""  # 預期成果
+    topic_count: int = 1  # 主題數量
+    room_context: str = ""  # 房間上下文，用於 AMD Lemonade Server 的 AI 推理
+
+    def to_dict(self):
+        return {
+            "code": self.code,
+            "title": self.title,
+            "created_at": self.created_at,
+            "participants": self.participants,
+            "settings": dict(self.settings),
+            "status": self.status,
+            "current_topic": self.current_topic,
+            "countdown": self.countdown,
+            "time_start": self.time_start,
+            "topic_summary": self.topic_summary,
+            "desired_outcome": self.desired_outcome,
+            "topic_count": self.topic_count,
+            "room_context": self.room_context,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            code=data["code"],
+            title=data.get("title", ""),
+            created_at=data.get("created_at", 0.0),
+            settings=dict(data.get("settings") or default_settings()),
+            status=data.get("status", "Stop"),
+            participants=data.get("participants", 0),
+            current_topic=data.get("current_topic"),
+            countdown=data.get("countdown", 0),
+            time_start=data.get("time_start", 0),
+            topic_summary=data.get("topic_summary", ""),
+            desired_outcome=data.get("desired_outcome", ""),
+            topic_count=data.get("topic_count", 1),
+            room_context=data.get("room_context", ""),
+        )
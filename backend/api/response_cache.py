@@ -0,0 +1,89 @@
+"""
+輪詢端點的回應快取
+同一房間的參與者在同一版本取得的回應完全相同，每個 (端點, 參數) 只在 ETag 改變時產生並序列化一次，
+之後直接回傳快取的 JSON 位元組，不再複製留言、重新排序，也不再經過 jsonable_encoder 與 json 序列化。
+
+快取以 ETag 驗證：ETag 已包含房間版本、倒數剩餘秒數、在線名單版本等所有會改變回應的因素，
+ETag 相同即可直接使用快取。房間有寫入時（儲存後端的變更通知）另外清除該房間的快取，釋放舊版本佔用的記憶體；
+沒有人再讀取的房間（例如討論已結束）由背景維護工作定期以 evict_idle 清除。
+"""
+
+import json
+import threading
+
+try:
+    import orjson
+except ImportError:
+    # 未安裝 orjson 時改用標準函式庫，輸出相同的 JSON
+    orjson = None
+
+MAX_ROOMS = 1024            # 超過時清空全部快取
+MAX_ENTRIES_PER_ROOM = 64   # 單一房間的 (端點, 參數) 組合數，超過時捨棄該房間最早加入的一筆
+
+
+def dumps(data) -> bytes:
+    """序列化為 UTF-8 JSON（與 FastAPI 的 JSONResponse 相同，不跳脫非 ASCII 字元）"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ResponseCache:
+    """{房間代碼: {(端點, 參數): (ETag, JSON 位元組)}}"""
+
+    def __init__(self):
+        self._rooms = {}
+        self._read_rooms = set()   # 上一次 evict_idle 之後讀取過的房間
+        self._lock = threading.Lock()
+        self._store = None
+
+    def attach(self, store):
+        """向儲存後端註冊變更通知；切換儲存後端時清空快取"""
+        if store is self._store:
+            return
+        with self._lock:
+            if store is self._store:
+                return
+            if self._store is not None:
+                self._store.remove_change_listener(self.invalidate)
+            store.add_change_listener(self.invalidate)
+            self._store = store
+            self._rooms = {}
+
+    def get(self, room, key, tag):
+        self._read_rooms.add(room)
+        entry = self._rooms.get(room, {}).get(key)
+        if entry is not None and entry[0] == tag:
+            return entry[1]
+        return None
+
+    def put(self, room, key, tag, body):
+        with self._lock:
+            entries = self._rooms.get(room)
+            if entries is None:
+                if len(self._rooms) >= MAX_ROOMS:
+                    self._rooms = {}
+                entries = self._rooms[room] = {}
+            elif key not in entries and len(entries) >= MAX_ENTRIES_PER_ROOM:
+                # 分頁游標各不相同，逐筆捨棄最舊的組合，不因此清掉所有參與者共用的回應
+                del entries[next(iter(entries))]
+            entries[key] = (tag, body)
+
+    def invalidate(self, room, version=None):
+        self._rooms.pop(room, None)
+
+    def evict_idle(self):
+        """清除上一次呼叫之後都沒有被讀取的房間，回傳清除的房間數"""
+        with self._lock:
+            read_rooms, self._read_rooms = self._read_rooms, set()
+            idle = [room for room in self._rooms if room not in read_rooms]
+            for room in idle:
+                del self._rooms[room]
+        return len(idle)
+
+    def clear(self):
+        self._rooms = {}
+        self._read_rooms = set()
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,71 @@
+"""
+儲存層
+依環境變數 MBBUDDY_STORAGE 選擇後端：
+- memory（預設）：資料保存在程序記憶體，重新啟動後消失
+- sqlite：資料寫入 MBBUDDY_SQLITE_PATH（預設 mbbuddy.db），以 WAL 模式與批次提交持久化
+- journal：資料保存在記憶體，另寫入 MBBUDDY_JOURNAL_DIR（預設 mbbuddy_journal）的僅附加日誌與定期快照
+
+memory 與 journal 後端會將閒置房間封存到磁碟（sqlite 後端的資料本來就在磁碟上）：
+- MBBUDDY_ARCHIVE=0 關閉自動封存
+- MBBUDDY_ARCHIVE_DIR：memory 後端的封存目錄（預設 mbbuddy_archive；journal 後端使用日誌目錄下的 archive）
+- MBBUDDY_ARCHIVE_AFTER：閒置多少秒後封存（預設 21600）
+- MBBUDDY_ROOM_BUDGET：記憶體中最多保留的房間數（預設 500）
+
+MBBUDDY_WORKERS 大於 1 時（多 worker 模式）房間資料必須存放在各 worker 共用的 sqlite 資料庫，
+並以 shared 模式運作：每個操作立即提交，且會通知其他 worker 的寫入。
+"""
+
+import os
+
+from .base import StorageBackend
+from .memory import MemoryStorage
+from .sqlite import SQLiteStorage
+from .journal import JournalStorage
+from .archive import RoomArchive, RoomArchiver
+
+_storage = None
+
+
+def configure_storage(kind=None, **options):
+    """建立並切換目前使用的儲存後端，回傳新後端"""
+    global _storage
+    workers = int(os.getenv("MBBUDDY_WORKERS", "1"))
+    kind = (kind or os.getenv("MBBUDDY_STORAGE", "sqlite" if workers > 1 else "memory")).lower()
+    if workers > 1 and kind != "sqlite":
+        raise ValueError(f"多 worker 模式 (MBBUDDY_WORKERS={workers}) 需要 sqlite 儲存後端，目前為 {kind}")
+    if kind in ("memory", "journal"):
+        options.setdefault("auto_archive", os.getenv("MBBUDDY_ARCHIVE", "1") != "0")
+        options.setdefault("archive_after", float(os.getenv("MBBUDDY_ARCHIVE_AFTER", 6 * 3600)))
+        options.setdefault("room_budget", int(os.getenv("MBBUDDY_ROOM_BUDGET", 500)))
+    if kind == "memory":
+        if options["auto_archive"]:
+            options.setdefault("archive", RoomArchive(os.getenv("MBBUDDY_ARCHIVE_DIR", "mbbuddy_archive")))
+        backend = MemoryStorage(**options)
+    elif kind == "sqlite":
+        options.setdefault("path", os.getenv("MBBUDDY_SQLITE_PATH", "mbbuddy.db"))
+        options.setdefault("shared", workers > 1)
+        backend = SQLiteStorage(**options)
+    elif kind == "journal":
+        options.setdefault("directory", os.getenv("MBBUDDY_JOURNAL_DIR", "mbbuddy_journal"))
+        backend = JournalStorage(**options)
+    else:
+        raise ValueError(f"未知的儲存後端: {kind}")
+    if _storage is not None:
+        _storage.close()
+    _storage = backend
+    # 只在這裡載入一次，恢復統計留在後端上供啟動時記錄
+    backend.recovery = backend.load()
+    return backend
+
+
+def get_storage() -> StorageBackend:
+    """取得目前使用的儲存後端，首次呼叫時依環境變數建立"""
+    if _storage is None:
+        configure_storage()
+    return _storage
+
+
+__all__ = [
+    "StorageBackend", "MemoryStorage", "SQLiteStorage", "JournalStorage",
+    "RoomArchive", "RoomArchiver", "configure_storage", "get_storage",
+]
@@ -0,0 +1,116 @@
+"""
+冷儲存封存
+閒置超過 archive_after 秒的房間會被壓縮寫入磁碟並從記憶體移除；
+記憶體中的房間數超過 room_budget 時，依最近活動時間由舊到新（已結束的房間優先）封存。
+被封存的房間在下次存取時自動還原，見 MemoryStorage.room_exists / get_room。
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class RoomArchive:
+    """房間封存檔目錄，每個封存檔為一個 gzip 壓縮的 JSON"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, code, entry):
+        """寫入封存檔並回傳檔名"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{code}-{uuid.uuid4().hex[:12]}.json.gz"
+        tmp_path = self._path(name + ".tmp")
+        # 先以 json.dumps 一次序列化；json.dump 直接寫檔會逐段呼叫 write，慢上許多
+        data = json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with open(tmp_path, "wb") as f:
+            f.write(gzip.compress(data, compresslevel=6))
+        os.replace(tmp_path, self._path(name))
+        return name
+
+    def read(self, name):
+        with open(self._path(name), "rb") as f:
+            return json.loads(gzip.decompress(f.read()))
+
+    def remove(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def names(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [n for n in os.listdir(self.directory) if n.endswith(".json.gz")]
+
+    def clear(self):
+        """只刪除封存檔（與寫入中斷留下的暫存檔），不刪除目錄本身或其他檔案"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith((".json.gz", ".json.gz.tmp")):
+                self.remove(name)
+
+
+class RoomArchiver:
+    """背景封存執行緒，定期檢查閒置房間與房間數上限"""
+
+    def __init__(self, storage, archive_after=6 * 3600, room_budget=500, interval=30):
+        self.storage = storage
+        self.archive_after = archive_after
+        self.room_budget = room_budget
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="room-archiver", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wake(self):
+        """房間數可能超過上限時（建立或還原房間後）提早執行一次檢查"""
+        self._wakeup.set()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"房間封存失敗: {e}")
+
+    def run_once(self, now=None):
+        """執行一次封存，回傳被封存的房間代碼"""
+        now = time.time() if now is None else now
+        cutoff = now - self.archive_after
+        activity = self.storage.resident_room_activity()
+        archived = []
+        remaining = []
+        for code, (last_active, status) in activity.items():
+            if last_active <= cutoff:
+                archived.append(code)
+            else:
+                remaining.append((status != "End", last_active, code))
+        overflow = len(remaining) - self.room_budget
+        if overflow > 0:
+            remaining.sort()
+            archived.extend(code for _, _, code in remaining[:overflow])
+        return [code for code in archived if self.storage.archive_room(code)]
@@ -0,0 +1,275 @@
+"""
+儲存後端介面
+api/participants.py、api/ai.py 與 utility/prompts.py 只透過此介面存取房間、主題、留言、投票與參與者資料
+
+並行控制：每間房間有一把可重入鎖，同一房間的操作依序執行，不同房間的操作可以同時進行。
+端點中「先檢查再修改」的多步驟操作以 `with store.room_lock(room):` 包住即可成為原子操作。
+
+變更通知：每次修改房間資料都會遞增房間版本（room_version），並通知 add_change_listener 註冊的 callback；
+多 worker 模式下其他 worker 的寫入也會通知（見 SQLiteStorage 的 shared 模式）。
+寫入方法另以 _record_change 記錄被修改的留言，get_comment_changes 依此回傳某個版本之後的增量（見 changelog.py）。
+"""
+
+import functools
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from ..records import Room, Topic, Comment
+
+
+def room_locked(method):
+    """以第一個參數（房間代碼）對應的房間鎖包住方法"""
+    @functools.wraps(method)
+    def wrapper(self, code, *args, **kwargs):
+        with self.room_lock(code):
+            return method(self, code, *args, **kwargs)
+    return wrapper
+
+
+def room_write(method):
+    """以房間鎖包住寫入方法，完成後遞增房間版本並發出變更通知；回傳 False 表示沒有修改任何資料"""
+    @functools.wraps(method)
+    def wrapper(self, code, *args, **kwargs):
+        with self.room_lock(code):
+            result = method(self, code, *args, **kwargs)
+            if result is not False:
+                self._room_changed(code)
+            return result
+    return wrapper
+
+
+class StorageBackend(ABC):
+    """房間資料儲存後端"""
+
+    name = "base"
+    recovery = None   # configure_storage 呼叫 load() 的結果
+
+    def __init__(self):
+        # 沒有任何執行緒持有時自動回收，避免查詢不存在的房間代碼時累積鎖
+        self._room_locks = weakref.WeakValueDictionary()
+        self._room_locks_guard = threading.Lock()
+        self._change_listeners = []
+
+    def room_lock(self, code: str):
+        """取得房間的可重入鎖"""
+        lock = self._room_locks.get(code)
+        if lock is None:
+            with self._room_locks_guard:
+                lock = self._room_locks.get(code)
+                if lock is None:
+                    lock = self._room_locks[code] = threading.RLock()
+        return lock
+
+    # ---------- 變更通知 ----------
+
+    def room_version(self, code: str) -> int:
+        """房間目前的版本，房間資料每次修改後都會變大；不存在的房間回傳 0"""
+        return 0
+
+    def add_change_listener(self, callback) -> None:
+        """註冊 callback(code, version)，房間資料修改後在寫入的執行緒中呼叫，不應執行耗時的工作"""
+        self._change_listeners.append(callback)
+
+    def remove_change_listener(self, callback) -> None:
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
+
+    def _room_changed(self, code: str) -> None:
+        """由寫入方法呼叫：遞增房間版本並通知"""
+
+    def _record_change(self, code: str, kind: str, comment_id: Optional[str] = None) -> None:
+        """由寫入方法呼叫：記錄這次修改涉及的留言，與下一次 _room_changed 的版本一起寫入變更紀錄"""
+
+    def get_comment_changes(self, code: str, topic_name: str, since: int) -> Optional[dict]:
+        """
+        回傳版本 since 之後主題留言的變更 {"comments": [新增或修改的留言], "vote_counts": {留言ID: 票數}, "deleted": [留言ID]}
+        since 早於變更紀錄的起點（切換主題、房間還原、紀錄已捨棄）或不是本房間發出的版本時回傳 None，呼叫端應改回傳完整資料
+        """
+        return None
+
+    def _notify_change(self, code: str, version: int) -> None:
+        for callback in list(self._change_listeners):
+            try:
+                callback(code, version)
+            except Exception as e:
+                print(f"房間變更通知失敗: {e}")
+
+    def serves_from_memory(self, code: str) -> bool:
+        """
+        房間的讀取與心跳是否只涉及記憶體、不會進行磁碟 I/O
+        為 True 時 async 端點可直接在事件迴圈中執行，否則應交由執行緒池
+        """
+        return False
+
+    # ---------- 房間 ----------
+
+    @abstractmethod
+    def room_exists(self, code: str) -> bool:
+        ...
+
+    @abstractmethod
+    def get_room(self, code: str) -> Optional[Room]:
+        """取得房間記錄，不存在時回傳 None"""
+
+    @abstractmethod
+    def list_rooms(self) -> List[Room]:
+        ...
+
+    @abstractmethod
+    def create_room(self, room: Room, topic_names: List[str]) -> None:
+        """建立房間與其初始主題"""
+
+    @abstractmethod
+    def update_room(self, code: str, **fields) -> None:
+        """更新房間欄位，例如 status、current_topic、settings"""
+
+    @abstractmethod
+    def running_countdowns(self) -> Dict[str, Tuple[float, int]]:
+        """狀態為 Discussion 且已開始倒數的房間 {代碼: (time_start, countdown)}，不含已封存的房間"""
+
+    # ---------- 主題 ----------
+
+    @abstractmethod
+    def list_topic_names(self, code: str) -> List[str]:
+        """依建立順序回傳房間的主題名稱"""
+
+    @abstractmethod
+    def list_topics(self, code: str) -> List[Topic]:
+        """依建立順序回傳房間的主題（含留言）"""
+
+    @abstractmethod
+    def topic_exists(self, code: str, topic_name: str) -> bool:
+        ...
+
+    @abstractmethod
+    def ensure_topic(self, code: str, topic_name: str) -> None:
+        """主題不存在時建立"""
+
+    @abstractmethod
+    def remove_topic(self, code: str, topic_name: str) -> bool:
+        """刪除主題與其留言、投票，主題不存在時回傳 False"""
+
+    @abstractmethod
+    def rename_topic(self, code: str, old_name: str, new_name: str) -> None:
+        ...
+
+    # ---------- 留言 ----------
+
+    @abstractmethod
+    def add_comment(self, code: str, topic_name: str, comment: Comment) -> None:
+        """新增留言，主題不存在時自動建立"""
+
+    @abstractmethod
+    def comment_exists(self, code: str, comment_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete_comment(self, code: str, comment_id: str) -> bool:
+        """刪除留言與其投票，留言不存在時回傳 False"""
+
+    @abstractmethod
+    def get_comment_payloads(self, code: str, topic_name: str) -> Optional[List[dict]]:
+        """回傳主題留言的序列化結果（含票數），依時間戳遞增排列；主題不存在時回傳 None"""
+
+    @abstractmethod
+    def get_comment_page(self, code: str, topic_name: str, after_id: Optional[str] = None,
+                         since_ts: Optional[float] = None, limit: Optional[int] = None) -> Optional[Tuple[List[dict], bool]]:
+        """
+        回傳 (序列化的留言, 是否還有更多留言)：依時間戳排列，從 after_id 之後（沒有 after_id 時為時間戳大於 since_ts）取最多 limit 則
+        主題不存在，或 after_id 不屬於該主題且沒有 since_ts 時回傳 None
+        """
+
+    @abstractmethod
+    def get_top_comments(self, code: str, topic_name: str, n: int) -> Optional[List[dict]]:
+        """
+        回傳主題中好評數減差評數最高的 n 則留言（同分時較新的在前，不含 AI 總結）
+        主題不存在時回傳 None
+        """
+
+    @abstractmethod
+    def update_author_nickname(self, code: str, device_id: str, nickname: str) -> bool:
+        """更新留言作者的暱稱；留言只保存發表時的暱稱，讀取時以作者目前的暱稱顯示，不需逐則改寫。沒有留言因此改變時回傳 False"""
+
+    # ---------- 投票 ----------
+
+    @abstractmethod
+    def cast_vote(self, code: str, comment_id: str, device_id: str, vote_type: str) -> bool:
+        """投票，投過相反類型時自動改票；已投過相同類型時回傳 False"""
+
+    @abstractmethod
+    def retract_vote(self, code: str, comment_id: str, device_id: str, vote_type: str) -> bool:
+        """取消投票，找不到該投票時回傳 False"""
+
+    @abstractmethod
+    def get_device_votes(self, code: str, device_id: str) -> Dict[str, str]:
+        """回傳裝置在房間內的投票 {comment_id: vote_type}"""
+
+    @abstractmethod
+    def get_room_vote_counts(self, code: str) -> Dict[str, Tuple[int, int]]:
+        """回傳房間內每則有票留言的 (好評數, 差評數)"""
+
+    # ---------- 參與者 ----------
+
+    @abstractmethod
+    def join_participant(self, code: str, device_id: str, nickname: str, now: float) -> int:
+        """加入或更新參與者，回傳在線人數"""
+
+    @abstractmethod
+    def touch_participant(self, code: str, device_id: str, now: float) -> int:
+        """記錄心跳，回傳在線人數"""
+
+    @abstractmethod
+    def online_participants(self, code: str, now: float) -> List[dict]:
+        """回傳在線參與者 [{"device_id", "nickname"}]，並移除逾時的參與者"""
+
+    @abstractmethod
+    def sweep_participants(self, now: float) -> Dict[str, int]:
+        """
+        移除所有房間中逾時的參與者並更新在線人數，不必等到該房間下一次讀取
+        回傳 {"rooms": 在線人數改變的房間數, "expired": 移除的參與者數}
+        """
+
+    def online_participants_tag(self, code: str, now: float) -> Optional[str]:
+        """
+        在線名單的識別字串，online_participants 的結果改變時必定不同（供 ETag 使用）
+        回傳 None 表示後端無法提供，端點每次都回傳完整名單
+        """
+        return None
+
+    @abstractmethod
+    def set_participant_nickname(self, code: str, device_id: str, nickname: str) -> bool:
+        """更新暱稱，參與者不存在時回傳 False"""
+
+    @abstractmethod
+    def find_device_by_nickname(self, code: str, nickname: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def list_participants(self, code: str) -> List[dict]:
+        """回傳所有保留中的參與者 [{"device_id", "nickname", "last_seen"}]"""
+
+    # ---------- 維護 ----------
+
+    def load(self) -> Optional[dict]:
+        """從持久化資料恢復狀態，回傳恢復統計；不需恢復的後端回傳 None"""
+        return None
+
+    @abstractmethod
+    def dump(self) -> dict:
+        """匯出所有資料（/api/all_rooms 調試用）"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """清空所有資料"""
+
+    @abstractmethod
+    def collect_garbage(self) -> Dict[str, int]:
+        """
+        清除已失去對應資料的紀錄，例如指向已刪除留言的投票、已沒有留言的作者暱稱
+        回傳各類紀錄的移除筆數
+        """
+
+    def close(self) -> None:
+        """關閉後端並寫入尚未提交的資料"""
@@ -0,0 +1,71 @@
+"""
+房間留言變更紀錄（記憶體後端使用，SQLite 後端以 room_changes 資料表實作相同的規則）
+讓 GET /api/rooms/{room}/state?since=<version> 只回傳該版本之後新增、修改、刪除的留言與票數變動
+
+每筆紀錄為 (版本, 類型, 留言ID)，類型：
+- comment：新增留言或留言內容改變，需要回傳完整留言
+- vote：票數改變，只需回傳票數
+- delete：留言已刪除
+- author：作者改名（留言ID 欄位為作者的 device_id），讀取時展開為該作者目前所有留言的 comment
+- reset：切換主題、建立或還原房間，之前的版本無法增量同步
+"""
+
+import bisect
+
+RESET = "reset"
+AUTHOR = "author"
+MAX_ENTRIES = 1024   # 每間房間保留的紀錄數上限，超過時捨棄較舊的一半
+
+
+def vote_count_payload(vote_good, vote_bad):
+    """只有票數改變的留言在增量回應中的格式，欄位與 Comment.to_payload 的票數欄位相同"""
+    return {"vote_good": vote_good, "vote_bad": vote_bad, "votes": vote_good}
+
+
+def merge_changes(entries, author_comment_ids=None):
+    """
+    將依版本排序的 (類型, 留言ID) 合併為每則留言最後需要同步的類型 {留言ID: 類型}
+    author 紀錄以 author_comment_ids(device_id) 取得該作者目前的留言，視為這些留言的 comment
+    """
+    changed = {}
+    for kind, comment_id in entries:
+        if kind == AUTHOR:
+            for author_comment_id in author_comment_ids(comment_id) if author_comment_ids else ():
+                changed[author_comment_id] = "comment"
+            continue
+        if kind == "vote" and changed.get(comment_id) == "comment":
+            # 新增後又被投票，仍需要回傳完整留言
+            continue
+        changed[comment_id] = kind
+    return changed
+
+
+class RoomChangeLog:
+    """單一房間的變更紀錄，版本 floor 之後的變更都保留在紀錄中"""
+
+    def __init__(self, floor, max_entries=MAX_ENTRIES):
+        self.floor = floor
+        self.max_entries = max_entries
+        self._versions = []
+        self._entries = []
+
+    def append(self, version, kind, comment_id=None):
+        if kind == RESET:
+            self._versions.clear()
+            self._entries.clear()
+            self.floor = version
+            return
+        self._versions.append(version)
+        self._entries.append((kind, comment_id))
+        if len(self._entries) > self.max_entries:
+            # 捨棄較舊的一半，晚於新 floor 的 since 仍可增量同步
+            drop = len(self._entries) // 2
+            self.floor = self._versions[drop - 1]
+            del self._versions[:drop]
+            del self._entries[:drop]
+
+    def since(self, version, author_comment_ids=None):
+        """回傳 version 之後的變更 {留言ID: 類型}；version 早於紀錄起點時回傳 None"""
+        if version < self.floor:
+            return None
+        return merge_changes(self._entries[bisect.bisect_right(self._versions, version):], author_comment_ids)
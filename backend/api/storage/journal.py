@@ -0,0 +1,378 @@
+"""
+日誌儲存後端（記憶體 + 僅附加日誌 + 定期快照）
+資料仍保存在 api/data_store 的記憶體結構中，每次寫入操作另外附加一行 JSON 到磁碟日誌，
+重新啟動時載入最新快照並重播其後的日誌，即可恢復當機前的狀態
+
+- 日誌以緩衝寫入，累積 batch_size 筆或經過 fsync_interval 秒才 flush + fsync
+- 快照每 snapshot_interval 秒或累積 snapshot_every 筆事件時寫入，寫入前先輪替日誌，不阻擋請求
+- 每筆事件在房間鎖內套用並附加，快照逐間房間在房間鎖內匯出並記下該房間最後的事件序號，
+  重播時略過已包含在快照中的事件，因此快照期間不同房間的寫入仍可繼續進行
+- 正常關閉時會再寫入一次快照，下次啟動不需重播日誌
+- 封存與還原房間也會寫入日誌；封存檔在快照不再需要時才刪除
+- 心跳等在線狀態屬於暫時資料，不寫入日誌；重新啟動後由參與者的下一次心跳恢復
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+from .. import data_store
+from ..records import Room, Comment
+from .archive import RoomArchive
+from .memory import MemoryStorage
+
+JOURNAL_FILE = "journal.log"
+PREV_JOURNAL_FILE = "journal.prev.log"
+SNAPSHOT_FILE = "snapshot.json"
+
+
+def _encode_args(op, args):
+    """將操作參數轉為可寫入 JSON 的形式"""
+    if op == "create_room":
+        room, topic_names = args
+        return [room.to_dict(), list(topic_names)]
+    if op == "add_comment":
+        code, topic_name, comment = args
+        return [code, topic_name, comment.to_dict()]
+    return list(args)
+
+
+def _decode_args(op, args):
+    if op == "create_room":
+        return [Room.from_dict(args[0]), args[1]]
+    if op == "add_comment":
+        return [args[0], args[1], Comment.from_dict(args[2])]
+    return args
+
+
+class JournalStorage(MemoryStorage):
+    """記憶體資料 + 僅附加日誌與快照的儲存後端"""
+
+    name = "journal"
+
+    def __init__(self, directory, batch_size=256, fsync_interval=0.05,
+                 snapshot_interval=300, snapshot_every=50000, **archive_options):
+        # 日誌可能含有封存與還原事件，即使關閉自動封存也需要能讀取封存檔
+        archive_options.setdefault("archive", RoomArchive(os.path.join(directory, "archive")))
+        super().__init__(**archive_options)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        self._journal_path = os.path.join(directory, JOURNAL_FILE)
+        self._prev_path = os.path.join(directory, PREV_JOURNAL_FILE)
+        self._snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self._lock = threading.RLock()   # 只保護序號、日誌檔與輪替
+        self._room_seq = {}   # 房間 → 最後一筆事件序號
+        self._released = []   # (還原事件序號, 封存檔名)，快照涵蓋該事件後才刪除封存檔
+        self._snapshot_lock = threading.Lock()
+        self._file = None
+        self._seq = 0
+        self._pending = 0
+        self._since_snapshot = 0
+        self._last_snapshot = time.monotonic()
+        self._recovery = None
+        self._closed = threading.Event()
+        self._threads = []
+
+    # ---------- 恢復 ----------
+
+    def load(self):
+        """載入最新快照並重播日誌，回傳恢復統計；重複呼叫時直接回傳第一次的結果"""
+        with self._snapshot_lock:
+            if self._recovery is not None:
+                return self._recovery
+            start = time.perf_counter()
+            data_store.clear_all()
+            self.archived.clear()
+            self._room_seq.clear()
+            snapshot_seq = self._load_snapshot()
+            self._seq = snapshot_seq
+            covered = dict(self._room_seq)
+            replayed = self._replay(self._prev_path, snapshot_seq, covered, truncate_tail=False)
+            replayed += self._replay(self._journal_path, snapshot_seq, covered, truncate_tail=True)
+            self._since_snapshot = replayed
+            self._file = open(self._journal_path, "a", encoding="utf-8", buffering=1 << 16)
+            self._recovery = {
+                "snapshot_seq": snapshot_seq,
+                "replayed": replayed,
+                "seconds": time.perf_counter() - start,
+            }
+        self._start_background()
+        self._start_archiver()
+        return self._recovery
+
+    def _load_snapshot(self):
+        if not os.path.exists(self._snapshot_path):
+            return 0
+        with open(self._snapshot_path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        for entry in snapshot["rooms"]:
+            self.import_room(entry)
+            self._room_seq[entry["room"]["code"]] = entry["seq"]
+        for code, (name, room_data, room_seq) in snapshot["archived"].items():
+            self.archived[code] = (name, Room.from_dict(room_data))
+            self._room_seq[code] = room_seq
+        return snapshot["seq"]
+
+    def _replay(self, path, after_seq, covered, truncate_tail):
+        """
+        重播快照未涵蓋的事件：序號需大於 after_seq，且大於快照中該房間的最後事件序號 covered[room]
+        遇到未寫完的最後一行時停止（並可截斷）
+        """
+        if not os.path.exists(path):
+            return 0
+        replayed = 0
+        good_offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("未寫完的日誌記錄")
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                good_offset += len(line)
+                seq, code, op = record["seq"], record["room"], record["op"]
+                if seq <= after_seq or seq <= covered.get(code, 0):
+                    continue
+                if op == "rehydrate_room":
+                    self._released.append((seq, self.archived[code][0]))
+                getattr(MemoryStorage, op)(self, *_decode_args(op, record["args"]), **record.get("kwargs", {}))
+                self._seq = max(self._seq, seq)
+                self._room_seq[code] = seq
+                replayed += 1
+        if truncate_tail and good_offset < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(good_offset)
+        return replayed
+
+    # ---------- 日誌寫入 ----------
+
+    def _append(self, code, op, *args, **kwargs):
+        """附加一筆事件並回傳其序號；呼叫端需持有房間鎖，確保同一房間的日誌順序與套用順序一致"""
+        line_args = _encode_args(op, args)
+        with self._lock:
+            self._seq += 1
+            record = {"seq": self._seq, "room": code, "op": op, "args": line_args}
+            if kwargs:
+                record["kwargs"] = kwargs
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._room_seq[code] = self._seq
+            self._pending += 1
+            self._since_snapshot += 1
+            if self._pending >= self.batch_size:
+                self._sync_locked()
+            return self._seq
+
+    def _sync_locked(self):
+        if self._pending and self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def flush(self):
+        """立即將緩衝中的日誌寫入磁碟"""
+        with self._lock:
+            self._sync_locked()
+
+    def _start_background(self):
+        if self._threads:
+            return
+        self._threads = [
+            threading.Thread(target=self._fsync_loop, name="journal-fsync", daemon=True),
+            threading.Thread(target=self._snapshot_loop, name="journal-snapshot", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def _fsync_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            self.flush()
+
+    def _snapshot_loop(self):
+        while not self._closed.wait(1.0):
+            due = time.monotonic() - self._last_snapshot >= self.snapshot_interval
+            if self._since_snapshot and (due or self._since_snapshot >= self.snapshot_every):
+                self.snapshot()
+
+    # ---------- 快照 ----------
+
+    def _capture(self):
+        """逐間房間在房間鎖內匯出，附上該房間最後的事件序號"""
+        rooms = []
+        archived = {}
+        for code in dict.fromkeys(list(data_store.ROOMS) + list(self.archived)):
+            with self.room_lock(code):
+                room_seq = self._room_seq.get(code, 0)
+                if code in data_store.ROOMS:
+                    rooms.append(dict(self.export_room(code), seq=room_seq))
+                elif code in self.archived:
+                    name, summary = self.archived[code]
+                    archived[code] = [name, summary.to_dict(), room_seq]
+        return rooms, archived
+
+    def snapshot(self):
+        """寫入快照並捨棄快照已涵蓋的日誌，回傳快照涵蓋的最後事件序號"""
+        with self._snapshot_lock:
+            with self._lock:
+                seq = self._seq
+                # 輪替日誌：之後的新事件寫到新的 journal.log
+                self._sync_locked()
+                self._file.close()
+                if os.path.exists(self._prev_path):
+                    # 上一次快照未完成，把目前日誌接到舊日誌後面
+                    with open(self._prev_path, "ab") as prev, open(self._journal_path, "rb") as current:
+                        prev.write(current.read())
+                        prev.flush()
+                        os.fsync(prev.fileno())
+                    os.remove(self._journal_path)
+                else:
+                    os.replace(self._journal_path, self._prev_path)
+                self._file = open(self._journal_path, "a", encoding="utf-8", buffering=1 << 16)
+                self._since_snapshot = 0
+                self._last_snapshot = time.monotonic()
+
+            rooms, archived = self._capture()
+            tmp_path = self._snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"seq": seq, "rooms": rooms, "archived": archived}, ensure_ascii=False, separators=(",", ":")))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._snapshot_path)
+            os.remove(self._prev_path)
+            with self._lock:
+                released = [name for event_seq, name in self._released if event_seq <= seq]
+                self._released = [(s, n) for s, n in self._released if s > seq]
+            for name in released:
+                self.archive.remove(name)
+            return seq
+
+    # ---------- 寫入操作 ----------
+
+    def create_room(self, room, topic_names):
+        with self.room_lock(room.code):
+            super().create_room(room, topic_names)
+            self._append(room.code, "create_room", room, topic_names)
+
+    def update_room(self, code, **fields):
+        with self.room_lock(code):
+            super().update_room(code, **fields)
+            self._append(code, "update_room", code, **fields)
+
+    def ensure_topic(self, code, topic_name):
+        with self.room_lock(code):
+            super().ensure_topic(code, topic_name)
+            self._append(code, "ensure_topic", code, topic_name)
+
+    def remove_topic(self, code, topic_name):
+        with self.room_lock(code):
+            if not super().remove_topic(code, topic_name):
+                return False
+            self._append(code, "remove_topic", code, topic_name)
+            return True
+
+    def rename_topic(self, code, old_name, new_name):
+        with self.room_lock(code):
+            super().rename_topic(code, old_name, new_name)
+            self._append(code, "rename_topic", code, old_name, new_name)
+
+    def add_comment(self, code, topic_name, comment):
+        with self.room_lock(code):
+            super().add_comment(code, topic_name, comment)
+            self._append(code, "add_comment", code, topic_name, comment)
+
+    def delete_comment(self, code, comment_id):
+        with self.room_lock(code):
+            if not super().delete_comment(code, comment_id):
+                return False
+            self._append(code, "delete_comment", code, comment_id)
+            return True
+
+    def update_author_nickname(self, code, device_id, nickname):
+        with self.room_lock(code):
+            if not super().update_author_nickname(code, device_id, nickname):
+                return False
+            self._append(code, "update_author_nickname", code, device_id, nickname)
+            return True
+
+    def cast_vote(self, code, comment_id, device_id, vote_type):
+        with self.room_lock(code):
+            if not super().cast_vote(code, comment_id, device_id, vote_type):
+                return False
+            self._append(code, "cast_vote", code, comment_id, device_id, vote_type)
+            return True
+
+    def retract_vote(self, code, comment_id, device_id, vote_type):
+        with self.room_lock(code):
+            if not super().retract_vote(code, comment_id, device_id, vote_type):
+                return False
+            self._append(code, "retract_vote", code, comment_id, device_id, vote_type)
+            return True
+
+    def join_participant(self, code, device_id, nickname, now):
+        with self.room_lock(code):
+            count = super().join_participant(code, device_id, nickname, now)
+            self._append(code, "join_participant", code, device_id, nickname, now)
+            return count
+
+    def set_participant_nickname(self, code, device_id, nickname):
+        with self.room_lock(code):
+            if not super().set_participant_nickname(code, device_id, nickname):
+                return False
+            self._append(code, "set_participant_nickname", code, device_id, nickname)
+            return True
+
+    # ---------- 封存 ----------
+
+    def evict_room(self, code, name, room_data):
+        super().evict_room(code, name, room_data)
+        self._append(code, "evict_room", code, name, room_data)
+
+    def rehydrate_room(self, code):
+        name, _ = self.archived[code]
+        super().rehydrate_room(code)
+        seq = self._append(code, "rehydrate_room", code)
+        with self._lock:
+            self._released.append((seq, name))
+
+    def _release_archive(self, name):
+        # 日誌重播時仍需讀取此封存檔，等快照涵蓋這次還原（見 rehydrate_room）後再刪除
+        pass
+
+    # ---------- 維護 ----------
+
+    def clear(self):
+        with self._snapshot_lock, self._lock:
+            super().clear()
+            if self._file is not None:
+                self._file.close()
+            for path in (self._journal_path, self._prev_path, self._snapshot_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._file = open(self._journal_path, "a", encoding="utf-8", buffering=1 << 16)
+            self._seq = 0
+            self._room_seq.clear()
+            self._pending = 0
+            self._since_snapshot = 0
+            self._released = []
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        super().close()
+        self._closed.set()
+        for thread in self._threads:
+            thread.join()
+        if self._file is not None and self._since_snapshot:
+            self.snapshot()
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,428 @@
+"""
+記憶體儲存後端（預設）
+直接操作 api/data_store 的模組層級資料結構與索引
+設定 archive 時，閒置房間會被封存到磁碟並在下次存取時還原（見 api/storage/archive.py）
+"""
+
+import itertools
+import time
+
+from .. import data_store
+from ..data_store import ROOMS, topics, votes, room_participants
+from ..records import Room, Comment
+from .archive import RoomArchiver
+from .changelog import AUTHOR, RESET, RoomChangeLog, vote_count_payload
+from .base import StorageBackend, room_locked, room_write
+
+
+class MemoryStorage(StorageBackend):
+    """以 api/data_store 的字典與索引實作的儲存後端"""
+
+    name = "memory"
+
+    def __init__(self, archive=None, archive_after=6 * 3600, room_budget=500, auto_archive=True):
+        super().__init__()
+        self.archive = archive
+        self.archived = {}         # 已封存的房間: code → (封存檔名, Room 摘要)
+        self._rehydrated_at = {}   # 剛還原的房間不應立刻因房間數上限再被封存
+        self._versions = {}        # 房間代碼 → 最後一次修改時的版本
+        # 以微秒時間戳作為起點，重新啟動後的版本仍大於重新啟動前發出的版本
+        self._version_seq = itertools.count(time.time_ns() // 1000)
+        self._change_logs = {}     # 房間代碼 → RoomChangeLog
+        self._pending_changes = {} # 房間代碼 → 尚未分配版本的 (類型, 留言ID)
+        self.archiver = None
+        if archive is not None and auto_archive:
+            self.archiver = RoomArchiver(self, archive_after, room_budget)
+
+    # ---------- 房間 ----------
+
+    def room_exists(self, code):
+        return code in ROOMS or self._rehydrate_if_archived(code)
+
+    def get_room(self, code):
+        room = ROOMS.get(code)
+        if room is None and self._rehydrate_if_archived(code):
+            room = ROOMS.get(code)
+        return room
+
+    def room_version(self, code):
+        return self._versions.get(code, 0)
+
+    def _room_changed(self, code):
+        version = self._versions[code] = next(self._version_seq)
+        log = self._change_logs.get(code)
+        if log is None:
+            log = self._change_logs[code] = RoomChangeLog(version)
+        for kind, comment_id in self._pending_changes.pop(code, ()):
+            log.append(version, kind, comment_id)
+        self._notify_change(code, version)
+
+    def _record_change(self, code, kind, comment_id=None):
+        self._pending_changes.setdefault(code, []).append((kind, comment_id))
+
+    @room_locked
+    def get_comment_changes(self, code, topic_name, since):
+        log = self._change_logs.get(code)
+        if log is None or since > self._versions.get(code, 0):
+            return None
+        changed = log.since(since, lambda device_id: data_store.author_comments.get((code, device_id), ()))
+        topic = topics.get(data_store.make_topic_id(code, topic_name))
+        if changed is None or topic is None:
+            return None
+        comments, vote_counts, deleted = [], {}, []
+        for comment_id, kind in changed.items():
+            if kind == "delete":
+                deleted.append(comment_id)
+                continue
+            found = data_store.find_comment(code, comment_id)
+            if found is None or found[0] is not topic:
+                continue
+            if kind == "comment":
+                comments.append(data_store.comment_payload(code, found[1]))
+            else:
+                vote_counts[comment_id] = vote_count_payload(*data_store.get_vote_counts(comment_id))
+        comments.sort(key=lambda c: c["ts"])
+        return {"comments": comments, "vote_counts": vote_counts, "deleted": deleted}
+
+    def serves_from_memory(self, code):
+        # 已封存的房間需要先從磁碟還原
+        return code not in self.archived
+
+    def list_rooms(self):
+        """記憶體中的房間，以及已封存房間的摘要（不會觸發還原）"""
+        return list(ROOMS.values()) + [summary for _, summary in self.archived.values()]
+
+    def create_room(self, room, topic_names):
+        with self.room_lock(room.code):
+            ROOMS[room.code] = room
+            data_store.register_room(room.code)
+            for topic_name in topic_names:
+                data_store.ensure_topic(room.code, topic_name)
+            self._record_change(room.code, RESET)
+            self._room_changed(room.code)
+        if self.archiver is not None and len(ROOMS) > self.archiver.room_budget:
+            self.archiver.wake()
+
+    @room_write
+    def update_room(self, code, **fields):
+        room = ROOMS[code]
+        if "current_topic" in fields and fields["current_topic"] != room.current_topic:
+            self._record_change(code, RESET)
+        for key, value in fields.items():
+            setattr(room, key, value)
+
+    def running_countdowns(self):
+        return {
+            code: (room.time_start, room.countdown)
+            for code, room in list(ROOMS.items())
+            if room.status == "Discussion" and room.time_start
+        }
+
+    # ---------- 主題 ----------
+
+    @room_locked
+    def list_topic_names(self, code):
+        return list(data_store.room_topics.get(code, {}))
+
+    @room_locked
+    def list_topics(self, code):
+        return [data_store.resolved_topic(topic) for topic in data_store.get_room_topic_list(code)]
+
+    @room_locked
+    def topic_exists(self, code, topic_name):
+        return data_store.make_topic_id(code, topic_name) in topics
+
+    @room_write
+    def ensure_topic(self, code, topic_name):
+        data_store.ensure_topic(code, topic_name)
+
+    @room_write
+    def remove_topic(self, code, topic_name):
+        return data_store.remove_topic(code, topic_name) is not None
+
+    @room_write
+    def rename_topic(self, code, old_name, new_name):
+        data_store.rename_topic(code, old_name, new_name)
+
+    # ---------- 留言 ----------
+
+    @room_write
+    def add_comment(self, code, topic_name, comment):
+        topic = data_store.ensure_topic(code, topic_name)
+        if data_store.append_comment(code, topic, comment):
+            self._record_change(code, AUTHOR, comment.device_id)
+        self._record_change(code, "comment", comment.id)
+
+    @room_locked
+    def comment_exists(self, code, comment_id):
+        return data_store.find_comment(code, comment_id) is not None
+
+    @room_write
+    def delete_comment(self, code, comment_id):
+        if data_store.delete_comment(code, comment_id) is None:
+            return False
+        self._record_change(code, "delete", comment_id)
+        return True
+
+    @room_locked
+    def get_comment_payloads(self, code, topic_name):
+        topic = topics.get(data_store.make_topic_id(code, topic_name))
+        if topic is None:
+            return None
+        return [data_store.comment_payload(code, c) for c in topic.comments]
+
+    @room_locked
+    def get_comment_page(self, code, topic_name, after_id=None, since_ts=None, limit=None):
+        topic = topics.get(data_store.make_topic_id(code, topic_name))
+        if topic is None:
+            return None
+        page = data_store.page_comments(code, topic, after_id, since_ts, limit)
+        if page is None:
+            return None
+        comments, has_more = page
+        return [data_store.comment_payload(code, c) for c in comments], has_more
+
+    @room_locked
+    def get_top_comments(self, code, topic_name, n):
+        topic = topics.get(data_store.make_topic_id(code, topic_name))
+        if topic is None:
+            return None
+        ranking = data_store.get_topic_ranking(code, topic)
+        return [data_store.comment_payload(code, c) for c in ranking.top(n)]
+
+    @room_write
+    def update_author_nickname(self, code, device_id, nickname):
+        # 留言在序列化時才以作者暱稱顯示，改名只更新一筆，不逐則改寫
+        if not data_store.set_author_nickname(code, device_id, nickname):
+            return False
+        self._record_change(code, AUTHOR, device_id)
+        return True
+
+    # ---------- 投票 ----------
+
+    @room_write
+    def cast_vote(self, code, comment_id, device_id, vote_type):
+        if not data_store.cast_vote(code, comment_id, device_id, vote_type):
+            return False
+        self._record_change(code, "vote", comment_id)
+        return True
+
+    @room_write
+    def retract_vote(self, code, comment_id, device_id, vote_type):
+        if not data_store.retract_vote(code, comment_id, device_id, vote_type):
+            return False
+        self._record_change(code, "vote", comment_id)
+        return True
+
+    @room_locked
+    def get_device_votes(self, code, device_id):
+        return dict(data_store.get_device_votes(code, device_id))
+
+    @room_locked
+    def get_room_vote_counts(self, code):
+        return {
+            comment.id: votes[comment.id].counts()
+            for topic in data_store.get_room_topic_list(code)
+            for comment in topic.comments
+            if comment.id in votes
+        }
+
+    # ---------- 參與者 ----------
+
+    @room_write
+    def join_participant(self, code, device_id, nickname, now):
+        registry = data_store.get_participant_registry(code)
+        registry.join(device_id, nickname, now)
+        return self._update_online_count(code, registry.online_count(now))
+
+    @room_locked
+    def touch_participant(self, code, device_id, now):
+        registry = data_store.get_participant_registry(code)
+        registry.touch(device_id, now)
+        return self._update_online_count(code, registry.online_count(now))
+
+    @room_locked
+    def online_participants(self, code, now):
+        registry = room_participants.get(code)
+        if registry is None:
+            return []
+        online = registry.online_list(now)
+        self._update_online_count(code, len(online))
+        return online
+
+    @room_locked
+    def online_participants_tag(self, code, now):
+        registry = room_participants.get(code)
+        if registry is None:
+            return "0"
+        registry.expire(now)
+        return str(registry.online_version)
+
+    def sweep_participants(self, now):
+        swept = {"rooms": 0, "expired": 0}
+        for code in list(room_participants):
+            with self.room_lock(code):
+                registry = room_participants.get(code)
+                if registry is None:
+                    continue
+                swept["expired"] += registry.expire(now)
+                room = ROOMS.get(code)
+                count = registry.online_count(now)
+                if room is not None and room.participants != count:
+                    room.participants = count
+                    swept["rooms"] += 1
+        return swept
+
+    @room_write
+    def set_participant_nickname(self, code, device_id, nickname):
+        return data_store.get_participant_registry(code).set_nickname(device_id, nickname)
+
+    @room_locked
+    def find_device_by_nickname(self, code, nickname):
+        return data_store.get_participant_registry(code).find_device(nickname)
+
+    @room_locked
+    def list_participants(self, code):
+        return data_store.get_participant_registry(code).to_list()
+
+    # ---------- 封存 ----------
+
+    @room_locked
+    def export_room(self, code):
+        """序列化房間的所有資料（房間、主題與留言、投票者、參與者）"""
+        room_topics = data_store.get_room_topic_list(code)
+        return {
+            "room": ROOMS[code].to_dict(),
+            "topics": [data_store.resolved_topic(topic).to_dict() for topic in room_topics],
+            "votes": {
+                comment.id: votes[comment.id].to_dict()
+                for topic in room_topics
+                for comment in topic.comments
+                if comment.id in votes
+            },
+            "participants": self.list_participants(code),
+        }
+
+    def import_room(self, entry):
+        """由 export_room 的結果重建房間與所有索引"""
+        room = Room.from_dict(entry["room"])
+        MemoryStorage.create_room(self, room, [])
+        for topic in entry["topics"]:
+            data_store.ensure_topic(room.code, topic["topic_name"])
+            for comment in topic["comments"]:
+                MemoryStorage.add_comment(self, room.code, topic["topic_name"], Comment.from_dict(comment))
+        for comment_id, voters in entry["votes"].items():
+            for vote_type in ("good", "bad"):
+                for device_id in voters[vote_type]:
+                    data_store.cast_vote(room.code, comment_id, device_id, vote_type)
+        registry = data_store.get_participant_registry(room.code)
+        for participant in sorted(entry["participants"], key=lambda p: p["last_seen"]):
+            registry.join(participant["device_id"], participant["nickname"], participant["last_seen"])
+
+    def resident_room_activity(self):
+        """記憶體中每間房間的 (最近活動時間, 狀態)，供封存執行緒挑選房間"""
+        activity = {}
+        for code in list(ROOMS):
+            with self.room_lock(code):
+                room = ROOMS.get(code)
+                if room is not None:
+                    activity[code] = (max(data_store.room_last_active(code), self._rehydrated_at.get(code, 0)), room.status)
+        return activity
+
+    @room_locked
+    def archive_room(self, code):
+        """將房間寫入封存檔並從記憶體移除，房間不在記憶體中時回傳 False"""
+        if code not in ROOMS:
+            return False
+        entry = self.export_room(code)
+        name = self.archive.write(code, entry)
+        self.evict_room(code, name, entry["room"])
+        return True
+
+    @room_locked
+    def evict_room(self, code, name, room_data):
+        data_store.drop_room(code)
+        self._rehydrated_at.pop(code, None)
+        self._change_logs.pop(code, None)
+        self.archived[code] = (name, Room.from_dict(room_data))
+
+    @room_locked
+    def rehydrate_room(self, code):
+        name, _ = self.archived.pop(code)
+        self.import_room(self.archive.read(name))
+        self._rehydrated_at[code] = time.time()
+        self._release_archive(name)
+
+    def _release_archive(self, name):
+        """還原後不再需要的封存檔"""
+        self.archive.remove(name)
+
+    def _rehydrate_if_archived(self, code):
+        if code not in self.archived:
+            return False
+        with self.room_lock(code):
+            if code in self.archived:
+                self.rehydrate_room(code)
+                if self.archiver is not None:
+                    self.archiver.wake()
+        return code in ROOMS
+
+    def _update_online_count(self, code, count):
+        room = ROOMS.get(code)
+        if room is not None:
+            room.participants = count
+        return count
+
+    # ---------- 維護 ----------
+
+    def load(self):
+        # 記憶體資料不會跨程序保留，上一次執行留下的封存檔已無對應的房間摘要
+        if self.archive is not None:
+            self.archive.clear()
+        self._start_archiver()
+        return None
+
+    def _start_archiver(self):
+        if self.archiver is not None:
+            self.archiver.start()
+
+    def dump(self):
+        return {
+            "ROOMS": {
+                code: dict(room.to_dict(), participants_list=self.list_participants(code))
+                for code, room in list(ROOMS.items())
+            },
+            "topics": {topic_id: data_store.resolved_topic(topic).to_dict() for topic_id, topic in list(topics.items())},
+            "votes": {comment_id: tally.to_dict() for comment_id, tally in list(votes.items())},
+            "archived_rooms": sorted(self.archived),
+        }
+
+    def collect_garbage(self):
+        # 先在不持鎖的情況下依房間分組，再逐房間持鎖確認並清除
+        devices = {code: set() for code in list(room_participants)}
+        for code, device_id in itertools.chain(list(data_store.device_votes), list(data_store.author_comments)):
+            devices.setdefault(code, set()).add(device_id)
+        removed = {"votes": 0, "authors": 0, "registries": 0}
+        for code, device_ids in devices.items():
+            with self.room_lock(code):
+                counts = data_store.collect_room_orphans(code, device_ids)
+                # 裝置投票紀錄會出現在回應中，有清除時遞增房間版本
+                if counts["votes"] and code in ROOMS:
+                    self._room_changed(code)
+            for kind, count in counts.items():
+                removed[kind] += count
+        return removed
+
+    def clear(self):
+        data_store.clear_all()
+        self.archived.clear()
+        self._rehydrated_at.clear()
+        self._versions.clear()
+        self._change_logs.clear()
+        self._pending_changes.clear()
+        if self.archive is not None:
+            self.archive.clear()
+
+    def close(self):
+        if self.archiver is not None:
+            self.archiver.stop()
@@ -0,0 +1,771 @@
+"""
+SQLite 儲存後端（WAL 模式）
+讓房間資料在後端重新啟動後仍然保留，並可在不載入全部資料的情況下查詢
+
+- 所有 SQL 都是固定字串，由 sqlite3 的 statement cache 重複使用已編譯的 prepared statement
+- room_id / topic / comment_id 皆有索引
+- 寫入以 SAVEPOINT 包住單一操作，並批次提交：累積 batch_size 筆或經過 commit_interval 秒才 COMMIT
+- 修改房間資料的操作會在 room_versions 記錄房間的新版本（全域遞增），並在 room_changes 記錄被修改的留言
+  （規則與 changelog.py 相同；切換主題時刪除該房間較舊的紀錄，超過 MAX_ENTRIES 筆時捨棄較舊的一半）
+
+shared 模式（多 worker 共用同一個資料庫檔案，見 main.py 的 MBBUDDY_WORKERS）：
+- 每個操作立即提交，其他 worker 的下一次讀取就能看到
+- room_lock 除了程序內的房間鎖，另以 BEGIN IMMEDIATE 取得資料庫寫入鎖，端點的多步驟操作跨 worker 也是原子的
+- 背景執行緒以 PRAGMA data_version 偵測其他 worker 的提交，並對有新版本的房間發出變更通知
+"""
+
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from ..records import Room, Topic, Comment
+from .base import StorageBackend
+from .changelog import AUTHOR, MAX_ENTRIES, RESET, merge_changes, vote_count_payload
+from ..data_store import ONLINE_WINDOW, RETENTION_WINDOW
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    code TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    settings TEXT NOT NULL,
+    status TEXT NOT NULL,
+    participants INTEGER NOT NULL DEFAULT 0,
+    current_topic TEXT,
+    countdown INTEGER NOT NULL DEFAULT 0,
+    time_start REAL NOT NULL DEFAULT 0,
+    topic_summary TEXT NOT NULL DEFAULT '',
+    desired_outcome TEXT NOT NULL DEFAULT '',
+    topic_count INTEGER NOT NULL DEFAULT 1,
+    room_context TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    room_id TEXT NOT NULL,
+    topic_name TEXT NOT NULL,
+    UNIQUE (room_id, topic_name)
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    room_id TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    nickname TEXT NOT NULL,
+    content TEXT NOT NULL,
+    ts REAL NOT NULL,
+    is_ai_summary INTEGER NOT NULL DEFAULT 0,
+    device_id TEXT,
+    vote_good INTEGER NOT NULL DEFAULT 0,
+    vote_bad INTEGER NOT NULL DEFAULT 0
+);
+-- 主題的留言依 (ts, rowid) 排列，分頁讀取直接沿著索引往後掃描；舊版的 (topic_id) 索引是其前綴，不再需要
+DROP INDEX IF EXISTS idx_comments_topic;
+CREATE INDEX IF NOT EXISTS idx_comments_topic_ts ON comments (topic_id, ts);
+-- 留言排行：沿索引由高分往回掃描 n 筆，不需要排序整個主題
+CREATE INDEX IF NOT EXISTS idx_comments_topic_score ON comments (topic_id, vote_good - vote_bad, ts) WHERE is_ai_summary = 0;
+CREATE INDEX IF NOT EXISTS idx_comments_room_device ON comments (room_id, device_id);
+CREATE TABLE IF NOT EXISTS votes (
+    comment_id TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    room_id TEXT NOT NULL,
+    vote_type TEXT NOT NULL,
+    PRIMARY KEY (comment_id, device_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_votes_room_device ON votes (room_id, device_id);
+CREATE TABLE IF NOT EXISTS participants (
+    room_id TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    nickname TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (room_id, device_id)
+);
+CREATE INDEX IF NOT EXISTS idx_participants_seen ON participants (room_id, last_seen);
+CREATE INDEX IF NOT EXISTS idx_participants_nickname ON participants (room_id, nickname);
+CREATE TABLE IF NOT EXISTS room_versions (
+    code TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_room_versions_version ON room_versions (version);
+CREATE TABLE IF NOT EXISTS room_changes (
+    room_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    comment_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_room_changes_version ON room_changes (room_id, version);
+-- 留言作者目前的暱稱；comments.nickname 只保存發表時的暱稱，讀取時以此為準，作者改名只需更新一列
+CREATE TABLE IF NOT EXISTS comment_authors (
+    room_id TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    nickname TEXT NOT NULL,
+    PRIMARY KEY (room_id, device_id)
+);
+"""
+
+ROOM_COLUMNS = (
+    "code", "title", "created_at", "settings", "status", "participants", "current_topic",
+    "countdown", "time_start", "topic_summary", "desired_outcome", "topic_count", "room_context",
+)
+
+COMMENT_COLUMNS = (
+    "id, COALESCE((SELECT a.nickname FROM comment_authors a "
+    "WHERE a.room_id = comments.room_id AND a.device_id = comments.device_id), nickname) AS nickname, "
+    "content, ts, is_ai_summary, device_id, vote_good, vote_bad"
+)
+
+
+def _room_from_row(row):
+    data = dict(row)
+    data["settings"] = json.loads(data["settings"])
+    return Room.from_dict(data)
+
+
+def _comment_from_row(row):
+    return Comment(row["id"], row["nickname"], row["content"], row["ts"], bool(row["is_ai_summary"]), row["device_id"])
+
+
+def _payload_from_row(row):
+    return _comment_from_row(row).to_payload(row["vote_good"], row["vote_bad"])
+
+
+class _RoomTransaction:
+    """shared 模式的房間鎖：持有期間佔住連線與資料庫寫入鎖，結束時提交"""
+
+    def __init__(self, storage, lock):
+        self.storage = storage
+        self.lock = lock
+
+    def acquire(self, blocking=True):
+        if not self.lock.acquire(blocking):
+            return False
+        if not self.storage._lock.acquire(blocking):
+            self.lock.release()
+            return False
+        self.storage._begin_room_transaction()
+        return True
+
+    def release(self):
+        try:
+            self.storage._end_room_transaction()
+        finally:
+            self.storage._lock.release()
+            self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SQLiteStorage(StorageBackend):
+    """以單一 SQLite 檔案（WAL 模式）實作的儲存後端"""
+
+    name = "sqlite"
+
+    def __init__(self, path, batch_size=64, commit_interval=0.05, shared=False, watch_interval=0.05):
+        super().__init__()
+        self.path = path
+        self.shared = shared
+        # 多 worker 時批次提交會讓其他 worker 最多晚 commit_interval 秒才看到寫入，且期間佔住寫入鎖
+        self.batch_size = 1 if shared else batch_size
+        self.commit_interval = commit_interval
+        self.watch_interval = watch_interval
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, cached_statements=256,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._pending = 0
+        self._pending_changes = []
+        self._batch_started = None
+        self._transaction_depth = 0
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="sqlite-flusher", daemon=True)
+        self._flusher.start()
+        self._watcher = None
+        if shared:
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._seen_version = self._read_one("SELECT COALESCE(MAX(version), 0) FROM room_versions")[0]
+            self._local_versions = set()
+            self._watcher = threading.Thread(target=self._watch_loop, name="sqlite-watcher", daemon=True)
+            self._watcher.start()
+        # 程序結束前寫入最後一批尚未提交的資料
+        atexit.register(self.close)
+
+    # ---------- 交易管理 ----------
+
+    @contextmanager
+    def _write(self, code=None):
+        """單一寫入操作：以 SAVEPOINT 確保原子性，提交則交給批次處理；有修改資料時遞增房間 code 的版本"""
+        with self._lock:
+            self._begin_locked()
+            changes = self._conn.total_changes
+            self._conn.execute("SAVEPOINT op")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK TO op")
+                self._conn.execute("RELEASE op")
+                self._pending_changes.clear()
+                raise
+            self._conn.execute("RELEASE op")
+            version = None
+            if code is not None and self._conn.total_changes != changes:
+                version = self._bump_version_locked(code)
+                self._write_changes_locked(code, version)
+            self._pending_changes.clear()
+            self._pending += 1
+            if self._pending >= self.batch_size and self._transaction_depth == 0:
+                self._commit_locked()
+            if version is not None:
+                self._notify_change(code, version)
+
+    def _begin_locked(self):
+        if self._batch_started is None:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._batch_started = time.monotonic()
+
+    def _bump_version_locked(self, code):
+        # 以微秒時間戳作為起點，清空資料後的版本仍大於先前發出的版本
+        version = self._conn.execute(
+            "SELECT MAX(COALESCE(MAX(version), 0) + 1, ?) FROM room_versions", (time.time_ns() // 1000,)
+        ).fetchone()[0]
+        self._conn.execute(
+            "INSERT INTO room_versions (code, version) VALUES (?, ?) "
+            "ON CONFLICT (code) DO UPDATE SET version = excluded.version",
+            (code, version),
+        )
+        if self.shared:
+            self._local_versions.add(version)
+        return version
+
+    def _record_change(self, code, kind, comment_id=None):
+        # 由 _write 內的寫入方法呼叫（已持有 self._lock），與這次操作的版本一起寫入
+        self._pending_changes.append((kind, comment_id))
+
+    def _write_changes_locked(self, code, version):
+        if not self._pending_changes:
+            return
+        if any(kind == RESET for kind, _ in self._pending_changes):
+            # 之前的版本已無法增量同步，只保留這次的 reset 作為紀錄起點
+            self._conn.execute("DELETE FROM room_changes WHERE room_id = ?", (code,))
+            self._conn.execute(
+                "INSERT INTO room_changes (room_id, version, kind) VALUES (?, ?, ?)", (code, version, RESET)
+            )
+        self._conn.executemany(
+            "INSERT INTO room_changes (room_id, version, kind, comment_id) VALUES (?, ?, ?, ?)",
+            [(code, version, kind, comment_id) for kind, comment_id in self._pending_changes if kind != RESET],
+        )
+        # 與 RoomChangeLog 相同：超過上限時捨棄較舊的一半，並以 reset 紀錄新的起點，
+        # 早於起點的 since 由 get_comment_changes 回傳 None，改為完整重新載入
+        if self._conn.execute(
+            "SELECT 1 FROM room_changes WHERE room_id = ? ORDER BY version DESC, rowid DESC LIMIT 1 OFFSET ?",
+            (code, MAX_ENTRIES),
+        ).fetchone() is not None:
+            floor = self._conn.execute(
+                "SELECT version FROM room_changes WHERE room_id = ? ORDER BY version DESC, rowid DESC LIMIT 1 OFFSET ?",
+                (code, MAX_ENTRIES // 2),
+            ).fetchone()[0]
+            self._conn.execute("DELETE FROM room_changes WHERE room_id = ? AND version <= ?", (code, floor))
+            self._conn.execute(
+                "INSERT INTO room_changes (room_id, version, kind) VALUES (?, ?, ?)", (code, floor, RESET)
+            )
+
+    def get_comment_changes(self, code, topic_name, since):
+        with self._lock:
+            # reset 之前的紀錄已刪除，最早的一筆即為紀錄起點
+            floor = self._read_one(
+                "SELECT version, kind FROM room_changes WHERE room_id = ? ORDER BY version, rowid LIMIT 1", (code,)
+            )
+            if floor is None or floor["kind"] != RESET or since < floor["version"] or since > self.room_version(code):
+                return None
+            topic_id = self._topic_id(code, topic_name)
+            if topic_id is None:
+                return None
+            changed = merge_changes(self._read(
+                "SELECT kind, comment_id FROM room_changes WHERE room_id = ? AND version > ? ORDER BY version, rowid",
+                (code, since),
+            ), lambda device_id: [row["id"] for row in self._read(
+                "SELECT id FROM comments WHERE room_id = ? AND device_id = ?", (code, device_id)
+            )])
+            rows = self._read(
+                f"SELECT {COMMENT_COLUMNS} FROM comments "
+                # 以主鍵逐一查詢變更的留言，不掃描整個主題（+topic_id 讓查詢規劃不使用主題索引）
+                "WHERE id IN (SELECT value FROM json_each(?)) AND +topic_id = ? ORDER BY ts, rowid",
+                (json.dumps([cid for cid, kind in changed.items() if kind != "delete"]), topic_id),
+            )
+        comments, vote_counts = [], {}
+        for row in rows:
+            if changed[row["id"]] == "comment":
+                comments.append(_payload_from_row(row))
+            else:
+                vote_counts[row["id"]] = vote_count_payload(row["vote_good"], row["vote_bad"])
+        deleted = [cid for cid, kind in changed.items() if kind == "delete"]
+        return {"comments": comments, "vote_counts": vote_counts, "deleted": deleted}
+
+    def _begin_room_transaction(self):
+        # 呼叫端已持有 self._lock
+        self._transaction_depth += 1
+        self._begin_locked()
+
+    def _end_room_transaction(self):
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self._commit_locked()
+
+    def room_lock(self, code):
+        if not self.shared:
+            return super().room_lock(code)
+        return _RoomTransaction(self, super().room_lock(code))
+
+    def room_version(self, code):
+        row = self._read_one("SELECT version FROM room_versions WHERE code = ?", (code,))
+        return row["version"] if row is not None else 0
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _read_one(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _commit_locked(self):
+        if self._batch_started is not None:
+            self._conn.execute("COMMIT")
+            self._batch_started = None
+            self._pending = 0
+
+    def flush(self):
+        """立即提交尚未寫入的批次"""
+        with self._lock:
+            self._commit_locked()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.commit_interval):
+            with self._lock:
+                if (self._batch_started is not None and self._transaction_depth == 0
+                        and time.monotonic() - self._batch_started >= self.commit_interval):
+                    self._commit_locked()
+
+    def _watch_loop(self):
+        """shared 模式：偵測其他 worker 的提交並通知有新版本的房間"""
+        while not self._closed.wait(self.watch_interval):
+            try:
+                self.poll_changes()
+            except sqlite3.Error as e:
+                print(f"偵測資料庫變更失敗: {e}")
+
+    def poll_changes(self):
+        """檢查其他連線提交的房間版本，回傳發出通知的 (code, version)"""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+            rows = self._conn.execute(
+                "SELECT code, version FROM room_versions WHERE version > ? ORDER BY version", (self._seen_version,)
+            ).fetchall()
+            changed = []
+            for row in rows:
+                if row["version"] in self._local_versions:
+                    self._local_versions.discard(row["version"])
+                else:
+                    changed.append((row["code"], row["version"]))
+            if rows:
+                self._seen_version = rows[-1]["version"]
+            self._local_versions = {v for v in self._local_versions if v > self._seen_version}
+        for code, version in changed:
+            self._notify_change(code, version)
+        return changed
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+        if self._watcher is not None:
+            self._watcher.join()
+        with self._lock:
+            self._commit_locked()
+            self._conn.close()
+
+    # ---------- 房間 ----------
+
+    def room_exists(self, code):
+        return self._read_one("SELECT 1 FROM rooms WHERE code = ?", (code,)) is not None
+
+    def get_room(self, code):
+        row = self._read_one("SELECT * FROM rooms WHERE code = ?", (code,))
+        return _room_from_row(row) if row is not None else None
+
+    def list_rooms(self):
+        return [_room_from_row(row) for row in self._read("SELECT * FROM rooms ORDER BY rowid")]
+
+    def create_room(self, room, topic_names):
+        data = room.to_dict()
+        data["settings"] = json.dumps(data["settings"])
+        with self._write(room.code) as conn:
+            conn.execute(
+                f"INSERT INTO rooms ({', '.join(ROOM_COLUMNS)}) VALUES ({', '.join('?' * len(ROOM_COLUMNS))})",
+                [data[c] for c in ROOM_COLUMNS],
+            )
+            self._record_change(room.code, RESET)
+            for topic_name in topic_names:
+                conn.execute("INSERT OR IGNORE INTO topics (room_id, topic_name) VALUES (?, ?)", (room.code, topic_name))
+
+    def update_room(self, code, **fields):
+        if not fields:
+            return
+        unknown = set(fields) - set(ROOM_COLUMNS)
+        if unknown:
+            raise ValueError(f"未知的房間欄位: {', '.join(sorted(unknown))}")
+        if "settings" in fields:
+            fields["settings"] = json.dumps(fields["settings"])
+        columns = sorted(fields)
+        with self._write(code) as conn:
+            if "current_topic" in fields:
+                row = conn.execute("SELECT current_topic FROM rooms WHERE code = ?", (code,)).fetchone()
+                if row is not None and row["current_topic"] != fields["current_topic"]:
+                    self._record_change(code, RESET)
+            conn.execute(
+                f"UPDATE rooms SET {', '.join(f'{c} = ?' for c in columns)} WHERE code = ?",
+                [fields[c] for c in columns] + [code],
+            )
+
+    def running_countdowns(self):
+        return {
+            row["code"]: (row["time_start"], row["countdown"])
+            for row in self._read("SELECT code, time_start, countdown FROM rooms WHERE status = 'Discussion' AND time_start > 0")
+        }
+
+    # ---------- 主題 ----------
+
+    def _topic_id(self, code, topic_name):
+        row = self._read_one("SELECT id FROM topics WHERE room_id = ? AND topic_name = ?", (code, topic_name))
+        return row["id"] if row is not None else None
+
+    def list_topic_names(self, code):
+        return [row["topic_name"] for row in self._read(
+            "SELECT topic_name FROM topics WHERE room_id = ? ORDER BY id", (code,)
+        )]
+
+    def list_topics(self, code):
+        with self._lock:
+            topic_rows = self._read("SELECT id, topic_name FROM topics WHERE room_id = ? ORDER BY id", (code,))
+            comment_rows = self._read(
+                f"SELECT topic_id, {COMMENT_COLUMNS} FROM comments WHERE room_id = ? ORDER BY ts, rowid", (code,)
+            )
+        by_id = {row["id"]: Topic(code, row["topic_name"]) for row in topic_rows}
+        for row in comment_rows:
+            topic = by_id.get(row["topic_id"])
+            if topic is not None:
+                topic.comments.append(_comment_from_row(row))
+        return list(by_id.values())
+
+    def topic_exists(self, code, topic_name):
+        return self._topic_id(code, topic_name) is not None
+
+    def ensure_topic(self, code, topic_name):
+        with self._write(code) as conn:
+            conn.execute("INSERT OR IGNORE INTO topics (room_id, topic_name) VALUES (?, ?)", (code, topic_name))
+
+    def remove_topic(self, code, topic_name):
+        with self._write(code) as conn:
+            topic_id = self._topic_id(code, topic_name)
+            if topic_id is None:
+                return False
+            conn.execute(
+                "DELETE FROM votes WHERE comment_id IN (SELECT id FROM comments WHERE topic_id = ?)", (topic_id,)
+            )
+            conn.execute("DELETE FROM comments WHERE topic_id = ?", (topic_id,))
+            conn.execute("DELETE FROM topics WHERE id = ?", (topic_id,))
+            return True
+
+    def rename_topic(self, code, old_name, new_name):
+        with self._write(code) as conn:
+            conn.execute(
+                "UPDATE topics SET topic_name = ? WHERE room_id = ? AND topic_name = ?", (new_name, code, old_name)
+            )
+
+    # ---------- 留言 ----------
+
+    def add_comment(self, code, topic_name, comment):
+        with self._write(code) as conn:
+            conn.execute("INSERT OR IGNORE INTO topics (room_id, topic_name) VALUES (?, ?)", (code, topic_name))
+            conn.execute(
+                "INSERT INTO comments (id, room_id, topic_id, nickname, content, ts, is_ai_summary, device_id) "
+                "VALUES (?, ?, (SELECT id FROM topics WHERE room_id = ? AND topic_name = ?), ?, ?, ?, ?, ?)",
+                (comment.id, code, code, topic_name, comment.nickname, comment.content, comment.ts,
+                 int(bool(comment.isAISummary)), comment.device_id),
+            )
+            if comment.device_id:
+                author = conn.execute(
+                    "SELECT nickname FROM comment_authors WHERE room_id = ? AND device_id = ?", (code, comment.device_id)
+                ).fetchone()
+                if author is None or author["nickname"] != comment.nickname:
+                    conn.execute(
+                        "INSERT INTO comment_authors (room_id, device_id, nickname) VALUES (?, ?, ?) "
+                        "ON CONFLICT (room_id, device_id) DO UPDATE SET nickname = excluded.nickname",
+                        (code, comment.device_id, comment.nickname),
+                    )
+                    if author is not None:
+                        # 以新暱稱發表時，作者之前的留言也改顯示新暱稱
+                        self._record_change(code, AUTHOR, comment.device_id)
+            self._record_change(code, "comment", comment.id)
+
+    def comment_exists(self, code, comment_id):
+        return self._read_one("SELECT 1 FROM comments WHERE id = ? AND room_id = ?", (comment_id, code)) is not None
+
+    def delete_comment(self, code, comment_id):
+        with self._write(code) as conn:
+            if not self.comment_exists(code, comment_id):
+                return False
+            conn.execute("DELETE FROM votes WHERE comment_id = ?", (comment_id,))
+            conn.execute("DELETE FROM comments WHERE id = ?", (comment_id,))
+            self._record_change(code, "delete", comment_id)
+            return True
+
+    def get_comment_payloads(self, code, topic_name):
+        with self._lock:
+            topic_id = self._topic_id(code, topic_name)
+            if topic_id is None:
+                return None
+            rows = self._read(f"SELECT {COMMENT_COLUMNS} FROM comments WHERE topic_id = ? ORDER BY ts, rowid", (topic_id,))
+        return [_payload_from_row(row) for row in rows]
+
+    def get_comment_page(self, code, topic_name, after_id=None, since_ts=None, limit=None):
+        with self._lock:
+            topic_id = self._topic_id(code, topic_name)
+            if topic_id is None:
+                return None
+            where, params = "topic_id = ?", [topic_id]
+            cursor = None
+            if after_id is not None:
+                cursor = self._read_one("SELECT ts, rowid FROM comments WHERE id = ? AND topic_id = ?", (after_id, topic_id))
+            if cursor is not None:
+                # ts >= ? 讓查詢沿 (topic_id, ts) 索引從游標位置開始掃描，再略過同一時間戳中游標之前的留言
+                where += " AND ts >= ? AND (ts > ? OR rowid > ?)"
+                params += [cursor["ts"], cursor["ts"], cursor["rowid"]]
+            elif since_ts is not None:
+                where += " AND ts > ?"
+                params.append(since_ts)
+            elif after_id is not None:
+                return None
+            sql = f"SELECT {COMMENT_COLUMNS} FROM comments WHERE {where} ORDER BY ts, rowid"
+            if limit is not None:
+                # 多讀一筆判斷是否還有下一頁
+                sql += " LIMIT ?"
+                params.append(limit + 1)
+            rows = self._read(sql, params)
+        has_more = limit is not None and len(rows) > limit
+        return [_payload_from_row(row) for row in rows[:limit]], has_more
+
+    def get_top_comments(self, code, topic_name, n):
+        with self._lock:
+            topic_id = self._topic_id(code, topic_name)
+            if topic_id is None:
+                return None
+            rows = self._read(
+                f"SELECT {COMMENT_COLUMNS} FROM comments WHERE topic_id = ? AND is_ai_summary = 0 "
+                "ORDER BY vote_good - vote_bad DESC, ts DESC, rowid DESC LIMIT ?",
+                (topic_id, n),
+            )
+        return [_payload_from_row(row) for row in rows]
+
+    def update_author_nickname(self, code, device_id, nickname):
+        # 留言在讀取時才以作者暱稱顯示，改名只更新一列，不逐則改寫
+        with self._write(code) as conn:
+            if not conn.execute(
+                "UPDATE comment_authors SET nickname = ? WHERE room_id = ? AND device_id = ? AND nickname != ?",
+                (nickname, code, device_id, nickname),
+            ).rowcount:
+                return False
+            self._record_change(code, AUTHOR, device_id)
+            return True
+
+    # ---------- 投票 ----------
+
+    def cast_vote(self, code, comment_id, device_id, vote_type):
+        with self._write(code) as conn:
+            row = conn.execute(
+                "SELECT vote_type FROM votes WHERE comment_id = ? AND device_id = ?", (comment_id, device_id)
+            ).fetchone()
+            if row is not None and row["vote_type"] == vote_type:
+                return False
+            if row is None:
+                conn.execute(
+                    "INSERT INTO votes (comment_id, device_id, room_id, vote_type) VALUES (?, ?, ?, ?)",
+                    (comment_id, device_id, code, vote_type),
+                )
+            else:
+                conn.execute(
+                    "UPDATE votes SET vote_type = ? WHERE comment_id = ? AND device_id = ?",
+                    (vote_type, comment_id, device_id),
+                )
+            good_delta = 1 if vote_type == "good" else (-1 if row is not None else 0)
+            bad_delta = 1 if vote_type == "bad" else (-1 if row is not None else 0)
+            conn.execute(
+                "UPDATE comments SET vote_good = vote_good + ?, vote_bad = vote_bad + ? WHERE id = ?",
+                (good_delta, bad_delta, comment_id),
+            )
+            self._record_change(code, "vote", comment_id)
+            return True
+
+    def retract_vote(self, code, comment_id, device_id, vote_type):
+        with self._write(code) as conn:
+            deleted = conn.execute(
+                "DELETE FROM votes WHERE comment_id = ? AND device_id = ? AND room_id = ? AND vote_type = ?",
+                (comment_id, device_id, code, vote_type),
+            ).rowcount
+            if not deleted:
+                return False
+            column = "vote_good" if vote_type == "good" else "vote_bad"
+            conn.execute(f"UPDATE comments SET {column} = {column} - 1 WHERE id = ?", (comment_id,))
+            self._record_change(code, "vote", comment_id)
+            return True
+
+    def get_device_votes(self, code, device_id):
+        return {row["comment_id"]: row["vote_type"] for row in self._read(
+            "SELECT comment_id, vote_type FROM votes WHERE room_id = ? AND device_id = ?", (code, device_id)
+        )}
+
+    def get_room_vote_counts(self, code):
+        return {row["id"]: (row["vote_good"], row["vote_bad"]) for row in self._read(
+            "SELECT id, vote_good, vote_bad FROM comments WHERE room_id = ? AND (vote_good > 0 OR vote_bad > 0)",
+            (code,),
+        )}
+
+    # ---------- 參與者 ----------
+
+    def _refresh_online_count(self, conn, code, now):
+        conn.execute("DELETE FROM participants WHERE room_id = ? AND last_seen < ?", (code, now - RETENTION_WINDOW))
+        count = conn.execute(
+            "SELECT COUNT(*) FROM participants WHERE room_id = ? AND last_seen >= ?", (code, now - ONLINE_WINDOW)
+        ).fetchone()[0]
+        conn.execute("UPDATE rooms SET participants = ? WHERE code = ?", (count, code))
+        return count
+
+    def join_participant(self, code, device_id, nickname, now):
+        with self._write(code) as conn:
+            conn.execute(
+                "INSERT INTO participants (room_id, device_id, nickname, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (room_id, device_id) DO UPDATE SET nickname = excluded.nickname, last_seen = excluded.last_seen",
+                (code, device_id, nickname, now),
+            )
+            return self._refresh_online_count(conn, code, now)
+
+    def touch_participant(self, code, device_id, now):
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE participants SET last_seen = ? WHERE room_id = ? AND device_id = ?", (now, code, device_id)
+            )
+            return self._refresh_online_count(conn, code, now)
+
+    def online_participants(self, code, now):
+        with self._write() as conn:
+            self._refresh_online_count(conn, code, now)
+            rows = conn.execute(
+                "SELECT device_id, nickname FROM participants WHERE room_id = ? AND last_seen >= ? ORDER BY rowid",
+                (code, now - ONLINE_WINDOW),
+            ).fetchall()
+        return [{"device_id": row["device_id"], "nickname": row["nickname"]} for row in rows]
+
+    def sweep_participants(self, now):
+        with self._write() as conn:
+            expired = conn.execute("DELETE FROM participants WHERE last_seen < ?", (now - RETENTION_WINDOW,)).rowcount
+            # 只更新在線人數改變的房間
+            rooms = conn.execute(
+                "UPDATE rooms SET participants = (SELECT COUNT(*) FROM participants p "
+                "WHERE p.room_id = rooms.code AND p.last_seen >= ?1) "
+                "WHERE participants != (SELECT COUNT(*) FROM participants p WHERE p.room_id = rooms.code AND p.last_seen >= ?1)",
+                (now - ONLINE_WINDOW,),
+            ).rowcount
+        return {"rooms": rooms, "expired": expired}
+
+    def online_participants_tag(self, code, now):
+        # 沒有可遞增的在線名單版本，改以名單內容的雜湊代表，仍省去 JSON 序列化與傳輸
+        digest = hashlib.blake2b(digest_size=8)
+        for row in self._read(
+            "SELECT device_id, nickname FROM participants WHERE room_id = ? AND last_seen >= ? ORDER BY rowid",
+            (code, now - ONLINE_WINDOW),
+        ):
+            digest.update(f"{row['device_id']}\0{row['nickname']}\0".encode("utf-8"))
+        return digest.hexdigest()
+
+    def set_participant_nickname(self, code, device_id, nickname):
+        with self._write(code) as conn:
+            return conn.execute(
+                "UPDATE participants SET nickname = ? WHERE room_id = ? AND device_id = ?", (nickname, code, device_id)
+            ).rowcount > 0
+
+    def find_device_by_nickname(self, code, nickname):
+        row = self._read_one(
+            "SELECT device_id FROM participants WHERE room_id = ? AND nickname = ? ORDER BY rowid LIMIT 1",
+            (code, nickname),
+        )
+        return row["device_id"] if row is not None else None
+
+    def list_participants(self, code):
+        return [dict(row) for row in self._read(
+            "SELECT device_id, nickname, last_seen FROM participants WHERE room_id = ? ORDER BY rowid", (code,)
+        )]
+
+    # ---------- 維護 ----------
+
+    def dump(self):
+        with self._lock:
+            rooms = {
+                room.code: dict(room.to_dict(), participants_list=self.list_participants(room.code))
+                for room in self.list_rooms()
+            }
+            all_topics = {
+                f"{topic.room_id}_{topic.topic_name}": topic.to_dict()
+                for code in rooms
+                for topic in self.list_topics(code)
+            }
+            all_votes = {}
+            for row in self._read("SELECT comment_id, device_id, vote_type FROM votes"):
+                all_votes.setdefault(row["comment_id"], {"good": [], "bad": []})[row["vote_type"]].append(row["device_id"])
+        return {"ROOMS": rooms, "topics": all_topics, "votes": all_votes}
+
+    def collect_garbage(self):
+        removed = {}
+        # 裝置投票紀錄會出現在回應中，逐房間刪除以遞增房間版本
+        rooms = [row["room_id"] for row in self._read(
+            "SELECT DISTINCT room_id FROM votes WHERE NOT EXISTS (SELECT 1 FROM comments c WHERE c.id = votes.comment_id)"
+        )]
+        removed["votes"] = 0
+        for code in rooms:
+            with self._write(code) as conn:
+                removed["votes"] += conn.execute(
+                    "DELETE FROM votes WHERE room_id = ? AND NOT EXISTS (SELECT 1 FROM comments c WHERE c.id = votes.comment_id)",
+                    (code,),
+                ).rowcount
+        with self._write() as conn:
+            removed["authors"] = conn.execute(
+                "DELETE FROM comment_authors WHERE NOT EXISTS (SELECT 1 FROM comments c "
+                "WHERE c.room_id = comment_authors.room_id AND c.device_id = comment_authors.device_id)"
+            ).rowcount
+            removed["participants"] = conn.execute(
+                "DELETE FROM participants WHERE NOT EXISTS (SELECT 1 FROM rooms r WHERE r.code = participants.room_id)"
+            ).rowcount
+            removed["changes"] = conn.execute(
+                "DELETE FROM room_changes WHERE NOT EXISTS (SELECT 1 FROM rooms r WHERE r.code = room_changes.room_id)"
+            ).rowcount
+        return removed
+
+    def clear(self):
+        with self._write() as conn:
+            for table in ("rooms", "topics", "comments", "comment_authors", "votes", "participants", "room_versions",
+                          "room_changes"):
+                conn.execute(f"DELETE FROM {table}")
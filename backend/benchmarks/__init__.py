@@ -0,0 +1,4 @@
+"""
+後端效能基準測試
+於 backend 目錄下以模組方式執行，例如: python -m benchmarks.bench_room_topics
+"""
@@ -0,0 +1,85 @@
+"""
+閒置房間封存基準測試（1,000 間房間，房間數上限 100）
+
+量測封存前後記憶體中資料的大小、全房間掃描端點的延遲，
+以及存取已封存房間時的還原延遲。
+
+執行: python -m benchmarks.bench_archive
+"""
+
+import tempfile
+import time
+import tracemalloc
+
+from api import participants
+from api.storage import configure_storage, get_storage, RoomArchive, RoomArchiver
+from benchmarks.harness import create_room, add_comments, time_call, print_table, fmt_us
+
+ROOMS = 1000
+ROOM_BUDGET = 100
+TOPICS = 3
+COMMENTS = 30
+PARTICIPANTS = 10
+
+
+def seed():
+    codes = []
+    names = [f"主題{i}" for i in range(TOPICS)]
+    for r in range(ROOMS):
+        code = create_room(f"Room {r}", names)
+        for d in range(PARTICIPANTS):
+            participants.join_participant(participants.JoinRequest(room=code, nickname=f"user{d}", device_id=f"device_{d}"))
+        for name in names:
+            participants.update_current_topic(code, participants.TopicUpdateRequest(topic=name))
+            for i, comment_id in enumerate(add_comments(code, COMMENTS, nickname="user0")):
+                participants.vote_comment(code, comment_id, participants.VoteRequest(device_id=f"device_{i % PARTICIPANTS}", vote_type="good"))
+        participants.set_room_status(code, "End")
+        codes.append(code)
+    return codes
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = configure_storage("memory", archive=RoomArchive(tmp), auto_archive=False)
+        archiver = RoomArchiver(store, archive_after=6 * 3600, room_budget=ROOM_BUDGET)
+
+        tracemalloc.start()
+        codes = seed()
+        before = tracemalloc.get_traced_memory()[0]
+        scan_before = time_call(participants.get_all_rooms, repeat=5)["p50"]
+        rooms_before = time_call(participants.get_rooms, repeat=50)["p50"]
+
+        start = time.perf_counter()
+        archived = archiver.run_once()
+        archive_seconds = time.perf_counter() - start
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        scan_after = time_call(participants.get_all_rooms, repeat=20)["p50"]
+        rooms_after = time_call(participants.get_rooms, repeat=50)["p50"]
+
+        cold = []
+        for code in archived[:50]:
+            start = time.perf_counter()
+            participants._room_state(code)
+            cold.append((time.perf_counter() - start) * 1e6)
+        cold.sort()
+        warm = time_call(lambda: participants._room_state(archived[0]), repeat=500)["p50"]
+
+        rows = [
+            ("記憶體中的房間", f"{ROOMS:,}", f"{ROOMS - len(archived):,}"),
+            ("資料記憶體 (tracemalloc)", f"{before / 1e6:,.1f} MB", f"{after / 1e6:,.1f} MB"),
+            ("GET /api/all_rooms", fmt_us(scan_before), fmt_us(scan_after)),
+            ("GET /api/rooms", fmt_us(rooms_before), fmt_us(rooms_after)),
+        ]
+        print_table(f"封存前後 ({len(archived)} 間房間封存，耗時 {archive_seconds:.2f}s)", ["項目", "封存前", "封存後"], rows)
+        print_table("存取已封存房間 (GET state)", ["情境", "延遲"], [
+            ("首次存取 (還原, p50)", fmt_us(cold[len(cold) // 2])),
+            ("還原後 (p50)", fmt_us(warm)),
+        ])
+        print(f"\n還原後資料完整: {len(get_storage().list_topics(archived[0])[0].comments) == COMMENTS}")
+
+        configure_storage("memory", auto_archive=False)
+
+
+if __name__ == "__main__":
+    run()
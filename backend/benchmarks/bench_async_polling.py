@@ -0,0 +1,244 @@
+"""
+輪詢端點吞吐量：async 處理函數 vs 執行緒池
+
+以 uvicorn 啟動後端，1,000 個模擬參與者各自維持一條 keep-alive 連線，分成兩種負載：
+- saturate：不間斷地輪流呼叫 GET state、POST heartbeat、GET comments、GET room_status、GET votes，量測最大吞吐量
+- paced：依前端的輪詢間隔，每 3 秒 GET state、每 5 秒 POST heartbeat，量測一般負載下的延遲
+比較兩種實作的每秒請求數與延遲分位數：
+- threadpool：舊版以 def 宣告的處理函數，每個請求都經過 anyio 執行緒池
+- async：目前以 async def 宣告、直接在事件迴圈中讀取記憶體的處理函數
+
+--exports N 會另外讓 N 個客戶端不斷呼叫一個佔用執行緒 1 秒的端點，
+模擬 PDF 匯出佔滿執行緒池（預設 40 條執行緒）時輪詢請求的排隊情形。
+
+執行: python -m benchmarks.bench_async_polling [--clients 1000] [--duration 10] [--exports 0 40]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+
+ROOMS = 20
+COMMENTS_PER_ROOM = 30
+EXPORT_SECONDS = 1.0
+
+
+def build_app(mode):
+    """建立只含輪詢端點與模擬匯出端點的 FastAPI 應用"""
+    from fastapi import FastAPI
+    from api import participants
+
+    app = FastAPI()
+    if mode == "async":
+        app.include_router(participants.router)
+    else:
+        # 與 async 版本共用同一份讀取邏輯，只差在以 def 宣告
+        @app.get("/api/rooms/{room}/state")
+        def get_room_state(room: str):
+            return participants._room_state(room)
+
+        @app.get("/api/rooms/{room}/comments")
+        def get_room_comments(room: str):
+            return participants._room_comments(room)
+
+        @app.get("/api/room_status")
+        def get_room_status(room: str):
+            return participants._room_status(room)
+
+        @app.get("/api/rooms/{room}/votes")
+        def get_user_votes(room: str, device_id: str):
+            return participants._device_votes(room, device_id)
+
+        @app.post("/api/participants/heartbeat")
+        def participant_heartbeat(data: participants.HeartbeatRequest):
+            return participants._touch_participant(data.room, data.device_id)
+
+    @app.get("/bench/export")
+    def slow_export():
+        time.sleep(EXPORT_SECONDS)
+        return {"success": True}
+
+    return app
+
+
+def serve(mode, port, clients, ready):
+    """子程序：建立房間與參與者後啟動 uvicorn，房間代碼經由 ready 回傳"""
+    import uvicorn
+    from api import participants
+    from benchmarks.harness import create_room, add_comments, quiet
+
+    codes = []
+    with quiet():
+        for r in range(ROOMS):
+            code = create_room(f"Room {r}", ["主題一"])
+            participants.update_current_topic(code, participants.TopicUpdateRequest(topic="主題一"))
+            add_comments(code, COMMENTS_PER_ROOM)
+            codes.append(code)
+        for i in range(clients):
+            participants.join_participant(participants.JoinRequest(
+                room=codes[i % ROOMS], nickname=f"user{i}", device_id=f"device_{i}"))
+    ready.put(codes)
+    uvicorn.run(build_app(mode), host="127.0.0.1", port=port, log_level="error",
+                backlog=4096, access_log=False)
+
+
+async def request(reader, writer, method, path, body=None):
+    """在 keep-alive 連線上送出一個 HTTP/1.1 請求並讀完回應，回傳狀態碼"""
+    head = f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+    if body is not None:
+        payload = json.dumps(body).encode()
+        head += f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+        writer.write(head.encode() + payload)
+    else:
+        writer.write((head + "\r\n").encode())
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def poller(port, room, device_id, deadline, measure_from, samples, failures):
+    """saturate：收到回應後立刻送出下一個請求"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    calls = (
+        ("GET", f"/api/rooms/{room}/state", None),
+        ("POST", "/api/participants/heartbeat", {"room": room, "device_id": device_id}),
+        ("GET", f"/api/rooms/{room}/comments", None),
+        ("GET", f"/api/room_status?room={room}", None),
+        ("GET", f"/api/rooms/{room}/votes?device_id={device_id}", None),
+    )
+    i = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            if start >= deadline:
+                break
+            method, path, body = calls[i % len(calls)]
+            i += 1
+            status = await request(reader, writer, method, path, body)
+            if start >= measure_from:
+                samples.append(time.perf_counter() - start)
+                if status != 200:
+                    failures.append(status)
+    finally:
+        writer.close()
+
+
+async def paced_poller(port, room, device_id, deadline, measure_from, samples, failures, start, phase):
+    """paced：與前端 useRoom.js 相同，每 3 秒取得房間狀態、每 5 秒送出心跳"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    schedule = [
+        [start + phase * 3.0, 3.0, "GET", f"/api/rooms/{room}/state", None],
+        [start + phase * 5.0, 5.0, "POST", "/api/participants/heartbeat", {"room": room, "device_id": device_id}],
+    ]
+    try:
+        while True:
+            entry = min(schedule, key=lambda e: e[0])
+            due, interval, method, path, body = entry
+            if due >= deadline:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            entry[0] = due + interval
+            # 從預定送出時間起算，伺服器跟不上時排隊的時間也計入延遲
+            status = await request(reader, writer, method, path, body)
+            if due >= measure_from:
+                samples.append(time.perf_counter() - due)
+                if status != 200:
+                    failures.append(status)
+    finally:
+        writer.close()
+
+
+async def exporter(port, deadline):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            await request(reader, writer, "GET", "/bench/export")
+    finally:
+        writer.close()
+
+
+async def drive(load, port, codes, clients, exports, duration, warmup):
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+    samples, failures = [], []
+    tasks = [exporter(port, deadline) for _ in range(exports)]
+    for i in range(clients):
+        args = (port, codes[i % len(codes)], f"device_{i}", deadline, measure_from, samples, failures)
+        if load == "paced":
+            # 讓客戶端的輪詢時間平均錯開
+            tasks.append(paced_poller(*args, start=start, phase=i / clients))
+        else:
+            tasks.append(poller(*args))
+    await asyncio.gather(*tasks)
+    return samples, failures
+
+
+def wait_for_port(port, timeout=30):
+    end = time.time() + timeout
+    while time.time() < end:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError("伺服器未能啟動")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_case(load, mode, clients, exports, duration, warmup):
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    port = free_port()
+    server = ctx.Process(target=serve, args=(mode, port, clients, ready), daemon=True)
+    server.start()
+    try:
+        codes = ready.get(timeout=120)
+        wait_for_port(port)
+        samples, failures = asyncio.run(drive(load, port, codes, clients, exports, duration, warmup))
+    finally:
+        server.terminate()
+        server.join()
+    samples.sort()
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+    return (load, mode, exports, f"{len(samples) / duration:,.0f}", f"{pick(0.5):.1f}ms",
+            f"{pick(0.99):.1f}ms", len(failures))
+
+
+def run(clients=1000, duration=10.0, warmup=5.0, exports=(0, 40)):
+    from benchmarks.harness import print_table
+
+    rows = []
+    for load in ("saturate", "paced"):
+        for n_exports in exports:
+            for mode in ("threadpool", "async"):
+                rows.append(run_case(load, mode, clients, n_exports, duration, warmup))
+    print_table(f"輪詢端點 ({clients} 個客戶端，每種情境 {duration:g} 秒)",
+                ["load", "mode", "exports", "req/s", "p50", "p99", "errors"], rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--exports", type=int, nargs="+", default=[0, 40])
+    args = parser.parse_args()
+    run(args.clients, args.duration, args.warmup, tuple(args.exports))
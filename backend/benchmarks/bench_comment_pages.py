@@ -0,0 +1,81 @@
+"""
+留言游標分頁基準測試
+
+長討論串中，已有大部分留言的客戶端只需要最新的幾則。比較 GET /api/rooms/{room}/comments 的幾種讀法：
+- full：不帶參數，回傳整個主題的留言（留言在新增時即已排序，不再於讀取時排序）
+- full + sort：改版前的做法，讀取完整留言後再依 ts 排序
+- first page：limit=50，第一頁
+- tail：after_id 為倒數第 21 則留言，只取得最新的 20 則
+- since_ts：以倒數第 21 則留言的時間戳取得最新的 20 則
+量測處理時間與 JSON 回應大小，並確認逐頁讀完的結果與完整讀取相同。
+
+執行: python -m benchmarks.bench_comment_pages [--sizes 1000 5000] [--backends memory sqlite]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+from api import participants
+from benchmarks.harness import use_storage, reset_store, create_room, add_comments, quiet, time_call, print_table, fmt_us
+
+PAGE = 50
+TAIL = 20
+
+
+def read_all_pages(room):
+    """以 next_cursor 逐頁讀完整個主題"""
+    comments, cursor = [], None
+    while True:
+        page = participants._room_comments(room, cursor, None, PAGE)
+        comments += page["comments"]
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            return comments
+
+
+def measure(size):
+    reset_store()
+    room = create_room("Pages", ["主題一"])
+    with quiet():
+        ids = add_comments(room, size)
+    full = participants._room_comments(room)["comments"]
+    after_id, since_ts = ids[-TAIL - 1], full[-TAIL - 1]["ts"]
+    cases = [
+        ("full", lambda: participants._room_comments(room)),
+        ("full + sort", lambda: {"comments": sorted(participants._room_comments(room)["comments"], key=lambda c: c["ts"])}),
+        (f"first page ({PAGE})", lambda: participants._room_comments(room, None, None, PAGE)),
+        (f"tail after_id ({TAIL})", lambda: participants._room_comments(room, after_id, None, PAGE)),
+        (f"tail since_ts ({TAIL})", lambda: participants._room_comments(room, None, since_ts, PAGE)),
+    ]
+    rows = []
+    for name, fn in cases:
+        stats = time_call(fn, repeat=max(20, 20000 // size))
+        rows.append((name, size, fmt_us(stats["p50"]), f"{len(json.dumps(fn(), ensure_ascii=False)):,}B"))
+    return rows, read_all_pages(room) == full
+
+
+def run(sizes=(1000, 5000), backends=("memory", "sqlite")):
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            if backend == "sqlite":
+                use_storage("sqlite", path=os.path.join(tmp, "bench.db"))
+            else:
+                use_storage("memory")
+            rows, consistent = [], True
+            for size in sizes:
+                case_rows, ok = measure(size)
+                rows += case_rows
+                consistent = consistent and ok
+            use_storage("memory")
+        print_table(f"GET comments 讀法比較（{backend}）", ["讀法", "留言數", "p50", "回應大小"], rows)
+        print(f"逐頁讀完與完整讀取一致: {consistent}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+    run(tuple(args.sizes), tuple(args.backends))
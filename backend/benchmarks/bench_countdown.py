@@ -0,0 +1,106 @@
+"""
+伺服器端倒數計時基準測試
+
+比較每次推進倒數的兩種做法（房間都在倒數中、這一次沒有房間到期）：
+- scan：讀取所有倒數中的房間，逐一比對結束時間
+- wheel：api/countdown.py 的時間輪，只檢查經過的槽與資料有變動的房間
+另以背景維護排程實際推進時間輪，量測倒數結束到房間切換為休息中的延遲，並確認所有房間都已切換。
+
+執行: python -m benchmarks.bench_countdown [--sizes 100 1000 5000] [--backends memory sqlite]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from api import participants
+from api.countdown import TICK, CountdownTimers
+from api.maintenance import MaintenanceScheduler
+from api.storage import get_storage
+from benchmarks.harness import use_storage, reset_store, create_room, quiet, time_call, print_table, fmt_us
+
+EXPIRING = 50   # 量測延遲的房間數
+COUNTDOWN = 1   # 量測延遲的倒數秒數
+
+
+def start_countdowns(codes, seconds):
+    with quiet():
+        for i, code in enumerate(codes):
+            participants.set_room_state(code, "主題一", seconds(i), None)
+
+
+def scan(store, now):
+    return [code for code, (time_start, countdown) in store.running_countdowns().items() if time_start + countdown <= now]
+
+
+def measure_tick(size):
+    reset_store()
+    codes = [create_room(f"Room {i}", ["主題一"]) for i in range(size)]
+    start_countdowns(codes, lambda i: 600 + i % 600)
+    store = get_storage()
+    timers = CountdownTimers()
+    timers.tick()
+    scan_stats = time_call(lambda: scan(store, time.time()), repeat=200)
+    wheel_stats = time_call(timers.tick, repeat=200)
+    return size, fmt_us(scan_stats["p50"]), fmt_us(wheel_stats["p50"]), f"{scan_stats['p50'] / wheel_stats['p50']:,.0f}x"
+
+
+async def drive(timers, codes):
+    """以背景維護排程推進時間輪，直到所有房間都切換為休息中"""
+    scheduler = MaintenanceScheduler()
+    scheduler.add_job("countdown", TICK, timers.tick)
+    await scheduler.start()
+    store = get_storage()
+    try:
+        deadline = time.time() + COUNTDOWN + 5
+        while time.time() < deadline and any(store.get_room(code).status != "Stop" for code in codes):
+            await asyncio.sleep(0.05)
+    finally:
+        await scheduler.stop()
+    return scheduler.metrics()["countdown"]
+
+
+def measure_latency():
+    reset_store()
+    codes = [create_room(f"Room {i}", ["主題一"]) for i in range(EXPIRING)]
+    timers = CountdownTimers()
+    latencies = []
+    timers.add_expiry_listener(lambda code, payload: latencies.append(payload["expired_at"] - payload["deadline"]))
+    timers.tick()
+    start_countdowns(codes, lambda i: COUNTDOWN)
+    metrics = asyncio.run(drive(timers, codes))
+    all_stopped = all(get_storage().get_room(code).status == "Stop" for code in codes)
+    return (
+        EXPIRING, f"{statistics.median(latencies) * 1000:,.0f}ms" if latencies else "-",
+        f"{max(latencies) * 1000:,.0f}ms" if latencies else "-", metrics["runs"], f"{metrics['avg_ms']:,.3f}ms",
+        all_stopped and len(latencies) == EXPIRING,
+    )
+
+
+def run(sizes=(100, 1000, 5000), backends=("memory", "sqlite")):
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            if backend == "sqlite":
+                use_storage("sqlite", path=os.path.join(tmp, "bench.db"))
+            else:
+                use_storage("memory")
+            rows = [measure_tick(size) for size in sizes]
+            latency = measure_latency()
+            use_storage("memory")
+        print_table(f"每次推進倒數（{backend}，沒有房間到期）", ["倒數中的房間", "scan p50", "wheel p50", "加速"], rows)
+        print_table(
+            f"倒數結束到切換狀態（{backend}，每 {TICK}s 推進一次）",
+            ["房間數", "延遲 p50", "延遲 max", "推進次數", "每次平均", "全部切換"],
+            [latency],
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+    run(tuple(args.sizes), tuple(args.backends))
@@ -0,0 +1,95 @@
+"""
+GET /api/rooms/{room}/state 增量同步基準測試
+
+模擬一位參與者每次輪詢之間房間內有 1 則新留言與 5 次投票，比較：
+- full：不帶 since，每次回傳完整留言列表
+- delta：帶上前一次回應的 version，只回傳之後的變更
+量測每次輪詢的處理時間與 JSON 回應大小，並確認套用增量後的留言與完整回應一致。
+
+執行: python -m benchmarks.bench_delta_state [--sizes 100 1000 5000] [--polls 200]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from api import participants
+from benchmarks.harness import use_storage, reset_store, create_room, add_comments, quiet, print_table, fmt_us
+
+VOTERS = 50
+
+
+def apply_state(comments, state):
+    """與前端 useRoom.js 相同的合併方式，回傳 {留言ID: 留言}"""
+    if not state["delta"]:
+        return {c["id"]: c for c in state["comments"]}
+    for comment in state["comments"]:
+        comments[comment["id"]] = comment
+    for comment_id, counts in state["vote_counts"].items():
+        comments[comment_id] = dict(comments[comment_id], **counts)
+    for comment_id in state["deleted"]:
+        comments.pop(comment_id, None)
+    return comments
+
+
+def measure(size, polls):
+    reset_store()
+    room = create_room("Delta", ["主題一"])
+    participants.update_current_topic(room, participants.TopicUpdateRequest(topic="主題一"))
+    comment_ids = add_comments(room, size)
+    voter = iter(range(10**9))
+
+    def mutate():
+        comment_ids.extend(add_comments(room, 1))
+        for _ in range(5):
+            device_id = f"device_{next(voter) % VOTERS}"
+            comment_id = comment_ids[next(voter) % len(comment_ids)]
+            participants.get_storage().cast_vote(room, comment_id, device_id, "good")
+
+    results = {}
+    for mode in ("full", "delta"):
+        state = participants._room_state(room)
+        comments = apply_state({}, state)
+        elapsed, sizes, mismatches = 0.0, 0, 0
+        for _ in range(polls):
+            mutate()
+            since = state["version"] if mode == "delta" else None
+            start = time.perf_counter()
+            state = participants._room_state(room, since)
+            body = json.dumps(state, ensure_ascii=False)
+            elapsed += time.perf_counter() - start
+            sizes += len(body.encode())
+            comments = apply_state(comments, state)
+            if comments != {c["id"]: c for c in participants._room_state(room)["comments"]}:
+                mismatches += 1
+        results[mode] = (elapsed / polls * 1e6, sizes / polls, mismatches)
+    return results
+
+
+def run(sizes=(100, 1000, 5000), polls=200):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("memory", "sqlite"):
+            if backend == "sqlite":
+                use_storage("sqlite", path=os.path.join(tmp, "bench.db"))
+            else:
+                use_storage("memory")
+            for size in sizes:
+                with quiet():
+                    results = measure(size, polls)
+                (full_us, full_bytes, _), (delta_us, delta_bytes, mismatches) = results["full"], results["delta"]
+                rows.append((backend, f"{size:,}", fmt_us(full_us), fmt_us(delta_us),
+                             f"{full_bytes:,.0f}", f"{delta_bytes:,.0f}", mismatches))
+        use_storage("memory")  # 關閉 SQLite 後端
+    print_table(f"每次輪詢（其間 1 則新留言 + 5 次投票，{polls} 次平均，含 JSON 序列化）",
+                ["backend", "comments", "full", "delta", "full bytes", "delta bytes", "mismatches"], rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--polls", type=int, default=200)
+    args = parser.parse_args()
+    run(tuple(args.sizes), args.polls)
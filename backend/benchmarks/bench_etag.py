@@ -0,0 +1,119 @@
+"""
+輪詢端點的 ETag / If-None-Match 基準測試
+
+房間沒有變動（討論暫停期間）時，比較每 1,000 次輪詢：
+- 200：不帶 If-None-Match，每次建立並序列化完整回應
+- 304：帶上一次回應的 ETag，伺服器只比對房間版本
+的回應位元組數（標頭 + 本文）與伺服器 CPU 時間。
+
+直接以 ASGI 介面呼叫 FastAPI 應用（不經過網路與 HTTP 客戶端），CPU 時間只包含伺服器端的處理。
+
+執行: python -m benchmarks.bench_etag [--comments 200] [--participants 100] [--polls 1000]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from api import participants
+from benchmarks.bench_async_polling import build_app
+from benchmarks.harness import use_storage, reset_store, create_room, add_comments, quiet, print_table
+
+
+async def call(app, path, headers=(), method="GET", body=b""):
+    """以 ASGI 送出請求，回傳 (狀態碼, 回應標頭, 回應位元組數)"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), *headers], "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    header_bytes = sum(len(k) + len(v) + 4 for k, v in start["headers"]) + len("HTTP/1.1 200 OK\r\n\r\n")
+    body_bytes = sum(len(m.get("body", b"")) for m in sent[1:])
+    return start["status"], dict(start["headers"]), header_bytes + body_bytes
+
+
+def seed(comments, people):
+    reset_store()
+    room = create_room("ETag", ["主題一"])
+    participants.update_current_topic(room, participants.TopicUpdateRequest(topic="主題一"))
+    ids = add_comments(room, comments)
+    for i in range(people):
+        participants.join_participant(participants.JoinRequest(room=room, nickname=f"user{i}", device_id=f"device_{i}"))
+        participants.vote_comment(room, ids[i % len(ids)], participants.VoteRequest(device_id=f"device_{i}", vote_type="good"))
+    participants.set_room_status(room, "Stop")
+    return room
+
+
+async def measure(app, path, polls):
+    """回傳 {"200"|"304": (CPU 毫秒, 位元組數)}，各為 polls 次輪詢的總和"""
+    status, headers, _ = await call(app, path)
+    tag = headers.get(b"etag")
+    results = {}
+    for mode, extra in (("200", ()), ("304", ((b"if-none-match", tag),))):
+        total_bytes = 0
+        start = time.process_time()
+        for _ in range(polls):
+            status, _, size = await call(app, path, extra)
+            if status != int(mode):
+                raise RuntimeError(f"{path} 預期 {mode}，收到 {status}")
+            total_bytes += size
+        results[mode] = ((time.process_time() - start) * 1000, total_bytes)
+    return results
+
+
+def run(comments=200, people=100, polls=1000):
+    app = build_app("async")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("memory", "sqlite"):
+            if backend == "sqlite":
+                use_storage("sqlite", path=os.path.join(tmp, "bench.db"))
+            else:
+                use_storage("memory")
+            with quiet():
+                room = seed(comments, people)
+            version = participants._room_state(room)["version"]
+            paths = [
+                ("GET state", f"/api/rooms/{room}/state"),
+                ("GET state?since", f"/api/rooms/{room}/state?since={version}"),
+                ("GET comments", f"/api/rooms/{room}/comments"),
+                ("GET participants", f"/api/participants?room={room}"),
+                ("GET room_status", f"/api/room_status?room={room}"),
+            ]
+            for name, path in paths:
+                # 參與者 10 秒沒有心跳就會離線，每個端點量測前都先更新一次
+                now = time.time()
+                for i in range(people):
+                    participants.get_storage().touch_participant(room, f"device_{i}", now)
+                result = asyncio.run(measure(app, path, polls))
+                (cpu_full, bytes_full), (cpu_304, bytes_304) = result["200"], result["304"]
+                rows.append((backend, name, f"{bytes_full:,}", f"{bytes_304:,}", f"{bytes_full - bytes_304:,}",
+                             f"{cpu_full:,.0f}ms", f"{cpu_304:,.0f}ms", f"{cpu_full - cpu_304:,.0f}ms"))
+        use_storage("memory")  # 關閉 SQLite 後端
+    print_table(
+        f"每 {polls:,} 次輪詢（房間未變動，{comments} 則留言，{people} 位在線參與者）",
+        ["backend", "endpoint", "200 bytes", "304 bytes", "bytes saved", "200 CPU", "304 CPU", "CPU saved"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=200)
+    parser.add_argument("--participants", type=int, default=100)
+    parser.add_argument("--polls", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.comments, args.participants, args.polls)
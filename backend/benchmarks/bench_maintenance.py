@@ -0,0 +1,102 @@
+"""
+背景維護工作基準測試
+
+建立多個房間，每間房間有一半參與者已逾時、一半房間的討論倒數剛結束、部分投票指向不存在的留言，
+逐一執行 api/maintenance 的維護工作各一次，輸出每個工作自己記錄的耗時與結果，並確認：
+- presence：逾時參與者都被移除，房間的在線人數正確
+- countdown：倒數結束的房間都切換為休息中，其餘房間維持討論中
+- orphans：指向不存在留言的投票都被清除
+
+執行: python -m benchmarks.bench_maintenance [--rooms 100 1000] [--backends memory sqlite]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from api import maintenance
+from api.countdown import CountdownTimers
+from api.response_cache import response_cache
+from api.storage import get_storage
+from benchmarks.harness import use_storage, reset_store, create_room, add_comments, quiet, print_table
+
+PARTICIPANTS = 20   # 每間房間的參與者數，一半在清理時已逾時
+SWEEP_AFTER = 8     # 建立資料後幾秒執行 presence：此時 now - 25 加入的參與者已超過 RETENTION_WINDOW，now 加入的仍在線
+ORPHANS = 5         # 每間房間指向不存在留言的投票數
+
+
+def seed(n_rooms, now):
+    store = get_storage()
+    codes = []
+    for r in range(n_rooms):
+        code = create_room(f"Room {r}", ["主題一"])
+        # 依時間先後加入；加入時兩者都還在保留期間內，不會在加入其他參與者時就被移除
+        for p in range(PARTICIPANTS):
+            store.join_participant(code, f"device_{p}", f"p{p}", now - 25 if p < PARTICIPANTS // 2 else now)
+        with quiet():
+            comment_id = add_comments(code, 1)[0]
+        store.cast_vote(code, comment_id, "device_1", "good")
+        for i in range(ORPHANS):
+            store.cast_vote(code, f"{code}-deleted-{i}", "device_1", "good")
+        # 一半房間的倒數在 now 之前一秒結束
+        countdown = 5 if r % 2 == 0 else 600
+        store.update_room(code, status="Discussion", countdown=countdown, time_start=now - 6)
+        codes.append(code)
+    return codes
+
+
+def measure(n_rooms):
+    reset_store()
+    response_cache.clear()
+    now = time.time()
+    codes = seed(n_rooms, now)
+    store = get_storage()
+    timers = CountdownTimers()
+    timers.attach(store, now - 6)
+    jobs = [
+        maintenance.MaintenanceJob("presence", 0, lambda: store.sweep_participants(now + SWEEP_AFTER)),
+        maintenance.MaintenanceJob("countdown", 0, lambda: timers.tick(now)),
+        maintenance.MaintenanceJob("orphans", 0, maintenance.collect_orphans),
+        maintenance.MaintenanceJob("response_cache", 0, maintenance.evict_response_cache),
+    ]
+    rows = []
+    for job in jobs:
+        asyncio.run(job.run_once())
+        metrics = job.metrics()
+        rows.append((n_rooms, job.name, f"{metrics['last_ms']:,.2f}ms", metrics["last_result"], metrics["failures"]))
+
+    online_ok = all(store.get_room(code).participants == PARTICIPANTS // 2 for code in codes)
+    members_ok = all(len(store.list_participants(code)) == PARTICIPANTS // 2 for code in codes)
+    countdown_ok = all(
+        store.get_room(code).status == ("Stop" if i % 2 == 0 else "Discussion") for i, code in enumerate(codes)
+    )
+    orphans_ok = all(len(store.get_device_votes(code, "device_1")) == 1 for code in codes)
+    return rows, online_ok and members_ok, countdown_ok, orphans_ok
+
+
+def run(room_counts=(100, 1000), backends=("memory", "sqlite")):
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            if backend == "sqlite":
+                use_storage("sqlite", path=os.path.join(tmp, "bench.db"))
+            else:
+                use_storage("memory")
+            results = [measure(n) for n in room_counts]
+            use_storage("memory")
+        print_table(
+            f"維護工作單次執行（{backend}）",
+            ["房間數", "工作", "耗時", "結果", "失敗"],
+            [row for rows, *_ in results for row in rows],
+        )
+        for n, (_, presence_ok, countdown_ok, orphans_ok) in zip(room_counts, results):
+            print(f"{n} 間房間 在線名單正確: {presence_ok}  倒數切換正確: {countdown_ok}  孤立投票已清除: {orphans_ok}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+    run(tuple(args.rooms), tuple(args.backends))
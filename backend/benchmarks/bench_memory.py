@@ -0,0 +1,68 @@
+"""
+留言記憶體用量基準測試（50,000 則留言）
+
+比較舊版 dict 留言與 slots 記錄型別 Comment 每則留言的記憶體成本。
+「容器」欄位只計算留言物件本身；「含字串」欄位另外計入 id、暱稱與內容字串。
+
+執行: python -m benchmarks.bench_memory
+"""
+
+import time
+import tracemalloc
+import uuid
+
+from api.records import Comment
+from benchmarks.harness import print_table
+
+COMMENTS = 50_000
+
+
+def make_fields(i):
+    return str(uuid.uuid4()), f"user{i % 500}", f"這是第 {i} 則留言，內容長度與一般意見相近。", time.time()
+
+
+def legacy_comment(fields):
+    comment_id, nickname, content, ts = fields
+    return {
+        "id": comment_id,
+        "nickname": nickname,
+        "content": content,
+        "ts": ts,
+        "isAISummary": False,
+        "device_id": f"device_{nickname}",
+    }
+
+
+def record_comment(fields):
+    comment_id, nickname, content, ts = fields
+    return Comment(comment_id, nickname, content, ts, False, f"device_{nickname}")
+
+
+def measure(factory, include_strings):
+    tracemalloc.start()
+    if include_strings:
+        base = tracemalloc.get_traced_memory()[0]
+        items = [factory(make_fields(i)) for i in range(COMMENTS)]
+    else:
+        fields = [make_fields(i) for i in range(COMMENTS)]
+        base = tracemalloc.get_traced_memory()[0]
+        items = [factory(f) for f in fields]
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del items
+    return used / COMMENTS
+
+
+def run():
+    rows = []
+    for label, factory in (("dict", legacy_comment), ("Comment (slots)", record_comment)):
+        rows.append((
+            label,
+            f"{measure(factory, include_strings=False):,.0f} B",
+            f"{measure(factory, include_strings=True):,.0f} B",
+        ))
+    print_table(f"每則留言記憶體用量 ({COMMENTS:,} 則)", ["格式", "容器", "含字串"], rows)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,65 @@
+"""
+參與者改名基準測試
+
+留言只保存發表時的暱稱，序列化時才以作者目前的暱稱顯示；改名只更新一筆作者暱稱並記錄一筆變更，
+不再逐則改寫該作者的留言。量測作者留言數不同時 PUT /api/rooms/{room}/participants/{device_id}/nickname 的延遲，
+以及 GET /api/rooms/{room}/comments 的延遲（含解析暱稱），並確認改名後的回應與增量同步都顯示新暱稱。
+
+執行: python -m benchmarks.bench_nickname [--sizes 100 1000 10000] [--backends memory sqlite]
+"""
+
+import argparse
+import itertools
+import os
+import tempfile
+
+from api import participants
+from benchmarks.harness import use_storage, reset_store, create_room, add_comments, quiet, time_call, print_table, fmt_us
+
+DEVICE = "device_author"
+
+
+def measure(size):
+    reset_store()
+    room = create_room("Nickname", ["主題一"])
+    with quiet():
+        participants.join_participant(participants.JoinRequest(room=room, nickname="author", device_id=DEVICE))
+        add_comments(room, size, nickname="author")
+    names = itertools.count()
+
+    def rename():
+        participants.update_participant_nickname(room, DEVICE, participants.UpdateNicknameRequest(
+            new_nickname=f"n{next(names)}"))
+
+    since = participants._room_state(room)["version"]
+    rename_stats = time_call(rename, repeat=200)
+    read_stats = time_call(lambda: participants._room_comments(room), repeat=max(20, 20000 // size))
+    current = f"n{next(names) - 1}"
+    delta = participants._room_state(room, since)
+    ok = (all(c["nickname"] == current for c in participants._room_comments(room)["comments"])
+          and len(delta["comments"]) == size and all(c["nickname"] == current for c in delta["comments"]))
+    return size, fmt_us(rename_stats["p50"]), fmt_us(rename_stats["p99"]), fmt_us(read_stats["p50"]), ok
+
+
+def run(sizes=(100, 1000, 10000), backends=("memory", "sqlite")):
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            if backend == "sqlite":
+                use_storage("sqlite", path=os.path.join(tmp, "bench.db"))
+            else:
+                use_storage("memory")
+            rows = [measure(size) for size in sizes]
+            use_storage("memory")
+        print_table(
+            f"改名延遲（{backend}）",
+            ["作者留言數", "改名 p50", "改名 p99", "GET comments p50", "暱稱正確"],
+            rows,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+    run(tuple(args.sizes), tuple(args.backends))
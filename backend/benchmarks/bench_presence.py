@@ -0,0 +1,81 @@
+"""
+參與者在線狀態基準測試
+
+在不同房間人數下，量測心跳、加入與取得在線名單的延遲，
+並與舊版「線性搜尋 participants_list + sum() 重算在線人數」比較；
+另外量測 500 人房間中以暱稱定位作者的新增留言延遲。
+
+執行: python -m benchmarks.bench_presence
+"""
+
+import time
+
+from api import data_store, participants
+from benchmarks.harness import reset_store, create_room, time_call, print_table, fmt_us
+
+ROOM_SIZES = (30, 300, 3000)
+COMMENT_ROOM_SIZE = 500
+
+
+def legacy_heartbeat(participants_list, device_id, now):
+    for p in participants_list:
+        if p["device_id"] == device_id:
+            p["last_seen"] = now
+            break
+    return sum(1 for p in participants_list if (now - p["last_seen"]) <= 10)
+
+
+def run():
+    rows = []
+    for size in ROOM_SIZES:
+        reset_store()
+        room = create_room("Presence")
+        device_ids = [f"device_{i}" for i in range(size)]
+        for device_id in device_ids:
+            participants.join_participant(participants.JoinRequest(room=room, nickname=device_id, device_id=device_id))
+        legacy_list = [{"device_id": d, "nickname": d, "last_seen": time.time()} for d in device_ids]
+
+        cursor = iter(range(10 ** 9))
+
+        def heartbeat():
+            device_id = device_ids[next(cursor) % size]
+            participants._touch_participant(room, device_id)
+
+        def legacy():
+            legacy_heartbeat(legacy_list, device_ids[next(cursor) % size], time.time())
+
+        rows.append((
+            size,
+            fmt_us(time_call(heartbeat, repeat=3000)["p50"]),
+            fmt_us(time_call(legacy, repeat=3000)["p50"]),
+            fmt_us(time_call(lambda: participants._online_participants(room), repeat=3000)["p50"]),
+        ))
+    print_table("在線狀態操作延遲 (p50)", ["participants", "heartbeat", "舊版 heartbeat", "GET participants"], rows)
+
+
+def run_add_comment():
+    reset_store()
+    room = create_room("Comments")
+    device_ids = [f"device_{i}" for i in range(COMMENT_ROOM_SIZE)]
+    for device_id in device_ids:
+        participants.join_participant(participants.JoinRequest(room=room, nickname=f"nick_{device_id}", device_id=device_id))
+    legacy_list = [{"device_id": d, "nickname": f"nick_{d}", "last_seen": time.time()} for d in device_ids]
+    author = f"nick_{device_ids[-1]}"  # 最後加入者，為線性搜尋的最壞情況
+    req = participants.CommentRequest(nickname=author, content="hello")
+
+    def legacy_lookup():
+        for p in legacy_list:
+            if p["nickname"] == author:
+                return p["device_id"]
+
+    rows = [
+        ("POST comment", fmt_us(time_call(lambda: participants.add_comment(room, req), repeat=3000)["p50"])),
+        ("暱稱 → device_id (索引)", fmt_us(time_call(lambda: data_store.get_participant_registry(room).find_device(author), repeat=3000)["p50"])),
+        ("暱稱 → device_id (舊版線性搜尋)", fmt_us(time_call(legacy_lookup, repeat=3000)["p50"])),
+    ]
+    print_table(f"新增留言 ({COMMENT_ROOM_SIZE} 人房間, p50)", ["操作", "延遲"], rows)
+
+
+if __name__ == "__main__":
+    run()
+    run_add_comment()
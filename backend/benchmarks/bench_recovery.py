@@ -0,0 +1,90 @@
+"""
+日誌後端當機恢復時間（約 100,000 筆事件）
+
+透過端點產生建立房間、加入、留言與投票事件，接著比較：
+1. 沒有快照時重播整份日誌
+2. 寫入快照後只載入快照
+並確認兩種方式恢復的資料與原始狀態一致。
+
+執行: python -m benchmarks.bench_recovery
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from api import participants
+from api.storage import get_storage, JournalStorage
+from benchmarks.harness import use_storage, create_room, add_comments, print_table
+
+ROOMS = 50
+DEVICES = 40
+COMMENTS = 500
+VOTERS_PER_COMMENT = 3
+
+
+def generate():
+    """每間房間約 2,000 筆事件，總計約 100,000 筆"""
+    for r in range(ROOMS):
+        room = create_room(f"Room {r}", ["主題一"])
+        for d in range(DEVICES):
+            participants.join_participant(participants.JoinRequest(room=room, nickname=f"user{d}", device_id=f"device_{d}"))
+        comment_ids = add_comments(room, COMMENTS, nickname="user0")
+        for j, comment_id in enumerate(comment_ids):
+            for k in range(VOTERS_PER_COMMENT):
+                device_id = f"device_{(j * 7 + k) % DEVICES}"
+                vote_type = "good" if (j + k) % 3 else "bad"
+                participants.vote_comment(room, comment_id, participants.VoteRequest(device_id=device_id, vote_type=vote_type))
+
+
+def normalize(dump):
+    """投票者集合的輸出順序不固定，比較前先排序"""
+    dump["votes"] = {cid: {t: sorted(v) for t, v in entry.items()} for cid, entry in dump["votes"].items()}
+    return dump
+
+
+def file_mb(path):
+    return f"{os.path.getsize(path) / 1e6:,.1f} MB" if os.path.exists(path) else "-"
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        live_dir = os.path.join(tmp, "live")
+        copy_dir = os.path.join(tmp, "copy")
+
+        use_storage("journal", directory=live_dir, snapshot_interval=10**9, snapshot_every=10**9)
+        start = time.perf_counter()
+        generate()
+        generate_seconds = time.perf_counter() - start
+        get_storage().flush()
+        expected = normalize(get_storage().dump())
+        shutil.copytree(live_dir, copy_dir)
+
+        replay_store = JournalStorage(copy_dir)
+        replay = replay_store.load()
+        replay_ok = normalize(replay_store.dump()) == expected
+
+        start = time.perf_counter()
+        replay_store.snapshot()
+        snapshot_seconds = time.perf_counter() - start
+        replay_store.close()
+
+        snapshot_store = JournalStorage(copy_dir)
+        restored = snapshot_store.load()
+        snapshot_ok = normalize(snapshot_store.dump()) == expected
+        snapshot_store.close()
+
+        rows = [
+            ("產生事件 (經由端點)", f"{replay['replayed']:,}", f"{generate_seconds:.2f}s", file_mb(os.path.join(live_dir, "journal.log")), "-"),
+            ("重播完整日誌", f"{replay['replayed']:,}", f"{replay['seconds']:.2f}s", file_mb(os.path.join(live_dir, "journal.log")), replay_ok),
+            ("寫入快照", f"{replay['replayed']:,}", f"{snapshot_seconds:.2f}s", file_mb(os.path.join(copy_dir, "snapshot.json")), "-"),
+            ("載入快照 (無日誌)", f"{restored['replayed']:,}", f"{restored['seconds']:.2f}s", file_mb(os.path.join(copy_dir, "snapshot.json")), snapshot_ok),
+        ]
+        print_table("日誌後端恢復時間", ["步驟", "重播事件", "耗時", "檔案大小", "資料一致"], rows)
+
+        use_storage("memory")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,93 @@
+"""
+輪詢端點回應快取基準測試
+
+比較每次輪詢的伺服器 CPU 時間：
+- dict：處理函數回傳 dict，由 FastAPI 以 jsonable_encoder 與 json 序列化（快取前的做法）
+- cached：目前的端點，同一 ETag 只產生並以 orjson 序列化一次，之後直接回傳快取的位元組
+兩種情境：
+- steady：房間沒有變動，所有參與者輪詢同一版本（絕大多數的輪詢）
+- churn：每次輪詢前都有 1 次投票，快取每次都失效，量測未命中時的成本
+
+直接以 ASGI 介面呼叫 FastAPI 應用（不經過網路與 HTTP 客戶端），CPU 時間只包含伺服器端的處理。
+
+執行: python -m benchmarks.bench_response_cache [--sizes 100 1000] [--polls 500]
+"""
+
+import argparse
+import asyncio
+import time
+
+from api import participants
+from benchmarks.bench_async_polling import build_app
+from benchmarks.bench_etag import call, seed
+from benchmarks.harness import use_storage, quiet, print_table, fmt_us
+
+PEOPLE = 100
+
+
+def build_dict_app():
+    """與目前端點共用讀取邏輯，但回傳 dict 由 FastAPI 序列化"""
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.get("/api/rooms/{room}/state")
+    async def get_room_state(room: str):
+        return await participants.run_room_read(room, participants._room_state)
+
+    @app.get("/api/rooms/{room}/comments")
+    async def get_room_comments(room: str):
+        return await participants.run_room_read(room, participants._room_comments)
+
+    @app.get("/api/participants")
+    async def get_participants(room: str):
+        return await participants.run_room_read(room, participants._online_participants)
+
+    return app
+
+
+async def measure(app, path, polls, churn):
+    elapsed = 0.0
+    for i in range(polls):
+        if churn:
+            # 每輪換一種投票類型，每次投票都會改變票數與房間版本
+            participants.get_storage().cast_vote(churn[0], churn[1], f"device_{i % PEOPLE}",
+                                                 "good" if (i // PEOPLE) % 2 else "bad")
+        start = time.process_time()
+        status, _, _ = await call(app, path)
+        elapsed += time.process_time() - start
+        if status != 200:
+            raise RuntimeError(f"{path} 回傳 {status}")
+    return elapsed / polls * 1e6
+
+
+def run(sizes=(100, 1000), polls=500):
+    apps = {"dict": build_dict_app(), "cached": build_app("async")}
+    rows = []
+    use_storage("memory")
+    for size in sizes:
+        with quiet():
+            room = seed(size, PEOPLE)
+        comment_id = participants._room_comments(room)["comments"][0]["id"]
+        for scenario in ("steady", "churn"):
+            churn = (room, comment_id) if scenario == "churn" else None
+            for name, path in (("state", f"/api/rooms/{room}/state"),
+                               ("comments", f"/api/rooms/{room}/comments"),
+                               ("participants", f"/api/participants?room={room}")):
+                # 參與者 10 秒沒有心跳就會離線，每次量測前都先更新一次
+                now = time.time()
+                for i in range(PEOPLE):
+                    participants.get_storage().touch_participant(room, f"device_{i}", now)
+                results = {mode: asyncio.run(measure(app, path, polls, churn)) for mode, app in apps.items()}
+                rows.append((f"{size:,}", scenario, name, fmt_us(results["dict"]), fmt_us(results["cached"]),
+                             f"{results['dict'] / results['cached']:.1f}x"))
+    print_table(f"每次輪詢的伺服器 CPU 時間（{PEOPLE} 位在線參與者，{polls} 次平均）",
+                ["comments", "scenario", "endpoint", "dict", "cached", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--polls", type=int, default=500)
+    args = parser.parse_args()
+    run(tuple(args.sizes), args.polls)
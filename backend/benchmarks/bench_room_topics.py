@@ -0,0 +1,52 @@
+"""
+房間 → 主題索引基準測試
+
+隨著伺服器上的房間數量增加，量測單一房間的主題查詢、投票與投票紀錄查詢延遲。
+使用索引後延遲應維持平坦；「全表掃描」欄位為舊版以 room_id 過濾整個 topics 字典的成本。
+
+執行: python -m benchmarks.bench_room_topics
+"""
+
+from api import data_store
+from api import participants
+from benchmarks.harness import (
+    reset_store, seed_rooms, add_comments, new_device_id, time_call, print_table, fmt_us,
+)
+
+ROOM_COUNTS = (10, 100, 1000, 3000)
+
+
+def legacy_scan(room):
+    return [t for t in data_store.topics.values() if t.room_id == room]
+
+
+def run():
+    rows = []
+    for n_rooms in ROOM_COUNTS:
+        reset_store()
+        codes = seed_rooms(n_rooms, topics_per_room=5, comments_per_topic=4)
+        room = codes[len(codes) // 2]
+        comment_ids = add_comments(room, 50)
+        device_id = new_device_id()
+
+        def vote():
+            req = participants.VoteRequest(device_id=new_device_id(), vote_type="good")
+            participants.vote_comment(room, comment_ids[0], req)
+
+        rows.append((
+            n_rooms,
+            len(data_store.topics),
+            fmt_us(time_call(lambda: participants.get_room_topics(room))["p50"]),
+            fmt_us(time_call(vote)["p50"]),
+            fmt_us(time_call(lambda: participants._device_votes(room, device_id))["p50"]),
+            fmt_us(time_call(lambda: legacy_scan(room), repeat=200)["p50"]),
+        ))
+    print_table(
+        "單一房間操作延遲 (p50) vs. 伺服器房間數",
+        ["rooms", "topics", "room_topics", "vote", "user_votes", "全表掃描"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    run()
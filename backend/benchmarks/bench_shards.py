@@ -0,0 +1,162 @@
+"""
+房間分片基準測試
+
+1. 一致性雜湊：10,000 個房間代碼在各分片的分布，以及新增一個分片時需要換分片的比例
+2. 路由正確性：經由路由器建立房間、加入、留言、投票，確認每間房間只存在於雜湊對應的分片，
+   且 GET /api/rooms 合併了所有分片的房間
+3. 吞吐量：1,000 個客戶端經由路由器輪詢（與 bench_async_polling 的 saturate 負載相同），
+   比較直接連線單一後端、1 個分片與 --shards 個分片
+
+執行: python -m benchmarks.bench_shards [--shards 4] [--clients 1000] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import string
+import subprocess
+import tempfile
+
+import httpx
+
+from benchmarks.bench_async_polling import drive, wait_for_port
+from benchmarks.harness import print_table
+from shard_router import create_app, shard_names, spawn_shard
+from utility.sharding import HashRing
+
+ROOMS = 20
+COMMENTS_PER_ROOM = 30
+
+
+def free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    try:
+        for s in sockets:
+            s.bind(("127.0.0.1", 0))
+        return [s.getsockname()[1] for s in sockets]
+    finally:
+        for s in sockets:
+            s.close()
+
+
+def run_ring(shards):
+    codes = ["".join(random.choices(string.ascii_uppercase + string.digits, k=6)) for _ in range(10000)]
+    ring = HashRing(shard_names(shards))
+    owners = [ring.node_for(code) for code in codes]
+    counts = {name: owners.count(name) for name in ring.nodes}
+    grown = HashRing(shard_names(shards + 1))
+    moved = sum(1 for code, owner in zip(codes, owners) if grown.node_for(code) != owner)
+    rows = [(name, count, f"{count / len(codes):.1%}") for name, count in counts.items()]
+    print_table(f"10,000 個房間代碼在 {shards} 個分片的分布", ["shard", "rooms", "share"], rows)
+    print(f"新增第 {shards + 1} 個分片時換分片的房間: {moved / len(codes):.1%}（理想值 {1 / (shards + 1):.1%}）")
+
+
+def serve_router(shards, port):
+    import uvicorn
+    uvicorn.run(create_app(shards), host="127.0.0.1", port=port, log_level="error", backlog=4096)
+
+
+def start_cluster(count):
+    """啟動 count 個分片與路由器，回傳 (分片程序列表, {分片名稱: 埠號}, 路由器埠號)"""
+    names = shard_names(count)
+    ports = free_ports(count + 1)
+    processes, shards = [], {}
+    for name, port in zip(names, ports):
+        process, shards[name] = spawn_shard(name, names, port, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(process)
+    router = multiprocessing.get_context("spawn").Process(target=serve_router, args=(shards, ports[-1]), daemon=True)
+    router.start()
+    processes.append(router)
+    for port in ports:
+        wait_for_port(port, timeout=60)
+    return processes, dict(zip(names, ports)), ports[-1]
+
+
+def stop_cluster(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        if isinstance(process, subprocess.Popen):
+            process.wait()
+        else:
+            process.join()
+
+
+def seed(port, clients):
+    """經由路由器建立房間、留言與參與者，回傳房間代碼"""
+    codes = []
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+        for r in range(ROOMS):
+            code = client.post("/api/create_room", json={"title": f"Room {r}", "topics": ["主題一"], "topic_count": 1}).json()["code"]
+            client.put(f"/api/rooms/{code}/topic", json={"topic": "主題一"})
+            codes.append(code)
+        for i in range(clients):
+            client.post("/api/participants/join", json={"room": codes[i % ROOMS], "nickname": f"user{i}", "device_id": f"device_{i}"})
+        for code in codes:
+            for c in range(COMMENTS_PER_ROOM):
+                comment_id = client.post(f"/api/rooms/{code}/comments", json={"nickname": "user0", "content": f"comment {c}"}).json()["comment_id"]
+                client.post(f"/api/rooms/{code}/comments/{comment_id}/vote", json={"device_id": "device_0", "vote_type": "good"})
+    return codes
+
+
+def verify(port, shard_ports, codes):
+    """確認每間房間只存在於雜湊對應的分片，回傳 (放錯分片的房間數, 各分片房間數, 路由器列出的房間數)"""
+    ring = HashRing(shard_ports)
+    misplaced = 0
+    per_shard = dict.fromkeys(shard_ports, 0)
+    with httpx.Client(timeout=30) as client:
+        for code in codes:
+            owner = ring.node_for(code)
+            per_shard[owner] += 1
+            for name, shard_port in shard_ports.items():
+                status = client.get(f"http://127.0.0.1:{shard_port}/api/room_status", params={"room": code}).json()["status"]
+                if (status != "NotFound") != (name == owner):
+                    misplaced += 1
+            state = client.get(f"http://127.0.0.1:{port}/api/rooms/{code}/state").json()
+            if len(state["comments"]) != COMMENTS_PER_ROOM or state["comments"][0]["vote_good"] != 1:
+                misplaced += 1
+        listed = len(client.get(f"http://127.0.0.1:{port}/api/rooms").json()["rooms"])
+    return misplaced, per_shard, listed
+
+
+def measure(port, codes, clients, duration, warmup):
+    samples, failures = asyncio.run(drive("saturate", port, codes, clients, 0, duration, warmup))
+    samples.sort()
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+    return f"{len(samples) / duration:,.0f}", f"{pick(0.5):.1f}ms", f"{pick(0.99):.1f}ms", len(failures)
+
+
+def run(shards=4, clients=1000, duration=10.0, warmup=3.0):
+    # 分片使用記憶體後端，封存目錄放在暫存目錄
+    os.environ["MBBUDDY_STORAGE"] = "memory"
+    os.environ["MBBUDDY_ARCHIVE_DIR"] = tempfile.mkdtemp(prefix="mbbuddy_shards_")
+    run_ring(shards)
+    rows = []
+    checks = []
+    for count in sorted({1, shards}):
+        processes, shard_ports, router_port = start_cluster(count)
+        try:
+            codes = seed(router_port, clients)
+            misplaced, per_shard, listed = verify(router_port, shard_ports, codes)
+            checks.append((count, misplaced, " / ".join(str(n) for n in per_shard.values()), listed))
+            if count == 1:
+                rows.append(("direct", 1, *measure(shard_ports["shard-0"], codes, clients, duration, warmup)))
+            rows.append(("router", count, *measure(router_port, codes, clients, duration, warmup)))
+        finally:
+            stop_cluster(processes)
+    print_table("路由正確性", ["shards", "misplaced", "rooms per shard", "GET /api/rooms"], checks)
+    print_table(f"輪詢吞吐量 ({clients} 個客戶端，每種情境 {duration:g} 秒)",
+                ["target", "shards", "req/s", "p50", "p99", "errors"], rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    args = parser.parse_args()
+    run(args.shards, args.clients, args.duration, args.warmup)
@@ -0,0 +1,88 @@
+"""
+儲存後端比較：記憶體 vs SQLite（WAL + 批次提交）
+
+以相同的端點呼叫序列量測兩種後端的單次請求延遲，
+並確認 SQLite 後端關閉後重新開啟仍能讀回相同資料。
+
+執行: python -m benchmarks.bench_storage
+"""
+
+import os
+import tempfile
+
+from api import participants
+from api.storage import get_storage, SQLiteStorage
+from benchmarks.harness import use_storage, reset_store, create_room, add_comments, new_device_id, time_call, print_table, fmt_us
+
+ROOMS = 20
+COMMENTS = 200
+PARTICIPANTS = 100
+
+
+def seed():
+    """建立測試房間、參與者與留言，回傳 (房間代碼, 參與者 device_id 列表, 留言 ID 列表)"""
+    reset_store()
+    codes = [create_room(f"Room {i}", ["主題一", "主題二"]) for i in range(ROOMS)]
+    room = codes[0]
+    devices = [new_device_id() for _ in range(PARTICIPANTS)]
+    for i, device_id in enumerate(devices):
+        participants.join_participant(participants.JoinRequest(room=room, nickname=f"user{i}", device_id=device_id))
+    comment_ids = add_comments(room, COMMENTS, nickname="user0")
+    for device_id in devices:
+        participants.vote_comment(room, comment_ids[0], participants.VoteRequest(device_id=device_id, vote_type="good"))
+    return room, devices, comment_ids
+
+
+def measure():
+    room, devices, comment_ids = seed()
+    counter = iter(range(10**9))
+
+    def comment():
+        participants.add_comment(room, participants.CommentRequest(nickname="user1", content=f"new {next(counter)}"))
+
+    def vote_and_unvote():
+        req = participants.VoteRequest(device_id=devices[1], vote_type="bad")
+        participants.vote_comment(room, comment_ids[1], req)
+        participants.remove_vote_comment(room, comment_ids[1], req)
+
+    return [
+        ("GET state", time_call(lambda: participants._room_state(room), repeat=300)),
+        ("GET comments", time_call(lambda: participants._room_comments(room), repeat=300)),
+        ("GET participants", time_call(lambda: participants._online_participants(room), repeat=1000)),
+        ("POST heartbeat", time_call(lambda: participants._touch_participant(room, devices[2]), repeat=2000)),
+        ("POST comment", time_call(comment, repeat=1000)),
+        ("POST+DELETE vote", time_call(vote_and_unvote, repeat=1000)),
+        ("GET votes (裝置)", time_call(lambda: participants._device_votes(room, devices[0]), repeat=1000)),
+    ]
+
+
+def run():
+    results = {}
+    use_storage("memory")
+    results["memory"] = measure()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        use_storage("sqlite", path=path)
+        results["sqlite"] = measure()
+        expected = get_storage().dump()
+        use_storage("memory")  # 關閉 SQLite 後端並提交最後一批寫入
+
+        reopened = SQLiteStorage(path)
+        restored = reopened.dump() == expected
+        reopened.close()
+
+    rows = [
+        (name, fmt_us(mem["p50"]), fmt_us(sql["p50"]), fmt_us(sql["p99"]))
+        for (name, mem), (_, sql) in zip(results["memory"], results["sqlite"])
+    ]
+    print_table(
+        f"端點延遲 ({ROOMS} 間房間, {COMMENTS} 則留言, {PARTICIPANTS} 位參與者)",
+        ["端點", "memory p50", "sqlite p50", "sqlite p99"],
+        rows,
+    )
+    print(f"\nSQLite 重新開啟後資料一致: {restored}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,99 @@
+"""
+參與者同步端點基準測試
+
+參與者輪詢時原本每個週期呼叫 4 個端點：POST heartbeat、GET state?since、GET votes、GET participants，
+改為一次 POST /api/rooms/{room}/sync。比較每 1,000 個輪詢週期的請求數、回應位元組數（標頭 + 本文）與伺服器 CPU 時間；
+每個週期之間房間內有 1 則新留言與 5 次投票，兩種方式都以增量同步取得房間狀態。
+
+直接以 ASGI 介面呼叫 FastAPI 應用（不經過網路與 HTTP 客戶端），CPU 時間只包含伺服器端的處理。
+
+執行: python -m benchmarks.bench_sync [--comments 200] [--participants 100] [--cycles 1000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from api import participants
+from benchmarks.bench_async_polling import build_app
+from benchmarks.bench_etag import call, seed
+from benchmarks.harness import use_storage, add_comments, quiet, print_table
+
+JSON_HEADERS = ((b"content-type", b"application/json"),)
+
+
+async def separate(app, room, device_id, since):
+    calls = [
+        ("POST", "/api/participants/heartbeat", {"room": room, "device_id": device_id}),
+        ("GET", f"/api/rooms/{room}/state?since={since}", None),
+        ("GET", f"/api/rooms/{room}/votes?device_id={device_id}", None),
+        ("GET", f"/api/participants?room={room}", None),
+    ]
+    total = 0
+    for method, path, body in calls:
+        payload = json.dumps(body).encode() if body is not None else b""
+        status, _, size = await call(app, path, JSON_HEADERS, method, payload)
+        if status != 200:
+            raise RuntimeError(f"{path} 回傳 {status}")
+        total += size
+    return len(calls), total
+
+
+async def combined(app, room, device_id, since):
+    payload = json.dumps({"device_id": device_id, "since": since}).encode()
+    status, _, size = await call(app, f"/api/rooms/{room}/sync", JSON_HEADERS, "POST", payload)
+    if status != 200:
+        raise RuntimeError(f"sync 回傳 {status}")
+    return 1, size
+
+
+def measure(app, room, people, cycles, poll):
+    requests, total_bytes, cpu = 0, 0, 0.0
+    for i in range(cycles):
+        with quiet():
+            ids = add_comments(room, 1)
+        for j in range(5):
+            participants.get_storage().cast_vote(room, ids[0], f"device_{(i * 5 + j) % people}", "good")
+        device_id = f"device_{i % people}"
+        since = participants.get_storage().room_version(room) - 1
+        start = time.process_time()
+        count, size = asyncio.run(poll(app, room, device_id, since))
+        cpu += time.process_time() - start
+        requests += count
+        total_bytes += size
+    return requests, total_bytes, cpu * 1000
+
+
+def run(comments=200, people=100, cycles=1000):
+    app = build_app("async")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("memory", "sqlite"):
+            if backend == "sqlite":
+                use_storage("sqlite", path=os.path.join(tmp, "bench.db"))
+            else:
+                use_storage("memory")
+            for name, poll in (("4 endpoints", separate), ("sync", combined)):
+                with quiet():
+                    room = seed(comments, people)
+                    participants.set_room_status(room, "Discussion")
+                requests, total_bytes, cpu = measure(app, room, people, cycles, poll)
+                rows.append((backend, name, f"{requests:,}", f"{total_bytes:,}", f"{cpu:,.0f}ms"))
+        use_storage("memory")  # 關閉 SQLite 後端
+    print_table(
+        f"每 {cycles:,} 個輪詢週期（{comments} 則留言，{people} 位參與者）",
+        ["backend", "mode", "requests", "bytes", "server CPU"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=200)
+    parser.add_argument("--participants", type=int, default=100)
+    parser.add_argument("--cycles", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.comments, args.participants, args.cycles)
@@ -0,0 +1,76 @@
+"""
+主題高票留言（排行索引）基準測試
+
+比較取得主題前 n 名留言的兩種做法：
+- full + sort：與前端相同，讀取整個主題的留言再依好評減差評排序
+- ranking：GET /api/rooms/{room}/topics/{topic}/top，由新增留言與投票時同步維護的排行直接取出前 n 則
+另量測投票（含更新排行）的延遲，並確認兩種做法的結果一致。
+
+執行: python -m benchmarks.bench_top_comments [--sizes 1000 5000] [--backends memory sqlite]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+
+from api import participants
+from api.storage import get_storage
+from benchmarks.harness import use_storage, reset_store, create_room, add_comments, quiet, time_call, print_table, fmt_us
+
+TOP = 10
+VOTERS = 50
+
+
+def sort_all(room, topic):
+    comments = [c for c in get_storage().get_comment_payloads(room, topic) if not c["isAISummary"]]
+    comments.reverse()  # 同分時較新的在前（sorted 為穩定排序）
+    return sorted(comments, key=lambda c: c["vote_good"] - c["vote_bad"], reverse=True)[:TOP]
+
+
+def measure(size):
+    reset_store()
+    room = create_room("Top", ["主題一"])
+    with quiet():
+        ids = add_comments(room, size)
+    rng = random.Random(size)
+    store = get_storage()
+    for _ in range(size * 2):
+        store.cast_vote(room, rng.choice(ids), f"device_{rng.randrange(VOTERS)}", rng.choice(["good", "bad"]))
+
+    def vote_and_unvote():
+        req = participants.VoteRequest(device_id="device_bench", vote_type="good")
+        comment_id = rng.choice(ids)
+        participants.vote_comment(room, comment_id, req)
+        participants.remove_vote_comment(room, comment_id, req)
+
+    repeat = max(20, 20000 // size)
+    full = time_call(lambda: sort_all(room, "主題一"), repeat=repeat)
+    top = time_call(lambda: participants._top_comments(room, "主題一", TOP), repeat=repeat * 10)
+    vote = time_call(vote_and_unvote, repeat=1000)
+    same = sort_all(room, "主題一") == participants._top_comments(room, "主題一", TOP)["comments"]
+    return (size, fmt_us(full["p50"]), fmt_us(top["p50"]), f"{full['p50'] / top['p50']:,.0f}x", fmt_us(vote["p50"]), same)
+
+
+def run(sizes=(1000, 5000), backends=("memory", "sqlite")):
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            if backend == "sqlite":
+                use_storage("sqlite", path=os.path.join(tmp, "bench.db"))
+            else:
+                use_storage("memory")
+            rows = [measure(size) for size in sizes]
+            use_storage("memory")
+        print_table(
+            f"前 {TOP} 名留言（{backend}）",
+            ["留言數", "full + sort p50", "ranking p50", "加速", "投票+取消 p50", "結果一致"],
+            rows,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+    run(tuple(args.sizes), tuple(args.backends))
@@ -0,0 +1,106 @@
+"""
+投票資料結構微基準測試（每則留言 1,000 位投票者）
+
+比較舊版 list 儲存與 VoteTally（集合 + 同步計數）在
+重複投票檢查、改票、取消投票與讀取票數時的成本。
+
+執行: python -m benchmarks.bench_votes
+"""
+
+from api import participants
+from api.data_store import VoteTally
+from api.storage import get_storage
+from benchmarks.harness import reset_store, create_room, add_comments, time_call, print_table, fmt_us
+
+VOTERS = 1000
+COMMENTS = 100
+
+
+def legacy_votes():
+    voters = [f"device_{i}" for i in range(VOTERS)]
+    return {"good": list(voters), "bad": []}
+
+
+def legacy_vote(entry, device_id, vote_type):
+    if device_id in entry[vote_type]:
+        return False
+    opposite_type = "bad" if vote_type == "good" else "good"
+    if device_id in entry[opposite_type]:
+        entry[opposite_type].remove(device_id)
+    entry[vote_type].append(device_id)
+    return True
+
+
+def tally_votes():
+    tally = VoteTally()
+    for i in range(VOTERS):
+        tally.add(f"device_{i}", "good")
+    return tally
+
+
+def run_structures():
+    rows = []
+    last = f"device_{VOTERS - 1}"
+
+    legacy = legacy_votes()
+    tally = tally_votes()
+
+    rows.append((
+        "重複投票檢查",
+        fmt_us(time_call(lambda: legacy_vote(legacy, last, "good"), repeat=5000)["p50"]),
+        fmt_us(time_call(lambda: tally.add(last, "good"), repeat=5000)["p50"]),
+    ))
+
+    def legacy_flip():
+        legacy_vote(legacy, "device_0", "bad")
+        legacy_vote(legacy, "device_0", "good")
+
+    def tally_flip():
+        tally.add("device_0", "bad")
+        tally.add("device_0", "good")
+
+    rows.append((
+        "改票 (good → bad → good)",
+        fmt_us(time_call(legacy_flip, repeat=5000)["p50"]),
+        fmt_us(time_call(tally_flip, repeat=5000)["p50"]),
+    ))
+
+    legacy_store = {"c": legacy}
+    tally_store = {"c": tally}
+    rows.append((
+        "讀取票數",
+        fmt_us(time_call(lambda: (
+            len(legacy_store.get("c", {}).get("good", [])),
+            len(legacy_store.get("c", {}).get("bad", [])),
+        ), repeat=5000)["p50"]),
+        fmt_us(time_call(lambda: tally_store["c"].counts(), repeat=5000)["p50"]),
+    ))
+    print_table(f"單則留言操作 ({VOTERS} 位投票者, p50)", ["操作", "list", "VoteTally"], rows)
+
+
+def run_endpoints():
+    reset_store()
+    room = create_room("Votes", ["主題"])
+    comment_ids = add_comments(room, COMMENTS)
+    store = get_storage()
+    for comment_id in comment_ids:
+        for i in range(VOTERS):
+            store.cast_vote(room, comment_id, f"device_{i}", "good")
+
+    def vote_and_unvote():
+        req = participants.VoteRequest(device_id="device_new", vote_type="good")
+        participants.vote_comment(room, comment_ids[-1], req)
+        participants.remove_vote_comment(room, comment_ids[-1], req)
+
+    rows = [
+        ("POST+DELETE vote", fmt_us(time_call(vote_and_unvote, repeat=2000)["p50"])),
+        ("GET state", fmt_us(time_call(lambda: participants._room_state(room), repeat=500)["p50"])),
+        ("GET comments", fmt_us(time_call(lambda: participants._room_comments(room), repeat=500)["p50"])),
+        ("GET votes (裝置)", fmt_us(time_call(lambda: participants._device_votes(room, "device_0"), repeat=500)["p50"])),
+    ]
+    print_table(f"端點延遲 ({COMMENTS} 則留言 × {VOTERS} 位投票者, p50)", ["端點", "延遲"], rows)
+
+
+if __name__ == "__main__":
+    run_structures()
+    run_endpoints()
@@ -0,0 +1,238 @@
+"""
+即時推播（WebSocket / SSE）vs 輪詢
+
+以 uvicorn 啟動後端，同一房間內 N 個參與者，主持人每秒新增 1 則留言，比較三種同步方式：
+- polling：與前端舊版相同，每 3 秒 GET /api/rooms/{room}/state?since=、每 5 秒 POST heartbeat
+- websocket：每位參與者一條 /ws/rooms/{room} 連線，由伺服器推送變更
+- sse：每位參與者一條 GET /api/rooms/{room}/events 串流
+量測新增留言到每位參與者收到該留言的延遲（p50 / p99 / max）、每秒請求或訊息數，
+以及伺服器程序的 CPU 時間（讀取 /proc，僅限 Linux）。
+
+執行: python -m benchmarks.bench_websocket [--clients 100 300] [--duration 15] [--modes polling websocket sse]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+
+from benchmarks.bench_async_polling import request, wait_for_port, free_port
+
+POLL_INTERVAL = 3.0
+HEARTBEAT_INTERVAL = 5.0
+COMMENT_INTERVAL = 1.0
+
+
+def serve(port, clients, ready):
+    """子程序：建立房間與參與者後啟動 uvicorn，房間代碼經由 ready 回傳"""
+    import uvicorn
+    from fastapi import FastAPI
+    from api import participants, realtime
+    from benchmarks.harness import create_room, quiet
+
+    with quiet():
+        room = create_room("WebSocket", ["主題一"])
+        participants.update_current_topic(room, participants.TopicUpdateRequest(topic="主題一"))
+        for i in range(clients):
+            participants.join_participant(participants.JoinRequest(room=room, nickname=f"user{i}", device_id=f"device_{i}"))
+    app = FastAPI()
+    app.include_router(participants.router)
+    app.include_router(realtime.router)
+    ready.put(room)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="error", backlog=4096, access_log=False)
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def fetch_json(reader, writer, method, path, body=None):
+    """與 bench_async_polling.request 相同，但回傳 (狀態碼, JSON)"""
+    head = f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+    payload = json.dumps(body).encode() if body is not None else b""
+    if body is not None:
+        head += "Content-Type: application/json\r\n"
+    writer.write(f"{head}Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    return int(status_line.split()[1]), json.loads(await reader.readexactly(length))
+
+
+class Deliveries:
+    """記錄每則留言的新增時間與各參與者收到的時間"""
+
+    def __init__(self):
+        self.posted = {}
+        self.latencies = []
+        self.messages = 0
+
+    def received(self, state):
+        now = time.perf_counter()
+        self.messages += 1
+        for comment in state.get("comments", []):
+            posted = self.posted.get(comment["id"])
+            if posted is not None:
+                self.latencies.append(now - posted)
+
+
+async def host(port, room, deliveries, deadline):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            _, body = await fetch_json(reader, writer, "POST", f"/api/rooms/{room}/comments",
+                                       {"nickname": "host", "content": f"comment {i}"})
+            deliveries.posted[body["comment_id"]] = start
+            i += 1
+            await asyncio.sleep(max(0.0, COMMENT_INTERVAL - (time.perf_counter() - start)))
+    finally:
+        writer.close()
+
+
+async def poller(port, room, device_id, deliveries, deadline, phase, counter):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        _, state = await fetch_json(reader, writer, "GET", f"/api/rooms/{room}/state")
+        version = state["version"]
+        start = time.perf_counter()
+        schedule = [[start + phase * POLL_INTERVAL, POLL_INTERVAL, "state"],
+                    [start + phase * HEARTBEAT_INTERVAL, HEARTBEAT_INTERVAL, "heartbeat"]]
+        while True:
+            entry = min(schedule, key=lambda e: e[0])
+            if entry[0] >= deadline:
+                break
+            await asyncio.sleep(max(0.0, entry[0] - time.perf_counter()))
+            entry[0] += entry[1]
+            counter[0] += 1
+            if entry[2] == "state":
+                _, state = await fetch_json(reader, writer, "GET", f"/api/rooms/{room}/state?since={version}")
+                version = state["version"]
+                deliveries.received(state)
+            else:
+                await request(reader, writer, "POST", "/api/participants/heartbeat",
+                              {"room": room, "device_id": device_id})
+    finally:
+        writer.close()
+
+
+async def subscriber(socket, deliveries, deadline):
+    try:
+        while True:
+            message = json.loads(await asyncio.wait_for(socket.recv(), deadline - time.perf_counter()))
+            if message["type"] == "state":
+                deliveries.received(message)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def event_stream(client, url, deliveries, opened):
+    """讀取 SSE 串流，收到初始狀態後設定 opened"""
+    async with client.stream("GET", url) as response:
+        event, data = None, None
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data = line[5:].strip()
+            elif not line and data is not None:
+                if event == "state":
+                    deliveries.received(json.loads(data))
+                    opened.set()
+                event, data = None, None
+
+
+async def drive(mode, port, room, clients, duration, pid):
+    import httpx
+    from websockets.asyncio.client import connect
+
+    deliveries = Deliveries()
+    counter = [0]
+    sockets, streams = [], []
+    http = httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=None))
+    if mode == "websocket":
+        for i in range(clients):
+            socket = await connect(f"ws://127.0.0.1:{port}/ws/rooms/{room}?device_id=device_{i}", max_size=None)
+            for _ in range(2):   # 初始狀態與在線名單
+                await socket.recv()
+            sockets.append(socket)
+    elif mode == "sse":
+        for i in range(clients):
+            opened = asyncio.Event()
+            url = f"http://127.0.0.1:{port}/api/rooms/{room}/events?device_id=device_{i}"
+            streams.append(asyncio.ensure_future(event_stream(http, url, deliveries, opened)))
+            await opened.wait()
+    await asyncio.sleep(1.0)
+    deliveries.messages = 0
+    cpu_start = cpu_seconds(pid)
+    deadline = time.perf_counter() + duration
+    tasks = [host(port, room, deliveries, deadline)]
+    if mode == "websocket":
+        tasks += [subscriber(socket, deliveries, deadline + 1.0) for socket in sockets]
+    elif mode == "polling":
+        tasks += [poller(port, room, f"device_{i}", deliveries, deadline, i / clients, counter) for i in range(clients)]
+    await asyncio.gather(*tasks)
+    if streams:
+        await asyncio.sleep(1.0)
+    cpu = cpu_seconds(pid) - cpu_start
+    for socket in sockets:
+        await socket.close()
+    for stream in streams:
+        stream.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+    await http.aclose()
+    rate = (counter[0] if mode == "polling" else deliveries.messages) / duration
+    return deliveries, rate, cpu
+
+
+def run_case(mode, clients, duration):
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    port = free_port()
+    server = ctx.Process(target=serve, args=(port, clients, ready), daemon=True)
+    server.start()
+    try:
+        room = ready.get(timeout=120)
+        wait_for_port(port)
+        deliveries, rate, cpu = asyncio.run(drive(mode, port, room, clients, duration, server.pid))
+    finally:
+        server.terminate()
+        server.join()
+    samples = sorted(deliveries.latencies)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+    return (mode, clients, f"{len(samples):,}", f"{pick(0.5):,.1f}ms", f"{pick(0.99):,.1f}ms",
+            f"{samples[-1] * 1000:,.1f}ms", f"{rate:,.0f}", f"{cpu:.2f}s")
+
+
+def run(clients=(100, 300), duration=15.0, modes=("polling", "websocket", "sse")):
+    from benchmarks.harness import print_table
+
+    rows = []
+    for n in clients:
+        for mode in modes:
+            rows.append(run_case(mode, n, duration))
+    print_table(
+        f"新增留言到參與者收到的延遲（每秒 1 則留言，{duration:g} 秒）",
+        ["mode", "clients", "deliveries", "p50", "p99", "max", "req|msg/s", "server CPU"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 300])
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--modes", nargs="+", default=["polling", "websocket", "sse"])
+    args = parser.parse_args()
+    run(tuple(args.clients), args.duration, tuple(args.modes))
@@ -0,0 +1,101 @@
+"""
+基準測試共用工具
+負責重置儲存後端、建立測試房間與量測呼叫延遲
+"""
+
+import contextlib
+import io
+import statistics
+import time
+import uuid
+
+from api import participants
+from api.storage import configure_storage, get_storage
+
+
+def use_storage(kind="memory", **options):
+    """
+    切換基準測試使用的儲存後端並回傳
+    memory / journal 後端預設關閉自動封存：背景封存會在建立資料期間移出房間，量測到的只剩 room_budget 間房間，
+    也會在工作目錄寫入封存檔（bench_archive 自行設定封存）
+    """
+    if kind in ("memory", "journal"):
+        options.setdefault("auto_archive", False)
+    return configure_storage(kind, **options)
+
+
+# 未指定後端的基準測試使用關閉自動封存的記憶體後端，而不是依環境變數建立的預設後端
+use_storage("memory")
+
+
+def reset_store():
+    """清空目前儲存後端中的所有房間資料與索引"""
+    get_storage().clear()
+
+
+@contextlib.contextmanager
+def quiet():
+    """隱藏端點函數的 print 輸出，避免干擾量測結果"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def create_room(title="Benchmark", topic_names=("主題一",)):
+    """透過 create_room 端點建立房間並回傳房間代碼"""
+    req = participants.RoomCreate(title=title, topics=list(topic_names), topic_count=len(topic_names))
+    with quiet():
+        return participants.create_room(req)["code"]
+
+
+def add_comments(room, count, nickname="bench"):
+    """在房間當前主題新增留言，回傳留言 ID 列表"""
+    ids = []
+    for i in range(count):
+        req = participants.CommentRequest(nickname=nickname, content=f"comment {i}")
+        ids.append(participants.add_comment(room, req)["comment_id"])
+    return ids
+
+
+def seed_rooms(n_rooms, topics_per_room=5, comments_per_topic=20):
+    """建立 n_rooms 個房間，每個主題都放入指定數量的留言，回傳房間代碼列表"""
+    codes = []
+    names = [f"主題{i}" for i in range(topics_per_room)]
+    for r in range(n_rooms):
+        code = create_room(f"Room {r}", names)
+        for name in names:
+            participants.update_current_topic(code, participants.TopicUpdateRequest(topic=name))
+            add_comments(code, comments_per_topic)
+        codes.append(code)
+    return codes
+
+
+def new_device_id():
+    return f"device_{uuid.uuid4().hex[:12]}"
+
+
+def time_call(fn, repeat=1000):
+    """重複呼叫 fn 並回傳每次呼叫的延遲統計（微秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def print_table(title, headers, rows):
+    """以固定寬度輸出結果表格"""
+    print(f"\n== {title} ==")
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(row, widths)))
+
+
+def fmt_us(value):
+    return f"{value:,.1f}µs"
@@ -0,0 +1,217 @@
+"""
+房間並行壓力測試
+
+以多個執行緒同時對同一間房間呼叫端點（加入、心跳、留言、投票/改票/取消、刪除留言、
+改暱稱、主題改名、讀取狀態），結束後檢查資料結構的不變量：
+- 每則留言的票數等於投票者集合大小，且同一裝置不會同時投好評與差評
+- 裝置投票索引、作者留言索引、留言索引與主題內容一致，沒有孤兒投票
+- 暱稱索引與參與者名單一致
+
+--no-locks 會停用房間鎖，用來對照沒有並行控制時會出現的問題。
+
+執行: python -m benchmarks.stress_room_locks [--backend memory|journal|sqlite] [--threads 32] [--ops 20000] [--rooms 1] [--no-locks]
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from api import data_store, participants
+from benchmarks.harness import use_storage, create_room, quiet
+
+DEVICES = 50
+TOPICS = ["主題A", "主題B", "主題C"]
+
+
+def worker(rooms, ops, seed, errors, comment_ids, lock):
+    rng = random.Random(seed)
+    for _ in range(ops):
+        room = rng.choice(rooms)
+        device_id = f"device_{rng.randrange(DEVICES)}"
+        action = rng.random()
+        try:
+            if action < 0.10:
+                participants.join_participant(participants.JoinRequest(room=room, nickname=f"user{rng.randrange(DEVICES)}", device_id=device_id))
+            elif action < 0.20:
+                participants._touch_participant(room, device_id)
+            elif action < 0.35:
+                result = participants.add_comment(room, participants.CommentRequest(nickname=f"user{rng.randrange(DEVICES)}", content="stress"))
+                with lock:
+                    comment_ids.setdefault(room, []).append(result["comment_id"])
+            elif action < 0.60:
+                with lock:
+                    candidates = comment_ids.get(room) or [None]
+                    comment_id = rng.choice(candidates)
+                if comment_id is None:
+                    continue
+                req = participants.VoteRequest(device_id=device_id, vote_type=rng.choice(["good", "bad"]))
+                if rng.random() < 0.7:
+                    participants.vote_comment(room, comment_id, req)
+                else:
+                    participants.remove_vote_comment(room, comment_id, req)
+            elif action < 0.65:
+                with lock:
+                    candidates = comment_ids.get(room) or [None]
+                    comment_id = rng.choice(candidates)
+                if comment_id is not None:
+                    participants.delete_comment_single(room, comment_id)
+            elif action < 0.72:
+                participants.update_participant_nickname(room, device_id, participants.UpdateNicknameRequest(new_nickname=f"n{rng.randrange(DEVICES)}"))
+            elif action < 0.78:
+                old, new = rng.sample(TOPICS + [t + "'" for t in TOPICS], 2)
+                participants.rename_topic(room, participants.RenameTopicRequest(old_topic=old, new_topic=new))
+            elif action < 0.82:
+                participants.update_current_topic(room, participants.TopicUpdateRequest(topic=rng.choice(TOPICS)))
+            elif action < 0.91:
+                participants._room_state(room)
+            else:
+                participants._online_participants(room)
+        except HTTPException:
+            pass
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+
+def check_memory_invariants(rooms):
+    """檢查記憶體資料結構與各索引是否一致，回傳違反的項目"""
+    problems = []
+    indexed = {}
+    for room in rooms:
+        for name, topic in data_store.room_topics.get(room, {}).items():
+            if data_store.topics.get(data_store.make_topic_id(room, name)) is not topic:
+                problems.append(f"主題索引不一致: {room}/{name}")
+            if topic.topic_name != name:
+                problems.append(f"主題名稱不一致: {name} != {topic.topic_name}")
+            for comment in topic.comments:
+                indexed[comment.id] = (room, comment)
+    room_topic_ids = {data_store.make_topic_id(r, n) for r in rooms for n in data_store.room_topics.get(r, {})}
+    for topic_id, topic in data_store.topics.items():
+        if topic.room_id in rooms and topic_id not in room_topic_ids:
+            problems.append(f"孤兒主題: {topic_id}")
+
+    for comment_id, (room, topic, comment) in data_store.comment_index.items():
+        if room in rooms and indexed.get(comment_id, (None, None))[1] is not comment:
+            problems.append(f"留言索引指向不存在的留言: {comment_id}")
+    for comment_id in indexed:
+        if comment_id not in data_store.comment_index:
+            problems.append(f"留言未登記索引: {comment_id}")
+
+    expected_device_votes = {}
+    for comment_id, tally in data_store.votes.items():
+        if comment_id not in data_store.comment_index:
+            problems.append(f"孤兒投票: {comment_id}")
+            continue
+        room = data_store.comment_index[comment_id][0]
+        if tally.good_count != len(tally.good) or tally.bad_count != len(tally.bad):
+            problems.append(f"票數與投票者不一致: {comment_id}")
+        if tally.good & tally.bad:
+            problems.append(f"同一裝置同時投好評與差評: {comment_id}")
+        for vote_type, voters in (("good", tally.good), ("bad", tally.bad)):
+            for device_id in voters:
+                expected_device_votes.setdefault((room, device_id), {})[comment_id] = vote_type
+    actual_device_votes = {k: v for k, v in data_store.device_votes.items() if k[0] in rooms}
+    if actual_device_votes != expected_device_votes:
+        problems.append("裝置投票索引與投票者集合不一致")
+
+    expected_authors = {}
+    for comment_id, (room, comment) in indexed.items():
+        if comment.device_id:
+            expected_authors.setdefault((room, comment.device_id), set()).add(comment_id)
+    actual_authors = {k: v for k, v in data_store.author_comments.items() if k[0] in rooms}
+    if actual_authors != expected_authors:
+        problems.append("作者留言索引不一致")
+
+    for room in rooms:
+        registry = data_store.room_participants.get(room)
+        if registry is None:
+            continue
+        by_nickname = {}
+        for device_id, participant in registry.members.items():
+            by_nickname.setdefault(participant.nickname, set()).add(device_id)
+        if {k: set(v) for k, v in registry.by_nickname.items()} != by_nickname:
+            problems.append(f"暱稱索引不一致: {room}")
+    return problems
+
+
+def check_sqlite_invariants(store):
+    problems = []
+    store.flush()
+    conn = store._conn
+    rows = conn.execute(
+        "SELECT c.id, c.vote_good, c.vote_bad, "
+        "(SELECT COUNT(*) FROM votes v WHERE v.comment_id = c.id AND v.vote_type = 'good'), "
+        "(SELECT COUNT(*) FROM votes v WHERE v.comment_id = c.id AND v.vote_type = 'bad') FROM comments c"
+    ).fetchall()
+    for comment_id, good, bad, real_good, real_bad in rows:
+        if (good, bad) != (real_good, real_bad):
+            problems.append(f"票數與投票紀錄不一致: {comment_id}")
+    orphans = conn.execute("SELECT COUNT(*) FROM votes WHERE comment_id NOT IN (SELECT id FROM comments)").fetchone()[0]
+    if orphans:
+        problems.append(f"孤兒投票: {orphans}")
+    return problems
+
+
+def run(backend, threads, ops, n_rooms, use_locks):
+    with tempfile.TemporaryDirectory() as tmp:
+        options = {}
+        if backend == "sqlite":
+            options["path"] = os.path.join(tmp, "stress.db")
+        elif backend == "journal":
+            options["directory"] = tmp
+        store = use_storage(backend, **options)
+        if not use_locks:
+            store.room_lock = lambda code: contextlib.nullcontext()
+
+        rooms = [create_room(f"Stress {i}", TOPICS) for i in range(n_rooms)]
+        errors = []
+        comment_ids = {}
+        lock = threading.Lock()
+        per_thread = ops // threads
+        # 縮短 GIL 切換間隔，讓執行緒在多步驟操作中間更常被切換，放大競爭條件
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        start = time.perf_counter()
+        try:
+            with quiet(), ThreadPoolExecutor(max_workers=threads) as pool:
+                for t in range(threads):
+                    pool.submit(worker, rooms, per_thread, t, errors, comment_ids, lock)
+        finally:
+            elapsed = time.perf_counter() - start
+            sys.setswitchinterval(switch_interval)
+
+        if backend == "sqlite":
+            problems = check_sqlite_invariants(store)
+        else:
+            problems = check_memory_invariants(set(rooms))
+        use_storage("memory")
+
+    total = per_thread * threads
+    print(f"\n== {backend} 後端，{threads} 執行緒 × {per_thread} 次操作，{n_rooms} 間房間，房間鎖{'啟用' if use_locks else '停用'} ==")
+    print(f"耗時 {elapsed:.2f}s（{total / elapsed:,.0f} ops/s）")
+    print(f"非預期例外: {len(errors)}")
+    for message in sorted(set(errors))[:10]:
+        print(f"  - {message}")
+    print(f"不變量違反: {len(problems)}")
+    for message in problems[:10]:
+        print(f"  - {message}")
+    return not errors and not problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="memory", choices=["memory", "journal", "sqlite"])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--rooms", type=int, default=1)
+    parser.add_argument("--no-locks", action="store_true")
+    args = parser.parse_args()
+    ok = run(args.backend, args.threads, args.ops, args.rooms, not args.no_locks)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,207 @@
+"""
+分片連線池測試
+
+以 uvicorn 啟動一個測試分片與分片路由器，經由路由器轉送請求並檢查 shard_router.ShardClient：
+- content-length 與 chunked 回應完整轉送，連續請求重複使用同一條 keep-alive 連線
+- 分片關閉閒置連線後，下一個請求（包含 POST）改用新連線
+- 分片收到請求後才關閉重複使用的連線時，GET 改用新連線重送，POST 回傳 502 而不重送
+- 串流回應（SSE）邊收邊轉送
+- 分片回應途中斷線（本文少於 content-length、chunked 未結束）時回傳 502 或結束串流，
+  不把例外拋給路由器的 ASGI 伺服器
+
+執行: python -m benchmarks.stress_shard_client [--requests 200]
+"""
+
+import argparse
+import asyncio
+import logging
+
+import httpx
+import uvicorn
+
+from benchmarks.bench_async_polling import free_port
+from benchmarks.harness import print_table
+from shard_router import ShardBadGateway, ShardClient, create_app
+
+KEEP_ALIVE = 1   # 測試分片關閉閒置連線的秒數
+CHUNKS = [b"part-%d;" % i for i in range(20)]
+
+
+class ShardApp:
+    """測試分片：記錄每個請求來自哪一條連線（用戶端埠號）"""
+
+    def __init__(self):
+        self.connections = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        self.connections.add(scope["client"][1])
+        path = scope["path"]
+        if path == "/fixed":
+            body = b'{"ok": true}'
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+        elif path in ("/chunked", "/events", "/broken_chunked"):
+            content_type = b"text/event-stream" if path == "/events" else b"text/plain"
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+            for i, chunk in enumerate(CHUNKS):
+                if path == "/broken_chunked" and i == len(CHUNKS) // 2:
+                    # uvicorn 直接關閉連線，chunked 本文沒有結尾
+                    raise RuntimeError("分片在回應途中失敗")
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                if path == "/events":
+                    await asyncio.sleep(0.01)
+            await send({"type": "http.response.body", "body": b""})
+        elif path == "/truncated":
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"100")]})
+            await send({"type": "http.response.body", "body": b"short", "more_body": True})
+            raise RuntimeError("分片在回應途中失敗")
+
+
+class DroppingShard:
+    """測試分片：每條連線回應第一個請求，第二個請求讀完後不回應就關閉連線，並記錄收到的請求"""
+
+    def __init__(self):
+        self.received = []
+
+    async def handle(self, reader, writer):
+        served = 0
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                self.received.append(request_line.split()[0].decode())
+                if served:
+                    break
+                served += 1
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def check_dropped_connection(method):
+    """回傳 (第二個請求的結果, 分片收到的請求數)"""
+    shard = DroppingShard()
+    server = await asyncio.start_server(shard.handle, "127.0.0.1", 0)
+    client = ShardClient(f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+    try:
+        first = await client.request(method, "/", [], b"{}")
+        await first.read()
+        try:
+            second = await client.request(method, "/", [], b"{}")
+            result = second.status
+            await second.read()
+        except ShardBadGateway:
+            result = 502
+    finally:
+        await client.close()
+        server.close()
+        await server.wait_closed()
+    return result, len(shard.received)
+
+
+class ErrorRecords(logging.Handler):
+    """收集路由器的 ASGI 伺服器記錄的例外"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+
+
+async def serve(app, port, **options):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="critical", **options))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.02)
+    return server, task
+
+
+async def run_checks(requests):
+    shard_app = ShardApp()
+    shard_port, router_port = free_port(), free_port()
+    router = create_app({"shard-0": f"http://127.0.0.1:{shard_port}"})
+    errors = ErrorRecords()
+    # 路由器由本程序的 uvicorn 執行，路由器未處理的例外會記錄在 uvicorn.error
+    logging.getLogger("uvicorn.error").addHandler(errors)
+    shard, shard_task = await serve(shard_app, shard_port, timeout_keep_alive=KEEP_ALIVE)
+    router_server, router_task = await serve(router, router_port, log_config=None)
+    rows = []
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{router_port}", timeout=10) as client:
+            ok = True
+            for _ in range(requests):
+                fixed = await client.get("/fixed")
+                chunked = await client.get("/chunked")
+                ok &= fixed.status_code == 200 and fixed.json() == {"ok": True}
+                ok &= chunked.status_code == 200 and chunked.content == b"".join(CHUNKS)
+            rows.append(("content-length / chunked", requests * 2, ok))
+            rows.append(("keep-alive 重複使用連線", f"{len(shard_app.connections)} 條連線", len(shard_app.connections) == 1))
+
+            await asyncio.sleep(KEEP_ALIVE + 0.5)
+            retried = await client.get("/fixed")
+            rows.append((
+                "閒置連線被關閉後重送", f"{len(shard_app.connections)} 條連線",
+                retried.status_code == 200 and len(shard_app.connections) == 2,
+            ))
+            await asyncio.sleep(KEEP_ALIVE + 0.5)
+            posted = await client.post("/fixed", json={})
+            rows.append((
+                "閒置連線被關閉後 POST", f"{posted.status_code}，{len(shard_app.connections)} 條連線",
+                posted.status_code == 200 and len(shard_app.connections) == 3,
+            ))
+
+            received = []
+            async with client.stream("GET", "/events") as response:
+                async for chunk in response.aiter_raw():
+                    received.append(chunk)
+            rows.append(("SSE 串流", f"{len(received)} 段", b"".join(received) == b"".join(CHUNKS)))
+
+            truncated = await client.get("/truncated")
+            rows.append(("本文少於 content-length", truncated.status_code, truncated.status_code == 502))
+
+            broken = await client.get("/broken_chunked")
+            partial = b"".join(CHUNKS[: len(CHUNKS) // 2])
+            rows.append(("chunked 未結束就斷線", f"{broken.status_code}，{len(broken.content)} bytes", broken.content == partial))
+
+            after = await client.get("/fixed")
+            rows.append(("斷線後的下一個請求", after.status_code, after.status_code == 200))
+        rows.append(("路由器未處理的例外", len(errors.records), not errors.records))
+        for method, expected in (("GET", (200, 3)), ("POST", (502, 2))):
+            status, received = await check_dropped_connection(method)
+            rows.append((
+                f"{method} 送出後連線被關閉", f"{status}，分片收到 {received} 個請求", (status, received) == expected,
+            ))
+    finally:
+        logging.getLogger("uvicorn.error").removeHandler(errors)
+        router_server.should_exit = True
+        shard.should_exit = True
+        await asyncio.gather(router_task, shard_task)
+    return rows
+
+
+def run(requests=200):
+    rows = asyncio.run(run_checks(requests))
+    print_table("分片連線池", ["情境", "結果", "通過"], rows)
+    if not all(row[-1] for row in rows):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    run(args.requests)
@@ -0,0 +1,175 @@
+"""
+多 worker 模式一致性測試
+
+以 uvicorn 啟動 N 個 worker（共用同一個 SQLite 資料庫），每個請求都使用新的連線，
+讓請求分散到不同 worker，並檢查：
+- 寫後讀：新增留言後立即從（可能是另一個）worker 讀取留言，必須看得到剛新增的留言
+- 投票：多個裝置同時投票、改票與取消後，每則留言的票數等於各裝置最後的投票結果
+- 版本：依序讀取房間狀態時版本不會倒退
+- 變更通知：本程序另外開啟的 shared 連線會收到各 worker 寫入的房間變更通知
+
+執行: python -m benchmarks.stress_workers [--workers 4] [--threads 16] [--ops 2000]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.storage import SQLiteStorage
+
+DEVICES = 40
+
+
+def call(port, method, path, body=None):
+    """以新的連線送出請求，回傳 (狀態碼, JSON)"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
+
+
+def start_server(workers, db_path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, MBBUDDY_WORKERS=str(workers), MBBUDDY_STORAGE="sqlite", MBBUDDY_SQLITE_PATH=db_path)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if call(port, "GET", "/api/rooms")[0] == 200:
+                return server, port
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("伺服器未能啟動")
+
+
+def run(workers=4, threads=16, ops=2000):
+    directory = tempfile.mkdtemp(prefix="mbbuddy_workers_")
+    db_path = os.path.join(directory, "mbbuddy.db")
+    server, port = start_server(workers, db_path)
+    try:
+        _, created = call(port, "POST", "/api/create_room",
+                          {"title": "Workers", "topics": ["主題一"], "topic_count": 1})
+        room = created["code"]
+        call(port, "PUT", f"/api/rooms/{room}/topic", {"topic": "主題一"})
+        for i in range(DEVICES):
+            call(port, "POST", "/api/participants/join", {"room": room, "nickname": f"user{i}", "device_id": f"device_{i}"})
+
+        # 本程序的 shared 連線：記錄收到的變更通知
+        watcher = SQLiteStorage(db_path, shared=True)
+        notified = set()
+        watcher.add_change_listener(lambda code, version: notified.add((code, version)))
+
+        comment_ids = []
+        final_votes = {}       # (comment_id, device_id) → 最後的投票類型
+        votes_lock = threading.Lock()
+        device_locks = [threading.Lock() for _ in range(DEVICES)]
+        failures = []
+
+        def worker(seed, count):
+            rng = random.Random(seed)
+            for _ in range(count):
+                action = rng.random()
+                if action < 0.2 or not comment_ids:
+                    status, body = call(port, "POST", f"/api/rooms/{room}/comments",
+                                        {"nickname": f"user{rng.randrange(DEVICES)}", "content": "hi"})
+                    if status != 200:
+                        failures.append(("新增留言", status))
+                        continue
+                    comment_ids.append(body["comment_id"])
+                    _, listed = call(port, "GET", f"/api/rooms/{room}/comments")
+                    if body["comment_id"] not in {c["id"] for c in listed["comments"]}:
+                        failures.append(("寫後讀", body["comment_id"]))
+                elif action < 0.9:
+                    d = rng.randrange(DEVICES)
+                    comment_id = rng.choice(comment_ids)
+                    vote_type = rng.choice(("good", "bad"))
+                    # 同一裝置的投票依序送出，才能知道最後的結果
+                    with device_locks[d]:
+                        key = (comment_id, f"device_{d}")
+                        if rng.random() < 0.3:
+                            status, _ = call(port, "DELETE", f"/api/rooms/{room}/comments/{comment_id}/vote",
+                                             {"device_id": key[1], "vote_type": vote_type})
+                            if status == 200:
+                                with votes_lock:
+                                    final_votes.pop(key, None)
+                        else:
+                            status, _ = call(port, "POST", f"/api/rooms/{room}/comments/{comment_id}/vote",
+                                             {"device_id": key[1], "vote_type": vote_type})
+                            if status == 200:
+                                with votes_lock:
+                                    final_votes[key] = vote_type
+                else:
+                    call(port, "POST", "/api/participants/heartbeat",
+                         {"room": room, "device_id": f"device_{rng.randrange(DEVICES)}"})
+
+        versions = []
+        stop = threading.Event()
+
+        def version_reader():
+            while not stop.is_set():
+                versions.append(call(port, "GET", f"/api/rooms/{room}/state")[1]["version"])
+
+        reader = threading.Thread(target=version_reader)
+        reader.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for f in [pool.submit(worker, i, ops // threads) for i in range(threads)]:
+                f.result()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        reader.join()
+
+        # 檢查票數
+        expected = {cid: [0, 0] for cid in comment_ids}
+        for (comment_id, _), vote_type in final_votes.items():
+            expected[comment_id][0 if vote_type == "good" else 1] += 1
+        _, state = call(port, "GET", f"/api/rooms/{room}/state")
+        vote_mismatch = [
+            c["id"] for c in state["comments"]
+            if [c["vote_good"], c["vote_bad"]] != expected.get(c["id"])
+        ]
+        regressions = sum(1 for a, b in zip(versions, versions[1:]) if b < a)
+
+        time.sleep(watcher.watch_interval * 4)
+        notified_rooms = {code for code, _ in notified}
+        watcher.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"\n== {workers} 個 worker，{threads} 執行緒 × {ops // threads} 次操作 ==")
+    print(f"耗時 {elapsed:.2f}s（{ops / elapsed:,.0f} ops/s）")
+    print(f"失敗請求與寫後讀不一致: {len(failures)} {failures[:5]}")
+    print(f"票數不一致的留言: {len(vote_mismatch)} / {len(comment_ids)}")
+    print(f"房間版本倒退: {regressions} / {len(versions)} 次讀取")
+    print(f"收到跨程序變更通知: {'是' if room in notified_rooms else '否'}（{len(notified)} 筆）")
+    return not failures and not vote_mismatch and not regressions and room in notified_rooms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.workers, args.threads, args.ops) else 1)
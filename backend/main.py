@@ -7,7 +7,11 @@ from api import network
 from api import mindmap
 import asyncio
 from api import host_style
+from api import realtime
+from api import maintenance
+from api import countdown
 from contextlib import asynccontextmanager
+from api.storage import get_storage
 
 # 設置美化的日誌系統
 from utility.logger import setup_logger
@@ -18,6 +22,21 @@ async def lifespan(app: FastAPI):
     """應用生命週期管理 - 啟動和關閉事件"""
     # ==================== 啟動事件 ====================
     logger.info("🚀 MBBuddy 後端服務啟動中...")
+    storage = get_storage()
+    shared = " (多 worker 共用)" if getattr(storage, "shared", False) else ""
+    logger.info(f"💾 資料儲存後端: {storage.name}{shared}")
+    # get_storage 建立後端時已載入最新快照並重播日誌（僅 journal 後端需要）
+    recovery = storage.recovery
+    if recovery:
+        logger.info(
+            f"♻️ 已從快照 (序號 {recovery['snapshot_seq']}) 恢復並重播 {recovery['replayed']} 筆日誌事件，"
+            f"耗時 {recovery['seconds']:.2f} 秒"
+        )
+
+    # 啟動背景維護工作（逾時參與者、倒數結束、孤立資料、回應快取）
+    await maintenance.scheduler.start()
+    if maintenance.scheduler.jobs:
+        logger.info(f"🧹 背景維護工作已啟動: {', '.join(maintenance.scheduler.jobs)}")
     
     # 檢測並初始化 AMD Ryzen AI 平台
     try:
@@ -76,6 +95,13 @@ async def lifespan(app: FastAPI):
     
     # ==================== 關閉事件 ====================
     logger.info("🛑 MBBuddy 後端服務正在關閉...")
+
+    # 停止背景維護工作，等待正在執行的工作結束後才關閉儲存後端
+    try:
+        await maintenance.scheduler.stop()
+        logger.info("✅ 背景維護工作已停止")
+    except Exception as e:
+        logger.error(f"❌ 停止背景維護工作時發生錯誤: {e}")
     
     # 清理 Lemonade Client
     try:
@@ -88,6 +114,13 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ 關閉 Lemonade Client 時發生錯誤: {e}")
     
+    # 寫入尚未提交的資料並關閉儲存後端
+    try:
+        get_storage().close()
+        logger.info("✅ 資料儲存後端已關閉")
+    except Exception as e:
+        logger.error(f"❌ 關閉資料儲存後端時發生錯誤: {e}")
+    
     logger.info("👋 MBBuddy 後端服務已關閉")
 
 # 創建 FastAPI 應用，使用 lifespan
@@ -106,8 +139,22 @@ app.include_router(ai.router)
 app.include_router(network.router)
 app.include_router(mindmap.router)
 app.include_router(host_style.router)
+app.include_router(realtime.router)
+app.include_router(maintenance.router)
+app.include_router(countdown.router)
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
-    # uvicorn main:app --port 8001 --reload
+    # MBBUDDY_WORKERS > 1：以多個 worker 程序執行，房間資料存放在共用的 SQLite 資料庫（MBBUDDY_SQLITE_PATH）
+    # MBBUDDY_RELOAD=1：程式碼變更後自動重新載入（開發用，只支援單一 worker）
+    workers = int(os.getenv("MBBUDDY_WORKERS", "1"))
+    reload = os.getenv("MBBUDDY_RELOAD", "0") == "1"
+    if workers > 1:
+        if reload:
+            raise SystemExit("MBBUDDY_RELOAD=1 只能搭配單一 worker 使用")
+        if os.getenv("MBBUDDY_STORAGE", "sqlite").lower() != "sqlite":
+            raise SystemExit("多 worker 模式需要 MBBUDDY_STORAGE=sqlite")
+    uvicorn.run("main:app", host="0.0.0.0", port=8001, workers=workers, reload=reload)
+    # 開發：MBBUDDY_RELOAD=1 python main.py
+    # 多 worker：MBBUDDY_WORKERS=4 python main.py（或 MBBUDDY_WORKERS=4 uvicorn main:app --port 8001 --workers 4）
@@ -0,0 +1,517 @@
+# backend/shard_router.py
+"""
+房間分片路由器
+
+每個房間只屬於一個分片（獨立的後端程序，各自保存自己的房間資料），不需要共用資料庫，
+增加分片數即可把房間分散到更多 CPU 核心。路由器依房間代碼的一致性雜湊（utility/sharding.py）轉送請求：
+- 路徑 /api/rooms/{room}/...、/ws/rooms/{room}（WebSocket）、查詢參數 room / room_code、JSON 本文中的 room / room_code 決定目標分片
+- POST /api/create_room 轉送給房間數最少且未達上限的分片，分片只會產生雜湊到自己的房間代碼
+- GET /api/rooms、GET /api/all_rooms 向所有分片查詢後合併
+- /ai/config 等修改程序內 AI 設定的請求轉送給所有分片
+- 其他與房間無關的請求（AI 問答、網路資訊、主持風格等）輪流轉送
+
+環境變數：
+- MBBUDDY_SHARD_COUNT：啟動的分片數（預設為 CPU 核心數）
+- MBBUDDY_SHARD_BASE_PORT：分片的起始埠號（預設 8101，分片 i 使用 8101 + i）
+- MBBUDDY_SHARD_URLS：改為轉送到已在執行的分片（以逗號分隔的 URL，依序為 shard-0、shard-1...），不另外啟動分片
+- MBBUDDY_SHARD_CAPACITY：每個分片最多的房間數（預設 0 表示不限制）
+- MBBUDDY_ROUTER_PORT：路由器的埠號（預設 8001，與單一後端相同，前端不需修改）
+
+執行: MBBUDDY_SHARD_COUNT=4 python shard_router.py
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+from utility.logger import setup_logger
+from utility.sharding import HashRing
+
+logger = setup_logger("mbbuddy.router")
+
+ROOM_PATH = re.compile(r"^/(?:api|ws)/rooms/([^/]+)")
+ROOM_KEYS = ("room", "room_code")
+# 修改程序內 AI 設定的端點，每個分片都要套用
+BROADCAST_PATHS = {"/ai/config", "/ai/config/reset", "/ai/load_model", "/ai/unload_model"}
+# 逐跳標頭不轉送；content-length 依實際本文重新計算
+HOP_HEADERS = {
+    b"connection", b"keep-alive", b"proxy-connection", b"transfer-encoding", b"te", b"trailer", b"upgrade",
+    b"host", b"content-length",
+}
+
+
+def find_room(path, query_string, body, content_type):
+    """從路徑、查詢參數或 JSON 本文找出請求所屬的房間代碼"""
+    match = ROOM_PATH.match(path)
+    if match:
+        return match.group(1)
+    if query_string:
+        query = parse_qs(query_string)
+        for key in ROOM_KEYS:
+            if query.get(key):
+                return query[key][0]
+    if body and b"json" in content_type:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        if isinstance(data, dict):
+            for key in ROOM_KEYS:
+                if isinstance(data.get(key), str) and data[key]:
+                    return data[key].strip()
+    return None
+
+
+class ShardUnavailable(Exception):
+    """分片無法連線"""
+
+
+class ShardBadGateway(Exception):
+    """分片的回應不完整或格式錯誤，例如回應途中關閉連線、chunked 編碼錯誤"""
+
+
+# 讀取分片回應時可能發生的錯誤：連線中斷、提早讀到 EOF、狀態列 / 標頭 / chunk 大小無法解析
+PROTOCOL_ERRORS = (OSError, asyncio.IncompleteReadError, ValueError, IndexError)
+# 重送不會重複套用的方法；POST 等請求在閒置連線上失敗時，無法判斷分片是否已處理，不重送
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+class ShardResponse:
+    """分片的回應；body 為非同步產生器，讀完後連線放回連線池"""
+
+    def __init__(self, status, headers, body, streaming):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.streaming = streaming   # 沒有 content-length（chunked 或讀到連線關閉），例如 SSE
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.body])
+
+
+class ShardClient:
+    """與單一分片之間的 HTTP/1.1 keep-alive 連線池"""
+
+    def __init__(self, url, max_idle=512):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.max_idle = max_idle
+        self._idle = []
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    async def request(self, method, target, headers, body=b""):
+        """
+        送出請求並回傳 ShardResponse。
+        略過已被分片關閉的閒置連線；閒置連線送出請求後才失敗時，只有冪等方法改用新連線重送，
+        其他方法回傳 502，避免分片已處理的寫入被套用兩次
+        """
+        head = [f"{method} {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n".encode("latin-1")]
+        for name, value in headers:
+            head.append(name + b": " + value + b"\r\n")
+        head.append(b"Content-Length: %d\r\n\r\n" % len(body))
+        payload = b"".join(head) + body
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            try:
+                return await self._exchange(reader, writer, method, payload)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if method not in IDEMPOTENT_METHODS:
+                    raise ShardBadGateway(f"{type(e).__name__}: {e}") from e
+            except PROTOCOL_ERRORS as e:
+                writer.close()
+                raise ShardBadGateway(f"{type(e).__name__}: {e}") from e
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), 5)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ShardUnavailable(f"{self.host}:{self.port}") from e
+        try:
+            return await self._exchange(reader, writer, method, payload)
+        except PROTOCOL_ERRORS as e:
+            writer.close()
+            raise ShardBadGateway(f"{type(e).__name__}: {e}") from e
+
+    async def _exchange(self, reader, writer, method, payload):
+        writer.write(payload)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("分片關閉了連線")
+        status = int(status_line.split()[1])
+        headers = []
+        length = None
+        chunked = False
+        reusable = True
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.partition(b":")
+            name, value = name.strip().lower(), value.strip()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding":
+                chunked = b"chunked" in value.lower()
+            elif name == b"connection" and value.lower() == b"close":
+                reusable = False
+            if name not in HOP_HEADERS or name == b"content-length":
+                headers.append((name, value))
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            length = 0
+        streaming = length is None
+        return ShardResponse(status, headers, self._body(reader, writer, length, chunked, reusable), streaming)
+
+    async def _body(self, reader, writer, length, chunked, reusable):
+        """依 content-length、chunked 或連線關閉讀取本文；分片中途斷線或編碼錯誤時拋出 ShardBadGateway"""
+        done = False
+        try:
+            if length is not None:
+                while length > 0:
+                    chunk = await reader.read(min(length, 1 << 16))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b"", length)
+                    length -= len(chunk)
+                    yield chunk
+            elif chunked:
+                while True:
+                    size = int((await reader.readline()).split(b";")[0], 16)
+                    if size == 0:
+                        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                            pass
+                        break
+                    yield await reader.readexactly(size)
+                    if await reader.readexactly(2) != b"\r\n":
+                        raise ValueError("chunk 後缺少 CRLF")
+            else:
+                reusable = False
+                while chunk := await reader.read(1 << 16):
+                    yield chunk
+            done = True
+        except PROTOCOL_ERRORS as e:
+            raise ShardBadGateway(f"{type(e).__name__}: {e}") from e
+        finally:
+            if done and reusable and len(self._idle) < self.max_idle:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+
+
+class ShardRouter:
+    """依房間代碼將請求轉送到負責的分片（ASGI 應用）"""
+
+    def __init__(self, shards, capacity=0):
+        self.shards = dict(shards)   # 分片名稱 → 基底 URL
+        self.ring = HashRing(self.shards)
+        self.capacity = capacity
+        self.clients = {name: ShardClient(url) for name, url in self.shards.items()}
+        self._round_robin = itertools.cycle(self.shards)
+
+    def shard_for_room(self, code):
+        return self.ring.node_for(code)
+
+    # ---------- ASGI ----------
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                logger.info(
+                    f"🔀 分片路由器啟動，共 {len(self.shards)} 個分片: "
+                    + ", ".join(f"{k}={v}" for k, v in self.shards.items())
+                )
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for client in self.clients.values():
+                    await client.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        method, path = scope["method"], scope["path"]
+        query_string = scope["query_string"].decode("latin-1")
+        headers = [(k, v) for k, v in scope["headers"] if k not in HOP_HEADERS]
+        target = scope.get("raw_path", path.encode()).decode("latin-1") + (f"?{query_string}" if query_string else "")
+
+        try:
+            if method == "GET" and path == "/api/rooms":
+                return await self._send_json(send, 200, await self.list_rooms())
+            if method == "GET" and path == "/api/all_rooms":
+                return await self._send_json(send, 200, await self.all_rooms())
+            if method == "POST" and path == "/api/create_room":
+                shard = await self.pick_shard_for_new_room()
+                if shard is None:
+                    return await self._send_json(send, 503, {"detail": "所有分片都已達房間上限或無法連線"})
+            elif method == "POST" and path in BROADCAST_PATHS:
+                return await self.broadcast(send, method, target, headers, body)
+            else:
+                content_type = dict(scope["headers"]).get(b"content-type", b"")
+                room = find_room(path, query_string, body, content_type)
+                shard = self.shard_for_room(room) if room else next(self._round_robin)
+            response = await self.clients[shard].request(method, target, headers, body)
+        except ShardUnavailable as e:
+            return await self._send_json(send, 503, {"detail": f"分片 {e} 無法連線"})
+        except ShardBadGateway as e:
+            logger.warning(f"⚠️ 分片回應錯誤 {method} {path}: {e}")
+            return await self._send_json(send, 502, {"detail": "分片回應不完整"})
+        await self._relay(response, method, path, receive, send)
+
+    async def _relay(self, response, method, path, receive, send):
+        """
+        轉送分片的回應：有 content-length 的回應讀完本文才送出，分片中途斷線時改回 502；
+        串流回應（例如 SSE）的標頭已送出，分片中途斷線時結束回應，用戶端斷線時停止並關閉分片連線
+        """
+        if not response.streaming:
+            try:
+                content = await response.read()
+            except ShardBadGateway as e:
+                logger.warning(f"⚠️ 分片回應錯誤 {method} {path}: {e}")
+                return await self._send_json(send, 502, {"detail": "分片回應不完整"})
+            await send({"type": "http.response.start", "status": response.status, "headers": response.headers})
+            await send({"type": "http.response.body", "body": content})
+            return
+
+        await send({"type": "http.response.start", "status": response.status, "headers": response.headers})
+
+        async def pump():
+            try:
+                async for chunk in response.body:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            except ShardBadGateway as e:
+                logger.warning(f"⚠️ 分片串流中斷 {method} {path}: {e}")
+            await send({"type": "http.response.body", "body": b""})
+
+        async def wait_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(wait_disconnect())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await response.body.aclose()
+        for task in done:
+            task.result()
+
+    async def _websocket(self, scope, receive, send):
+        """WebSocket 連線轉送給房間所屬的分片，雙向轉送訊息直到任一端關閉"""
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+        await receive()   # websocket.connect
+        match = ROOM_PATH.match(scope["path"])
+        shard = self.shard_for_room(match.group(1)) if match else next(self._round_robin)
+        query_string = scope["query_string"].decode("latin-1")
+        target = scope.get("raw_path", scope["path"].encode()).decode("latin-1")
+        url = "ws" + self.shards[shard][len("http"):] + target + (f"?{query_string}" if query_string else "")
+        try:
+            upstream = await connect(url, open_timeout=5, max_size=None)
+        except (OSError, asyncio.TimeoutError, InvalidHandshake) as e:
+            logger.warning(f"⚠️ 分片 {shard} WebSocket 連線失敗: {e}")
+            await send({"type": "websocket.close", "code": 1013})
+            return
+        await send({"type": "websocket.accept"})
+
+        async def downstream():
+            try:
+                async for message in upstream:
+                    key = "text" if isinstance(message, str) else "bytes"
+                    await send({"type": "websocket.send", key: message})
+            except ConnectionClosed:
+                pass
+            # 轉送分片的關閉代碼（例如房間不存在的 4404），異常中斷改用 1011
+            code = upstream.close_code
+            code = 1000 if code in (None, 1005) else 1011 if code in (1006, 1015) else code
+            await send({"type": "websocket.close", "code": code})
+
+        async def upstream_pump():
+            while True:
+                message = await receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                try:
+                    if message.get("text") is not None:
+                        await upstream.send(message["text"])
+                    elif message.get("bytes") is not None:
+                        await upstream.send(message["bytes"])
+                except ConnectionClosed:
+                    return
+
+        tasks = [asyncio.ensure_future(downstream()), asyncio.ensure_future(upstream_pump())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await upstream.close()
+
+    async def _send_json(self, send, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start", "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    # ---------- 跨分片操作 ----------
+
+    async def fetch_json(self, shard, path):
+        """向分片送出 GET 請求並回傳 JSON，分片無法連線或回應錯誤時回傳 None"""
+        try:
+            response = await self.clients[shard].request("GET", path, [])
+            body = await response.read()
+            if response.status != 200:
+                raise ValueError(f"HTTP {response.status}")
+            return json.loads(body)
+        except (ShardUnavailable, ShardBadGateway, ValueError) as e:
+            logger.warning(f"⚠️ 分片 {shard} 查詢 {path} 失敗: {e}")
+            return None
+
+    async def gather_json(self, path):
+        """向所有分片查詢，回傳 {分片名稱: JSON}（略過無法連線的分片）"""
+        results = await asyncio.gather(*(self.fetch_json(shard, path) for shard in self.shards))
+        return {shard: data for shard, data in zip(self.shards, results) if data is not None}
+
+    async def list_rooms(self):
+        rooms = []
+        for data in (await self.gather_json("/api/rooms")).values():
+            rooms.extend(data.get("rooms", []))
+        rooms.sort(key=lambda room: room.get("created_at", 0))
+        return {"rooms": rooms}
+
+    async def all_rooms(self):
+        merged = {}
+        for data in (await self.gather_json("/api/all_rooms")).values():
+            for key, value in data.items():
+                if isinstance(value, dict):
+                    merged.setdefault(key, {}).update(value)
+                elif isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+        return merged
+
+    async def pick_shard_for_new_room(self):
+        """選擇房間數最少且未達上限的分片，全部已滿或無法連線時回傳 None"""
+        counts = {shard: len(data.get("rooms", [])) for shard, data in (await self.gather_json("/api/rooms")).items()}
+        available = [shard for shard, count in counts.items() if not self.capacity or count < self.capacity]
+        if not available:
+            return None
+        return min(available, key=lambda shard: counts[shard])
+
+    async def broadcast(self, send, method, target, headers, body):
+        """轉送給所有分片，回傳第一個分片的回應"""
+        first = None
+        for shard, client in self.clients.items():
+            try:
+                response = await client.request(method, target, headers, body)
+                content = await response.read()
+            except ShardUnavailable:
+                logger.warning(f"⚠️ 分片 {shard} 無法連線，未套用 {target}")
+                continue
+            except ShardBadGateway as e:
+                logger.warning(f"⚠️ 分片 {shard} 回應錯誤，{target} 可能未套用: {e}")
+                continue
+            if first is None:
+                first = (response, content)
+        if first is None:
+            return await self._send_json(send, 503, {"detail": "所有分片都無法連線"})
+        response, content = first
+        headers = [(k, v) for k, v in response.headers if k != b"content-length"]
+        headers.append((b"content-length", str(len(content)).encode()))
+        await send({"type": "http.response.start", "status": response.status, "headers": headers})
+        await send({"type": "http.response.body", "body": content})
+
+
+def create_app(shards, capacity=0):
+    return ShardRouter(shards, capacity)
+
+
+def shard_names(count):
+    return [f"shard-{i}" for i in range(count)]
+
+
+def shard_env(name, names):
+    """分片程序的環境變數：分片身分，以及各自獨立的資料目錄與資料庫檔案"""
+    env = dict(os.environ, MBBUDDY_SHARD=name, MBBUDDY_SHARDS=",".join(names))
+    env.pop("MBBUDDY_WORKERS", None)
+    env["MBBUDDY_JOURNAL_DIR"] = os.path.join(os.getenv("MBBUDDY_JOURNAL_DIR", "mbbuddy_journal"), name)
+    env["MBBUDDY_ARCHIVE_DIR"] = os.path.join(os.getenv("MBBUDDY_ARCHIVE_DIR", "mbbuddy_archive"), name)
+    root, ext = os.path.splitext(os.getenv("MBBUDDY_SQLITE_PATH", "mbbuddy.db"))
+    env["MBBUDDY_SQLITE_PATH"] = f"{root}-{name}{ext}"
+    return env
+
+
+def spawn_shard(name, names, port, host="127.0.0.1", **popen_options):
+    """以子程序啟動一個分片（uvicorn main:app），回傳 (程序, URL)"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", host, "--port", str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=shard_env(name, names), **popen_options,
+    )
+    return process, f"http://{host}:{port}"
+
+
+def spawn_shards(count, base_port, host="127.0.0.1"):
+    """啟動 count 個分片，分片 i 使用 base_port + i，回傳 (程序列表, {分片名稱: URL})"""
+    names = shard_names(count)
+    processes, shards = [], {}
+    for i, name in enumerate(names):
+        process, shards[name] = spawn_shard(name, names, base_port + i, host)
+        processes.append(process)
+    return processes, shards
+
+
+def shards_from_urls(urls):
+    names = shard_names(len(urls))
+    shards = {}
+    for name, url in zip(names, urls):
+        if not urlsplit(url).scheme:
+            url = "http://" + url
+        shards[name] = url.rstrip("/")
+    return shards
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    capacity = int(os.getenv("MBBUDDY_SHARD_CAPACITY", "0"))
+    processes = []
+    urls = [u.strip() for u in os.getenv("MBBUDDY_SHARD_URLS", "").split(",") if u.strip()]
+    if urls:
+        shards = shards_from_urls(urls)
+    else:
+        count = int(os.getenv("MBBUDDY_SHARD_COUNT", os.cpu_count() or 1))
+        processes, shards = spawn_shards(count, int(os.getenv("MBBUDDY_SHARD_BASE_PORT", "8101")))
+    try:
+        uvicorn.run(create_app(shards, capacity), host="0.0.0.0", port=int(os.getenv("MBBUDDY_ROUTER_PORT", "8001")))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
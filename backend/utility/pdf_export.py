@@ -9,6 +9,15 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
 from reportlab.lib.colors import navy, gray
 
+def _vote_counts(votes, comment_id):
+    """取得留言的 (好評數, 差評數)，votes 為儲存後端回傳的 {comment_id: (好評數, 差評數)}"""
+    return votes.get(comment_id, (0, 0))
+
+def _vote_score(votes, comment_id):
+    """好評數減差評數，用於排序"""
+    good, bad = _vote_counts(votes, comment_id)
+    return good - bad
+
 def export_room_pdf(room, room_data, room_topics, votes, FONT_NAME):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(
@@ -108,10 +117,9 @@ def export_room_pdf(room, room_data, room_topics, votes, FONT_NAME):
         good_votes = 0
         bad_votes = 0
         for comment in comments:
-            comment_id = comment.get('id', '')
-            if comment_id in votes:
-                good_votes += len(votes[comment_id].get('good', []))
-                bad_votes += len(votes[comment_id].get('bad', []))
+            good, bad = _vote_counts(votes, comment.get('id', ''))
+            good_votes += good
+            bad_votes += bad
         topic_vote_counts.append(good_votes + bad_votes)
         if good_votes + bad_votes > 0:
             positive_percent = (good_votes / (good_votes + bad_votes)) * 100
@@ -203,14 +211,9 @@ def export_room_pdf(room, room_data, room_topics, votes, FONT_NAME):
             bad_votes_total = 0
             comment_votes = []
             for comment in comments:
-                comment_id = comment.get('id', '')
-                good_votes = 0
-                bad_votes = 0
-                if comment_id in votes:
-                    good_votes = len(votes[comment_id].get('good', []))
-                    bad_votes = len(votes[comment_id].get('bad', []))
-                    good_votes_total += good_votes
-                    bad_votes_total += bad_votes
+                good_votes, bad_votes = _vote_counts(votes, comment.get('id', ''))
+                good_votes_total += good_votes
+                bad_votes_total += bad_votes
                 comment_votes.append((comment, good_votes, bad_votes))
             story.append(Paragraph(f"正面評價: {good_votes_total} | 負面評價: {bad_votes_total}", styles['SubHeaderStyle']))
             story.append(Spacer(1, 10))
@@ -257,16 +260,12 @@ def export_room_pdf(room, room_data, room_topics, votes, FONT_NAME):
             # 留言列表
             story.append(Paragraph("留言列表:", styles['SubHeaderStyle']))
             story.append(Spacer(1, 5))
-            sorted_comments = sorted(comments, key=lambda c: 
-                len(votes.get(c.get('id', ''), {}).get('good', [])) - 
-                len(votes.get(c.get('id', ''), {}).get('bad', [])), 
-                reverse=True)
+            sorted_comments = sorted(comments, key=lambda c: _vote_score(votes, c.get('id', '')), reverse=True)
             for j, comment in enumerate(sorted_comments, 1):
                 nickname = comment.get('nickname', '匿名')
                 content = comment.get('content', '').replace('\n', '<br/>')
                 timestamp = datetime.datetime.fromtimestamp(comment.get('ts', time.time())).strftime('%H:%M:%S')
-                good_votes = len(votes.get(comment.get('id', ''), {}).get('good', []))
-                bad_votes = len(votes.get(comment.get('id', ''), {}).get('bad', []))
+                good_votes, bad_votes = _vote_counts(votes, comment.get('id', ''))
                 vote_score = good_votes - bad_votes
                 bg_color = "#FAFAFA"
                 if vote_score > 2:
@@ -6,7 +6,9 @@ AI Prompt 構建模組
 import json
 import re
 from typing import List, Dict, Any, Optional
-from api.data_store import ROOMS, topics, votes
+from api.storage import get_storage
+
+SUMMARY_TOP_COMMENTS = 5  # 總結 prompt 中列為優先參考的高票意見數
 
 class PromptBuilder:
     """AI Prompt 構建器"""
@@ -23,23 +25,22 @@ class PromptBuilder:
         Returns:
             構建好的 prompt 字串
         """
+        store = get_storage()
+
         # 檢查討論室是否存在
-        if room not in ROOMS:
+        if not store.room_exists(room):
             return "錯誤：找不到指定的討論室。"
 
-        # 組合主題 ID 並檢查主題是否存在
-        topic_id = f"{room}_{topic}"
-        if topic_id not in topics:
+        # 檢查主題是否存在，並取得含票數的留言
+        topic_comments = store.get_comment_payloads(room, topic)
+        if topic_comments is None:
             return "錯誤：在該討論室中找不到指定的主題。"
-
-        room_data = ROOMS[room]
-        topic_data = topics[topic_id]
         
         # 開始建立 Prompt
         prompt = f"主題: {topic}\n"
 
         # 取得參與者列表
-        participants = [p.get("nickname", "匿名") for p in room_data.get("participants_list", [])]
+        participants = [p["nickname"] for p in store.list_participants(room)]
         if participants:
             prompt += f"參與者: {', '.join(participants)}\n"
 
@@ -47,25 +48,34 @@ class PromptBuilder:
 
         # 取得該主題的所有留言與其對應的票數
         comments_for_prompt = []
-        if "comments" in topic_data:
-            for c in topic_data["comments"]:
-                comment_id = c.get("id")
-                nickname = c.get("nickname", "匿名")
-                content = c.get("content", "")
-                
-                # 從 votes 字典中取得票數
-                good_votes = len(votes.get(comment_id, {}).get("good", []))
-                bad_votes = len(votes.get(comment_id, {}).get("bad", []))
+        for c in topic_comments:
+            nickname = c["nickname"] or "匿名"
+            content = c["content"]
+
+            # 使用儲存後端同步維護的票數
+            good_votes, bad_votes = c["vote_good"], c["vote_bad"]
 
-                comments_for_prompt.append(
-                    f"- {nickname}：{content}（👍{good_votes}、👎{bad_votes}）"
-                )
+            comments_for_prompt.append(
+                f"- {nickname}：{content}（👍{good_votes}、👎{bad_votes}）"
+            )
 
         if not comments_for_prompt:
             prompt += "目前這個主題還沒有任何留言。\n"
         else:
             prompt += "\n".join(comments_for_prompt)
 
+        # 由留言排行取得淨好評最高的意見，讓總結優先反映參與者最支持的觀點
+        top_comments = [
+            c for c in store.get_top_comments(room, topic, SUMMARY_TOP_COMMENTS) or []
+            if c["vote_good"] - c["vote_bad"] > 0
+        ]
+        if top_comments:
+            prompt += "\n\n最受支持的意見（依好評減差評排序，彙整時請優先呈現）:\n"
+            prompt += "\n".join(
+                f"{i}. {c['nickname'] or '匿名'}：{c['content']}（淨好評 {c['vote_good'] - c['vote_bad']}）"
+                for i, c in enumerate(top_comments, 1)
+            )
+
         # 加上固定的指令模板
         prompt += """
 
@@ -137,31 +147,28 @@ class PromptBuilder:
             構建好的 prompt 字串
         """
         # 檢查討論室是否存在
-        if room not in ROOMS:
+        store = get_storage()
+        room_data = store.get_room(room)
+        if room_data is None:
             return "錯誤：找不到指定的討論室。"
 
-        room_data = ROOMS[room]
-
         # 開始建立 Prompt
-        prompt = f"討論名稱: {room_data.get('title', '未命名討論')}\n"
+        prompt = f"討論名稱: {room_data.title or '未命名討論'}\n"
         prompt += f"討論代碼: {room}\n"
         
         # 添加討論描述/摘要（如果有）
-        if room_data.get('topic_summary'):
-            prompt += f"討論摘要: {room_data['topic_summary']}\n"
-        if room_data.get('desired_outcome'):
-            prompt += f"預期成果: {room_data['desired_outcome']}\n"
+        if room_data.topic_summary:
+            prompt += f"討論摘要: {room_data.topic_summary}\n"
+        if room_data.desired_outcome:
+            prompt += f"預期成果: {room_data.desired_outcome}\n"
         
         # 取得參與者列表
-        participants = [p.get("nickname", "匿名") for p in room_data.get("participants_list", [])]
+        participants = [p["nickname"] for p in store.list_participants(room)]
         if participants:
             prompt += f"參與者: {', '.join(participants)}\n"
         
         # 找出該討論室的所有已有主題
-        existing_topics = [
-            t["topic_name"] for t_id, t in topics.items() 
-            if t["room_id"] == room and "topic_name" in t
-        ]
+        existing_topics = store.list_topic_names(room)
         
         if existing_topics:
             prompt += "\n已有的主題:\n"
@@ -0,0 +1,58 @@
+"""
+房間分片
+以房間代碼的一致性雜湊決定房間屬於哪個分片（後端程序），見 shard_router.py
+
+分片後端由環境變數得知自己的身分：
+- MBBUDDY_SHARDS：所有分片名稱，以逗號分隔（例如 shard-0,shard-1,shard-2）
+- MBBUDDY_SHARD：本程序的分片名稱
+未設定時視為沒有分片，所有房間都屬於本程序。
+"""
+
+import bisect
+import hashlib
+import os
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """一致性雜湊環，每個節點在環上放置 replicas 個虛擬節點；增減節點時只有約 1/N 的鍵會換節點"""
+
+    def __init__(self, nodes, replicas=128):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("HashRing 至少需要一個節點")
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._keys = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key):
+        """回傳負責 key 的節點"""
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[index]
+
+
+_local = None
+
+
+def local_shard():
+    """回傳 (本程序的分片名稱, HashRing)，沒有分片時回傳 (None, None)"""
+    global _local
+    if _local is None:
+        shards = [name.strip() for name in os.getenv("MBBUDDY_SHARDS", "").split(",") if name.strip()]
+        name = os.getenv("MBBUDDY_SHARD")
+        if shards and name:
+            if name not in shards:
+                raise ValueError(f"MBBUDDY_SHARD={name} 不在 MBBUDDY_SHARDS 中")
+            _local = (name, HashRing(shards))
+        else:
+            _local = (None, None)
+    return _local
+
+
+def owns_room(code):
+    """房間代碼是否屬於本程序的分片"""
+    name, ring = local_shard()
+    return ring is None or ring.node_for(code) == name
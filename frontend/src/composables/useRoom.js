@@ -1,6 +1,7 @@
 import { ref, onMounted, onBeforeUnmount, computed } from 'vue';
 import { useRoute, useRouter } from 'vue-router';
 import { API_BASE_URL } from '@/utils/api';
+import { applyCommentChanges, connectRoomSocket } from '@/utils/roomSocket';
 
 export function useRoom() {
   const route = useRoute();
@@ -16,9 +17,16 @@ export function useRoom() {
   const votedQuestions = ref({ good: new Set(), bad: new Set() });
   const currentNickname = ref('');
   const deviceId = ref('');
+  const onlineCount = ref(0);
 
   // --- Private Vars ---
-  let statePoller, localTimerPoller, heartbeatPoller;
+  let statePoller, localTimerPoller;
+  let stateVersion = 0; // 已套用的房間資料版本，多 worker 時較慢回來的舊回應不應覆蓋新資料
+  let deadline = null; // 倒數結束的伺服器時間（秒），由本地時鐘加上時鐘差計算剩餘時間
+  let clockOffset = 0; // 伺服器時間 - 本地時間（毫秒）
+  let roomSocket = null; // 即時推播連線，連線期間停止狀態輪詢與心跳
+  let socketOpen = false;
+  let joined = false;
   const getRoomNicknameKey = () => `nickname_${roomCode.value}`;
 
   // --- Computed ---
@@ -47,7 +55,9 @@ export function useRoom() {
   const clearAllPolling = () => {
     clearInterval(statePoller);
     clearInterval(localTimerPoller);
-    clearInterval(heartbeatPoller);
+    roomSocket?.close();
+    roomSocket = null;
+    socketOpen = false;
   };
 
   const goHome = () => {
@@ -55,18 +65,50 @@ export function useRoom() {
     router.push('/');
   };
 
+  // 輪詢回應與推播訊息共用：套用房間狀態，忽略比已套用版本舊的資料
+  const applyRoomState = (data) => {
+    if (data.version < stateVersion) return;
+    stateVersion = data.version || 0;
+    roomStatus.value = data.status;
+    currentTopic.value = data.topic || '等待主持人設定主題';
+    questions.value = data.delta ? applyCommentChanges(questions.value, data) : (data.comments || []);
+    deadline = data.deadline ?? null;
+    remainingTime.value = (data.status === 'End' || data.status === 'Stop') ? 0 : (data.countdown || 0);
+  };
+
+  // 以請求往返的中點估算與伺服器的時鐘差，之後依 deadline 在本地計算剩餘時間
+  const syncClock = async () => {
+    try {
+      const sentAt = Date.now();
+      const response = await fetch(`${API_BASE_URL}/api/time`);
+      if (!response.ok) return;
+      const { server_time } = await response.json();
+      clockOffset = server_time * 1000 - (sentAt + Date.now()) / 2;
+    } catch (error) {
+      console.error('同步伺服器時間失敗:', error);
+    }
+  };
+
+  const updateRemainingTime = () => {
+    if (roomStatus.value !== 'Discussion') return;
+    if (deadline) {
+      remainingTime.value = Math.max(0, Math.floor(deadline - (Date.now() + clockOffset) / 1000));
+    } else if (remainingTime.value > 0) {
+      remainingTime.value--;
+    }
+  };
+
   const fetchRoomState = async () => {
     if (!roomCode.value) return 'NotFound';
     try {
-      const response = await fetch(`${API_BASE_URL}/api/rooms/${roomCode.value}/state`);
+      // 帶上已套用的版本，伺服器只回傳之後的留言變更
+      const since = stateVersion ? `?since=${stateVersion}` : '';
+      const response = await fetch(`${API_BASE_URL}/api/rooms/${roomCode.value}/state${since}`);
       if (response.status === 404) throw new Error('NotFound');
       if (!response.ok) throw new Error(`HTTP Error ${response.status}`);
       const data = await response.json();
-      roomStatus.value = data.status;
-      currentTopic.value = data.topic || '等待主持人設定主題';
-      questions.value = data.comments || [];
-      remainingTime.value = (data.status === 'End' || data.status === 'Stop') ? 0 : (data.countdown || 0);
-      return data.status;
+      applyRoomState(data);
+      return roomStatus.value;
     } catch (error) {
       roomStatus.value = 'NotFound';
       clearAllPolling();
@@ -123,16 +165,25 @@ export function useRoom() {
     }
   };
 
-  const sendHeartbeat = async () => {
+  // 加入後的輪詢以一次請求完成：記錄心跳並取得房間狀態、自己的投票與在線人數
+  const syncRoom = async () => {
     if (!roomCode.value || !deviceId.value) return;
     try {
-      await fetch(`${API_BASE_URL}/api/participants/heartbeat`, {
+      const response = await fetch(`${API_BASE_URL}/api/rooms/${roomCode.value}/sync`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ room: roomCode.value, device_id: deviceId.value })
+        body: JSON.stringify({ device_id: deviceId.value, since: stateVersion || null })
       });
+      // 房間不存在的處理（通知並返回首頁）交由 fetchRoomState
+      if (response.status === 404) return fetchRoomState();
+      if (!response.ok) return;
+      const data = await response.json();
+      applyRoomState(data.state);
+      votedQuestions.value.good = new Set(data.votes.voted_good || []);
+      votedQuestions.value.bad = new Set(data.votes.voted_bad || []);
+      onlineCount.value = data.online_count;
     } catch (error) {
-      console.error('心跳發送錯誤:', error);
+      console.error('同步房間失敗:', error);
     }
   };
 
@@ -144,8 +195,10 @@ export function useRoom() {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ room: roomCode.value, device_id: deviceId.value, nickname: currentNickname.value })
       });
-      clearInterval(heartbeatPoller);
-      heartbeatPoller = setInterval(sendHeartbeat, 5000); // 5秒一次心跳
+      joined = true;
+      // 改以 sync 輪詢（同時記錄心跳），並帶 device_id 重新連線；連線期間伺服器即視為在線
+      resumePolling();
+      connectSocket();
     } catch (error) {
       console.error('加入房間或註冊心跳時出錯:', error);
     }
@@ -206,13 +259,41 @@ export function useRoom() {
     }
   };
 
+  // 推播連線期間停止輪詢；斷線時恢復輪詢，並在背景自動重新連線
+  const resumePolling = () => {
+    socketOpen = false;
+    clearInterval(statePoller);
+    statePoller = setInterval(joined ? syncRoom : fetchRoomState, 3000);
+  };
+
+  const connectSocket = () => {
+    roomSocket?.close();
+    if (socketOpen) resumePolling();
+    roomSocket = connectRoomSocket(roomCode.value, {
+      deviceId: joined ? deviceId.value : '',
+      onOpen: () => {
+        socketOpen = true;
+        clearInterval(statePoller);
+      },
+      onClose: () => {
+        if (socketOpen) resumePolling();
+      },
+      onMessage: (message) => {
+        if (message.type === 'state') applyRoomState(message);
+        if (message.type === 'countdown') {
+          // 伺服器在倒數結束時切換狀態，新的狀態另由 state 事件送達
+          roomStatus.value = message.status;
+          remainingTime.value = 0;
+          deadline = null;
+          showNotification('討論時間到', 'info');
+        }
+      },
+    });
+  };
+
   const startPolling = () => {
     statePoller = setInterval(fetchRoomState, 3000);
-    localTimerPoller = setInterval(() => {
-      if (remainingTime.value > 0 && roomStatus.value === 'Discussion') {
-        remainingTime.value--;
-      }
-    }, 1000);
+    localTimerPoller = setInterval(updateRemainingTime, 1000);
   };
 
   onMounted(async () => {
@@ -220,15 +301,16 @@ export function useRoom() {
       goHome();
       return;
     }
-    await fetchRoomState();
+    await Promise.all([syncClock(), fetchRoomState()]);
     startPolling();
+    if (roomStatus.value !== 'NotFound') connectSocket();
   });
 
   onBeforeUnmount(clearAllPolling);
 
   return {
     roomCode, questions, notifications, roomStatus, currentTopic, remainingTime,
-    votedQuestions, currentNickname, roomStatusText, formattedRemainingTime, statusIcon,
+    votedQuestions, currentNickname, onlineCount, roomStatusText, formattedRemainingTime, statusIcon,
     showNotification, removeNotification, submitQuestion, voteQuestion, initializeUser,
     updateUserNickname, goHome, fetchRoomState, fetchUserVotes, registerHeartbeat
   };
@@ -0,0 +1,88 @@
+// 房間即時推播：連線 /ws/rooms/{room}（或 SSE），由伺服器推送房間狀態、主題列表、在線名單與倒數結束，取代定時輪詢
+import { API_BASE_URL } from '@/utils/api';
+
+// 套用增量回應：移除已刪除的留言、以 id 取代或加入新增與修改的留言、更新只有票數改變的留言
+export const applyCommentChanges = (list, { comments = [], vote_counts = {}, deleted = [] }) => {
+  if (!comments.length && !deleted.length && !Object.keys(vote_counts).length) return list;
+  const removed = new Set(deleted);
+  const updated = new Map(comments.map(c => [c.id, c]));
+  const merged = list.filter(q => !removed.has(q.id)).map(q => {
+    const next = updated.get(q.id) || (vote_counts[q.id] ? { ...q, ...vote_counts[q.id] } : q);
+    updated.delete(q.id);
+    return next;
+  });
+  return merged.concat([...updated.values()]);
+};
+
+// 建立房間連線，斷線後自動重新連線（間隔 1、2、4... 秒，最長 30 秒）；房間不存在（4404）時不再重試
+// WebSocket 從未連線成功時（例如代理伺服器不支援），改用 SSE（/api/rooms/{room}/events），由瀏覽器自動重新連線並以 Last-Event-ID 補上遺漏的變更
+// onOpen / onClose 讓呼叫端在連線期間停止輪詢、斷線時恢復輪詢；回傳的 close() 主動關閉連線，不會觸發 onClose
+export const connectRoomSocket = (room, { deviceId = '', onMessage, onOpen, onClose } = {}) => {
+  const query = deviceId ? `?device_id=${encodeURIComponent(deviceId)}` : '';
+  const path = encodeURIComponent(room);
+  const socketUrl = `${API_BASE_URL.replace(/^http/, 'ws')}/ws/rooms/${path}${query}`;
+  const eventsUrl = `${API_BASE_URL}/api/rooms/${path}/events${query}`;
+  let socket = null;
+  let source = null;
+  let retryTimer = null;
+  let retries = 0;
+  let connected = false;
+  let closed = false;
+
+  const handle = (data) => {
+    try {
+      onMessage?.(JSON.parse(data));
+    } catch (error) {
+      console.error('處理推播訊息失敗:', error);
+    }
+  };
+
+  const openEvents = () => {
+    if (closed || typeof EventSource === 'undefined') return;
+    source = new EventSource(eventsUrl);
+    source.onopen = () => onOpen?.();
+    source.addEventListener('state', (event) => handle(event.data));
+    source.addEventListener('topics', (event) => handle(event.data));
+    source.addEventListener('participants', (event) => handle(event.data));
+    source.addEventListener('countdown', (event) => handle(event.data));
+    source.onerror = () => {
+      // CONNECTING 表示瀏覽器會自動重新連線；CLOSED 表示伺服器拒絕（例如房間不存在），不再重試
+      onClose?.({ code: source.readyState === EventSource.CLOSED ? 4404 : 1006 });
+      if (source.readyState === EventSource.CLOSED) source = null;
+    };
+  };
+
+  const open = () => {
+    if (closed) return;
+    if (typeof WebSocket === 'undefined') return openEvents();
+    socket = new WebSocket(socketUrl);
+    socket.onopen = () => {
+      connected = true;
+      retries = 0;
+      onOpen?.();
+    };
+    socket.onmessage = (event) => handle(event.data);
+    socket.onclose = (event) => {
+      socket = null;
+      onClose?.(event);
+      if (closed || event.code === 4404) return;
+      if (!connected) return openEvents();
+      retryTimer = setTimeout(open, Math.min(30000, 1000 * 2 ** retries++));
+    };
+  };
+
+  open();
+  return {
+    close: () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (socket) {
+        socket.onclose = null;
+        socket.close();
+        socket = null;
+      }
+      source?.close();
+      source = null;
+    },
+  };
+};